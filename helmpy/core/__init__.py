@@ -1,4 +1,9 @@
 from helmpy.core.helm import helm
+from helmpy.core.helm_batch import helm_batch
+from helmpy.core.pv_curve import pv_curve, collapse_point
+from helmpy.core.contingency import contingencies
+from helmpy.core.linear_solvers import benchmark_linear_solvers
 from helmpy.core.classes import create_case_data_object_from_xlsx
 from helmpy.core.nr import nr
-from helmpy.core.nr_ds import nr_ds
\ No newline at end of file
+from helmpy.core.nr_ds import nr_ds
+from helmpy.core.fdlf import fdlf
\ No newline at end of file
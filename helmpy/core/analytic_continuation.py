@@ -3,6 +3,9 @@ Algorithm for the analytic continuation of the power series.
 """
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from helmpy.core.kernels import Kernels
 
 
 
@@ -49,3 +52,203 @@ def Pade(serie_completa,largo_actual):
         a[i] = aux
     return np.sum(a)/np.sum(b)
 
+
+
+
+def solve_pade_systems(series, L, solver='dense', kernels=None, tolerance=1e-10):
+    """
+    Solve the Hankel systems of the [L/L] Padé approximants of every row of series
+
+    mat_c x = -serie[L+1:2L+1], with mat_c[r][c] = serie[r+c+1].
+    solver='dense' uses a stacked LU solve, O(L^3) per row. solver='levinson' reverses
+    the columns of mat_c, which gives a Toeplitz matrix, and uses the Levinson-Trench
+    recursion of kernels (numba by default), O(L^2) per row. Rows whose recursion breaks
+    down or whose relative residual is above tolerance are solved again with the dense
+    method.
+
+    Returns the solutions and an estimate of the 1-norm condition number of every
+    mat_c: norm(mat_c)*max(norm(x)/norm(rhs), norm(inv(mat_c) e_1), norm(inv(mat_c) e_L)).
+    Like LAPACK's estimator it is a lower bound of the condition number.
+    """
+    n_rows = len(series)
+    mat_c = sliding_window_view(series[:, 1:2*L], L, axis=1)
+    rhs = -series[:, L+1:2*L+1]
+    vec_b = np.empty((n_rows, L), dtype=complex)
+    inv_norm = np.empty(n_rows)
+    dense = np.ones(n_rows, dtype=bool)
+
+    # mat_c is symmetric: its 1-norm and infinity-norm are the largest sum of L 
+    # consecutive absolute values of the series
+    cumulative = np.zeros((n_rows, 2*L))
+    np.cumsum(np.abs(series[:, 1:2*L]), axis=1, out=cumulative[:, 1:])
+    norm_c = (cumulative[:, L:] - cumulative[:, :L]).max(axis=1)
+
+    if solver == 'levinson':
+        if kernels is None:
+            kernels = Kernels()
+        # mat_c J = T, T[r][c] = serie[L+r-c]. Then mat_c x = rhs <=> T (J x) = rhs
+        solution, forward, backward = kernels.levinson(series[:, 1:2*L], rhs)
+        vec_b[:] = solution[:, ::-1]
+        with np.errstate(invalid='ignore', over='ignore'):
+            residual = np.abs(np.einsum('nij,nj->ni', mat_c, vec_b) - rhs).max(axis=1)
+            reference = norm_c*np.abs(vec_b).max(axis=1) + np.abs(rhs).max(axis=1)
+            dense = ~(residual <= tolerance*reference)
+            inv_norm[:] = np.maximum(np.abs(forward).sum(axis=1), np.abs(backward).sum(axis=1))
+
+    rows = np.flatnonzero(dense)
+    if len(rows):
+        # Solve rhs, e_1 and e_L together to estimate the norm of the inverse
+        rhs_dense = np.zeros((len(rows), L, 3), dtype=complex)
+        rhs_dense[:, :, 0] = rhs[rows]
+        rhs_dense[:, 0, 1] = 1
+        rhs_dense[:, L-1, 2] = 1
+        try:
+            solution = np.linalg.solve(mat_c[rows], rhs_dense)
+        except np.linalg.LinAlgError:
+            # At least one singular system. Solve row by row, with the least squares 
+            # solution for the singular ones
+            solution = np.empty((len(rows), L, 3), dtype=complex)
+            for pos, i in enumerate(rows):
+                try:
+                    solution[pos] = np.linalg.solve(mat_c[i], rhs_dense[pos])
+                except np.linalg.LinAlgError:
+                    solution[pos] = np.linalg.lstsq(mat_c[i], rhs_dense[pos], rcond=None)[0]
+        vec_b[rows] = solution[:, :, 0]
+        inv_norm[rows] = np.abs(solution[:, :, 1:]).sum(axis=1).max(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_norm = np.maximum(inv_norm, np.abs(vec_b).sum(axis=1)/np.abs(rhs).sum(axis=1))
+        conditioning = norm_c*inv_norm
+    return vec_b, conditioning
+
+
+def pade_batch(series_matrix, length, solver='dense', return_conditioning=False, kernels=None):
+    """
+    Matrix method for the analytic continuation of several power series at once
+
+    series_matrix holds one series per row (e.g. run.V_complex, N x n). The Hankel
+    systems of every row are built with stride tricks and solved together, with a
+    stacked dense solve (solver='dense') or the O(L^2) structured solver
+    (solver='levinson'), see solve_pade_systems. Returns the [L/L] Padé approximant of
+    every row evaluated at 1, with L = (length-1)/2, and the condition number estimate
+    of every Hankel matrix if return_conditioning is True.
+    """
+    series = np.asarray(series_matrix)[:, :length]
+    L = int((length-1)/2)
+    vec_b, conditioning = solve_pade_systems(series, L, solver, kernels)
+    b = np.ones((len(series), L+1), dtype=complex)
+    b[:, 1:] = vec_b[:, ::-1]
+    # sum(a) = sum(b[j]*(serie[0] + ... + serie[L-j]))
+    partial_sums = np.cumsum(series[:, :L+1], axis=1)
+    values = np.sum(b * partial_sums[:, ::-1], axis=1)/np.sum(b, axis=1)
+    if return_conditioning:
+        return values, conditioning
+    return values
+
+def pade_rational(series_matrix, length, solver='dense', kernels=None):
+    """
+    Numerator (a) and denominator (b) coefficients of the [L/L] Padé approximants of
+    every row of series_matrix, with L = (length-1)/2. Both are (rows, L+1) arrays in
+    increasing powers, b[:, 0] = 1. See pade_evaluate.
+    """
+    series = np.asarray(series_matrix)[:, :length]
+    L = int((length-1)/2)
+    vec_b, _ = solve_pade_systems(series, L, solver, kernels)
+    b = np.ones((len(series), L+1), dtype=complex)
+    b[:, 1:] = vec_b[:, ::-1]
+    # a[k] = sum(b[j]*serie[k-j]) for j in 0..k
+    a = np.empty((len(series), L+1), dtype=complex)
+    for k in range(L+1):
+        a[:, k] = np.sum(b[:, :k+1] * series[:, k::-1], axis=1)
+    return a, b
+
+def pade_evaluate(a, b, points):
+    """Evaluate the Padé approximants (a, b) of pade_rational at the points. Returns (rows, points)"""
+    powers = np.asarray(points)[np.newaxis, :] ** np.arange(a.shape[1])[:, np.newaxis]
+    return (a @ powers) / (b @ powers)
+
+def polynomial_roots(coefficients):
+    """
+    Roots of the polynomials of every row of coefficients (increasing powers), whose
+    constant terms are not zero. They are the inverses of the eigenvalues of the
+    companion matrices of the reversed polynomials, so degree drops give infinite roots.
+    """
+    monic = coefficients[:, 1:] / coefficients[:, :1]
+    rows, degree = monic.shape
+    companion = np.zeros((rows, degree, degree), dtype=complex)
+    companion[:, 0, :] = -monic
+    companion[:, np.arange(1, degree), np.arange(degree-1)] = 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1/np.linalg.eigvals(companion)
+
+def pade_poles_zeros(a, b):
+    """Poles and zeros of the Padé approximants (a, b) of pade_rational, (rows, L) each"""
+    return polynomial_roots(b), polynomial_roots(a)
+
+def quadratic_pade_branch_points(serie, m):
+    """
+    Branch points of the quadratic Padé (Hermite-Padé) approximant of degree m of serie
+
+    P, Q and R of degree m such that P*f**2 + Q*f + R = O(s**(3m+2)), which needs 3m+2
+    coefficients. The approximant has square root branch points at the zeros of the
+    discriminant Q**2 - 4PR, which approximate the branch points of f much better
+    than the poles and zeros of the [L/L] Padé approximant that accumulate on its cuts.
+    """
+    K = 3*m + 2
+    serie = np.asarray(serie)[:K]
+    serie_2 = np.convolve(serie, serie)[:K]
+    matrix = np.zeros((K, 3*(m+1)), dtype=complex)
+    # matrix[k][j] = serie[k-j] for the coefficient j of every polynomial
+    for j in range(m+1):
+        matrix[j:, j] = serie_2[:K-j]
+        matrix[j:, m+1+j] = serie[:K-j]
+    matrix[np.arange(m+1), 2*(m+1) + np.arange(m+1)] = 1
+    # Null space of the system
+    coefficients = np.linalg.svd(matrix)[2][-1].conj()
+    P, Q, R = coefficients[:m+1], coefficients[m+1:2*m+2], coefficients[2*m+2:]
+    discriminant = np.convolve(Q, Q) - 4*np.convolve(P, R)
+    discriminant = np.trim_zeros(discriminant, 'b')
+    return np.roots(discriminant[::-1])
+
+class EpsilonTable:
+    """
+    Running Wynn epsilon table for the analytic continuation of several power series at once
+
+    Only the last ascending diagonal of the table is stored. Adding the next coefficient
+    of every series costs O(n) per series, instead of rebuilding and solving the whole
+    Padé system. After an odd number of coefficients 2M+1, value() is the [M/M] Padé
+    approximant evaluated at 1, the same value returned by Epsilon and Pade.
+    n_series is the number of series or the shape of their coefficients, e.g. (N, S) in
+    helm_batch, with the scenarios in the last axis.
+    """
+    def __init__(self, n_series, max_coef):
+        shape = tuple(np.atleast_1d(n_series))
+        self.length = 0
+        self.partial_sum = np.zeros(shape, dtype=complex)
+        # Current and previous ascending diagonals. They are swapped on every addition
+        self.diagonal = np.empty((max_coef,) + shape, dtype=complex)
+        self.previous = np.empty((max_coef,) + shape, dtype=complex)
+
+    def add(self, coefficient):
+        """Add the next coefficient of every series"""
+        m = self.length
+        self.diagonal, self.previous = self.previous, self.diagonal
+        diagonal = self.diagonal
+        previous = self.previous
+        self.partial_sum += coefficient
+        diagonal[0] = self.partial_sum
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for k in range(1, m+1):
+                aux = previous[k-2] if k > 1 else 0
+                diagonal[k] = aux + 1/(diagonal[k-1] - previous[k-1])
+        self.length += 1
+
+    def value(self):
+        """Continuation of every series with the coefficients added so far"""
+        return self.diagonal[self.length-1].copy()
+
+    def select(self, keep):
+        """Keep only the series where keep is True in the last axis (the scenarios of helm_batch)"""
+        self.partial_sum = np.ascontiguousarray(self.partial_sum[..., keep])
+        self.diagonal = np.ascontiguousarray(self.diagonal[..., keep])
+        self.previous = np.ascontiguousarray(self.previous[..., keep])
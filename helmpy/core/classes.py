@@ -1,115 +1,96 @@
 
+import sys
+import time
+from contextlib import nullcontext
 from os.path import basename
 import numpy as np
-import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix, issparse
 
 
+# Integer type codes of the buses used to group them in the HELM run
+BUS_PQ = 0
+BUS_PV = 1  # PV and PVLIM
+BUS_SLACK = 2
+
 
 def process_branches(branches, N_branches, case):
-    """Process each branch of a case data to create Ytrans, Yshunt and others."""
-    for i in range(N_branches):
-        FromBus = int(branches[0][i])-1
-        ToBus = int(branches[1][i])-1
-        R = branches[2][i]
-        X = branches[3][i]
-        BTotal = branches[4][i]
-        Tap = branches[8][i]
-        Shift_degree = branches[9][i]
-
-        FB = case.Number_bus[FromBus] 
-        TB = case.Number_bus[ToBus]
-        case.Ybr_list.append([FB, TB, np.zeros((2, 2), dtype=np.complex128)])
-        Z = R + 1j*X
-        if Tap == 0 or Tap == 1:
-            if Z != 0:
-                Yseries_ft = 1/Z
-                if Shift_degree == 0:
-                    case.Ybr_list[i][2][0, 1] = case.Ybr_list[i][2][1, 0] = -Yseries_ft
-                else:
-                    Shift = np.deg2rad(Shift_degree)
-                    Yseries_ft_shift = Yseries_ft/(np.exp(-1j*Shift))
-                    Yseries_tf_shift = Yseries_ft/(np.exp(1j*Shift))
-                    case.Ybr_list[i][2][0, 1] = -Yseries_ft_shift
-                    case.Ybr_list[i][2][1, 0] = -Yseries_tf_shift
-                    if case.phase_barras[FB]:
-                        if TB in case.phase_dict[FB][0]:
-                            case.phase_dict[FB][1][case.phase_dict[FB][0].index(TB)] += Yseries_ft - Yseries_ft_shift
-                        else:
-                            case.phase_dict[FB][0].append(TB)
-                            case.phase_dict[FB][1].append(Yseries_ft - Yseries_ft_shift)
-                    else:
-                        case.phase_dict[FB] = [[TB], [Yseries_ft - Yseries_ft_shift]]
-                        case.phase_barras[FB] = True
-                    if(case.phase_barras[TB]):
-                        if( FB in case.phase_dict[TB][0]):
-                            case.phase_dict[TB][1][ case.phase_dict[TB][0].index(FB) ] += Yseries_ft - Yseries_tf_shift
-                        else:
-                            case.phase_dict[FB][0].append(FB)
-                            case.phase_dict[FB][1].append(Yseries_ft - Yseries_tf_shift)
-                    else:
-                        case.phase_dict[TB] = [[FB], [Yseries_ft - Yseries_tf_shift]]
-                        case.phase_barras[TB] = True
-                case.Ytrans[FB][TB] += -Yseries_ft
-                case.Ytrans[FB][FB] +=  Yseries_ft
-                case.Ytrans[TB][FB] += -Yseries_ft
-                case.Ytrans[TB][TB] +=  Yseries_ft
-            else:
-                case.Ybr_list[i][2][0,1] = case.Ybr_list[i][2][1,0] = Yseries_ft = 0
-
-            Bshunt_ft = 1j*BTotal/2
-            case.Ybr_list[i][2][0,0] = case.Ybr_list[i][2][1,1] = Bshunt_ft + Yseries_ft
-            case.Yshunt[FB] +=  Bshunt_ft
-            case.Yshunt[TB] +=  Bshunt_ft
-        else:
-            Tap_inv = 1/Tap
-            if Z != 0:
-                Yseries_no_tap = 1/Z
-                Yseries_ft = Yseries_no_tap * Tap_inv
-                if Shift_degree == 0:
-                    case.Ybr_list[i][2][0,1] = case.Ybr_list[i][2][1,0] = -Yseries_ft
-                else:
-                    Shift = np.deg2rad(Shift_degree)                
-                    Yseries_ft_shift = Yseries_ft/(np.exp(-1j*Shift))
-                    Yseries_tf_shift = Yseries_ft/(np.exp(1j*Shift))
-                    case.Ybr_list[i][2][0,1] = -Yseries_ft_shift
-                    case.Ybr_list[i][2][1,0] = -Yseries_tf_shift
-                    if case.phase_barras[FB]:
-                        if TB in case.phase_dict[FB][0]:
-                            case.phase_dict[FB][1][ case.phase_dict[FB][0].index(TB) ] += Yseries_ft - Yseries_ft_shift
-                        else:
-                            case.phase_dict[FB][0].append(TB)
-                            case.phase_dict[FB][1].append(Yseries_ft - Yseries_ft_shift)
-                    else:
-                        case.phase_dict[FB] = [[TB],[Yseries_ft - Yseries_ft_shift]]
-                        case.phase_barras[FB] = True
-                    if case.phase_barras[TB]:
-                        if FB in case.phase_dict[TB][0]:
-                            case.phase_dict[TB][1][ case.phase_dict[TB][0].index(FB) ] += Yseries_ft - Yseries_tf_shift
-                        else:
-                            case.phase_dict[FB][0].append(FB)
-                            case.phase_dict[FB][1].append(Yseries_ft - Yseries_tf_shift)
-                    else:
-                        case.phase_dict[TB] = [[FB],[Yseries_ft - Yseries_tf_shift]]
-                        case.phase_barras[TB] = True
-                case.Ytrans[FB][TB] += -Yseries_ft
-                case.Ytrans[FB][FB] +=  Yseries_ft
-                case.Ytrans[TB][FB] += -Yseries_ft
-                case.Ytrans[TB][TB] +=  Yseries_ft 
-            else:
-                case.Ybr_list[i][2][0,1] = case.Ybr_list[i][2][1,0] = Yseries_no_tap = Yseries_ft = 0
-            
-            B = 1j*BTotal/2
-            Bshunt_f = (Yseries_no_tap + B)*(Tap_inv*Tap_inv) 
-            Bshunt_t = Yseries_no_tap + B
-            case.Ybr_list[i][2][0,0] = Bshunt_f
-            case.Ybr_list[i][2][1,1] = Bshunt_t
-            case.Yshunt[FB] +=  Bshunt_f - Yseries_ft
-            case.Yshunt[TB] +=  Bshunt_t - Yseries_ft
-
-        if TB not in case.branches_buses[FB]:
-            case.branches_buses[FB].append(TB)
-        if FB not in case.branches_buses[TB]:
-            case.branches_buses[TB].append(FB)
+    """Process the branches of a case data to create Ytrans, Yshunt and others.
+
+    Every branch is processed at once with array operations. Ytrans, Yphase
+    (phase shifter terms) and Y are assembled in COO form and stored as CSR
+    matrices that share the sparsity pattern given by branches_buses.
+    """
+    # Assign local variables for faster access
+    N = case.N
+    FB = case.Number_bus[branches[0].to_numpy(dtype=np.int64) - 1]
+    TB = case.Number_bus[branches[1].to_numpy(dtype=np.int64) - 1]
+    R = branches[2].to_numpy(dtype=np.float64)
+    X = branches[3].to_numpy(dtype=np.float64)
+    BTotal = branches[4].to_numpy(dtype=np.float64)
+    Tap = branches[8].to_numpy(dtype=np.float64)
+    Shift = np.deg2rad(branches[9].to_numpy(dtype=np.float64))
+
+    Z = R + 1j*X
+    with_Z = Z != 0
+    with_tap = (Tap != 0) & (Tap != 1)
+    with_shift = (Shift != 0) & with_Z
+    Tap_inv = np.where(with_tap, 1/np.where(with_tap, Tap, 1), 1)
+
+    # Series admittances
+    Yseries_no_tap = np.zeros(N_branches, dtype=np.complex128)
+    Yseries_no_tap[with_Z] = 1/Z[with_Z]
+    Yseries_ft = Yseries_no_tap * Tap_inv
+    Yseries_ft_shift = Yseries_ft/np.exp(-1j*Shift)
+    Yseries_tf_shift = Yseries_ft/np.exp(1j*Shift)
+
+    # Shunt admittances of the pi model
+    B = 1j*BTotal/2
+    Bshunt_f = np.where(with_tap, (Yseries_no_tap + B)*(Tap_inv*Tap_inv), B + Yseries_ft)
+    Bshunt_t = np.where(with_tap, Yseries_no_tap + B, B + Yseries_ft)
+    np.add.at(case.Yshunt, FB, np.where(with_tap, Bshunt_f - Yseries_ft, B))
+    np.add.at(case.Yshunt, TB, np.where(with_tap, Bshunt_t - Yseries_ft, B))
+
+    # Branch admittance matrices and their buses
+    case.Ybr_buses = np.column_stack((FB, TB))
+    case.Ybr = np.empty((N_branches, 2, 2), dtype=np.complex128)
+    case.Ybr[:, 0, 0] = Bshunt_f
+    case.Ybr[:, 0, 1] = -Yseries_ft_shift
+    case.Ybr[:, 1, 0] = -Yseries_tf_shift
+    case.Ybr[:, 1, 1] = Bshunt_t
+
+    # Triplets. Diagonal entries are always stored so the pattern of every row
+    # is the bus itself plus its neighbours, even for branches with Z = 0.
+    diag = np.arange(N)
+    rows = np.concatenate((FB, TB, FB, TB, diag))
+    cols = np.concatenate((TB, FB, FB, TB, diag))
+    Ytrans_data = np.concatenate((-Yseries_ft, -Yseries_ft, Yseries_ft, Yseries_ft,
+                                  np.zeros(N, dtype=np.complex128)))
+    phase_data = np.zeros(len(rows), dtype=np.complex128)
+    phase_data[:N_branches] = np.where(with_shift, Yseries_ft - Yseries_ft_shift, 0)
+    phase_data[N_branches:2*N_branches] = np.where(with_shift, Yseries_ft - Yseries_tf_shift, 0)
+    shunt_data = np.zeros(len(rows), dtype=np.complex128)
+    shunt_data[4*N_branches:] = case.Yshunt
+
+    case.Ytrans = coo_matrix((Ytrans_data, (rows, cols)), shape=(N, N)).tocsr()
+    case.Yphase = coo_matrix((phase_data, (rows, cols)), shape=(N, N)).tocsr()
+    case.Y = coo_matrix((Ytrans_data + phase_data + shunt_data, (rows, cols)), shape=(N, N)).tocsr()
+    for Ymat in (case.Ytrans, case.Yphase, case.Y):
+        Ymat.sum_duplicates()
+    # Only the few buses with phase shifters keep entries in Yphase
+    case.Yphase.eliminate_zeros()
+
+    # Sorted list of the buses connected to each bus (the bus itself included)
+    indptr = case.Ytrans.indptr
+    indices = case.Ytrans.indices
+    case.branches_buses = [indices[indptr[i]:indptr[i+1]].tolist() for i in range(N)]
+
+    # Phase shifter terms per bus: phase_dict[i] = [[buses], [admittances]]
+    phase_rows = np.unique(FB[with_shift].tolist() + TB[with_shift].tolist()).astype(np.int64)
+    case.phase_barras[phase_rows] = True
+    Yphase = case.Yphase
+    for i in phase_rows:
+        pos = slice(Yphase.indptr[i], Yphase.indptr[i+1])
+        case.phase_dict[i] = [Yphase.indices[pos].tolist(), Yphase.data[pos].tolist()]
 
 
 def create_case_data_object_from_xlsx(grid_data_file_path, case_name=None):
@@ -122,27 +103,35 @@ def create_case_data_object_from_xlsx(grid_data_file_path, case_name=None):
         # Extract file path and .xlsx termination to assign case_name
         case_name = basename(grid_data_file_path[0:-5])
 
-    buses = pd.read_excel(grid_data_file_path, sheet_name='Buses', header=None)
-    branches = pd.read_excel(grid_data_file_path, sheet_name='Branches', header=None)
-    generators = pd.read_excel(grid_data_file_path, sheet_name='Generators', header=None)
+    # pandas and openpyxl are only loaded to read the xlsx files
+    import pandas as pd
+
+    stats = RunStats()
+    with stats.phase('parsing'):
+        buses = pd.read_excel(grid_data_file_path, sheet_name='Buses', header=None)
+        branches = pd.read_excel(grid_data_file_path, sheet_name='Branches', header=None)
+        generators = pd.read_excel(grid_data_file_path, sheet_name='Generators', header=None)
     N = len(buses.index)
     N_generators = len(generators.index)
     N_branches = len(branches.index)
 
     # Create CaseData object
     case = CaseData(case_name, N, N_generators)
+    case.stats = stats
 
     case.N_branches = N_branches
+    case.branches_data = branches
     case.Pd[:] = buses[2]/100
     case.Qd[:] = buses[3]/100
     case.Shunt[:] = buses[5]*1j/100 + buses[4]/100
     case.Yshunt[:] = np.copy(case.Shunt)
 
-    for i in range(N):
-        case.Number_bus[int(buses[0][i])-1] = i
-        if buses[1][i] == 3:
-            case.slack_bus = int(buses[0][i])
-            case.slack = i
+    # Map bus numbers (which do not need to be consecutive) to bus positions
+    bus_numbers = buses[0].to_numpy(dtype=np.int64)
+    case.Number_bus = np.full(bus_numbers.max(), -1, dtype=np.int64)
+    case.Number_bus[bus_numbers-1] = np.arange(N)
+    case.slack = np.flatnonzero(buses[1].to_numpy() == 3)[0]
+    case.slack_bus = int(bus_numbers[case.slack])
 
     pos = 0
     for i in range(N_generators):
@@ -159,19 +148,10 @@ def create_case_data_object_from_xlsx(grid_data_file_path, case_name=None):
     case.Buses_type[case.slack] = 'Slack'
     case.Pg[case.slack] = 0
 
-    process_branches(branches, N_branches, case) 
+    with stats.phase('Y assembly'):
+        process_branches(branches, N_branches, case)
 
-    for i in range(N):
-        case.branches_buses[i].sort()    # Variable that saves the branches
-
-    case.Y[:] = np.copy(case.Ytrans)
-    for i in range(N):
-        if case.Yshunt[i].real != 0:
-            case.conduc_buses[i] = True
-        case.Y[i,i] += case.Yshunt[i]
-        if case.phase_barras[i]:
-            for k in range(len(case.phase_dict[i][0])):
-                case.Y[i, case.phase_dict[i][0][k]] += case.phase_dict[i][1][k]
+    case.conduc_buses[:] = case.Yshunt.real != 0
 
     return case
 
@@ -186,9 +166,10 @@ class CaseData:
         self.N = N
         self.N_generators = N_generators
         self.N_branches = np.int64(0)  # Initialize with a default value
+        self.branches_data = None  # Branches sheet, to process the branches again (outages)
         self.slack_bus = np.int64(0)    # Initialize with a default value
         self.slack = np.int64(0)         # Initialize with a default value
-        self.Number_bus = np.zeros(N, dtype=np.int64)  # Use an array instead of a dict
+        self.Number_bus = np.zeros(N, dtype=np.int64)  # Bus number - 1 -> bus position
         # dtype must be wide enough for 'Slack'/'PVLIM'; a plain np.array(['PQ']*N)
         # would be '<U2' and silently truncate longer type strings.
         self.Buses_type = np.array(['PQ'] * N, dtype='<U5')  # Use an array for types
@@ -202,30 +183,145 @@ class CaseData:
         self.Shunt = np.empty(N, dtype=np.complex128)
         self.conduc_buses = np.full(N, False)
         self.Yshunt = np.empty(N, dtype=np.complex128)
-        self.Ytrans = np.zeros((N, N), dtype=np.complex128)
-        self.Y = np.zeros((N, N), dtype=np.complex128)
-        self.Yre = np.real(self.Y)
-        self.Yimag = np.imag(self.Y)
-        self.branches_buses = [[i] for i in range(N)]  # Convert list of lists to a 2D array
-        self.Ybr_list = []  # List of [from_bus, to_bus, 2x2 complex Ybr] triples
+        # Sparse (CSR) admittance matrices. Y = Ytrans + diag(Yshunt) + Yphase
+        self.Ytrans = csr_matrix((N, N), dtype=np.complex128)
+        self.Yphase = csr_matrix((N, N), dtype=np.complex128)
+        self.Y = csr_matrix((N, N), dtype=np.complex128)
+        self.branches_buses = [[i] for i in range(N)]  # Sorted buses connected to each bus
+        self.Ybr_buses = np.empty((0, 2), dtype=np.int64)  # [from_bus, to_bus] of each branch
+        self.Ybr = np.empty((0, 2, 2), dtype=np.complex128)  # 2x2 complex Ybr of each branch
         self.phase_barras = np.full(N, False)
-        self.phase_dict = np.zeros(N, dtype=np.int64)  # Use an array instead of a dict
+        self.phase_dict = dict()  # bus -> [[buses], [phase shifter admittances]]
 
         # case parameters
         self.scale = 1.0
+        # (Pd, Qd, Pg) at scale 1 while the case is scaled, restored exactly by reset_scale
+        self.unscaled = None
+
+        # Times of the parsing and Y assembly of the case (RunStats)
+        self.stats = RunStats()
 
     def set_scale(self, scale):
         self.scale = scale
+        self.unscaled = (self.Pd.copy(), self.Qd.copy(), self.Pg.copy())
         self.Pd *= scale
         self.Qd *= scale
         self.Pg *= scale
 
     def reset_scale(self):
-        self.Pd /= self.scale
-        self.Qd /= self.scale
-        self.Pg /= self.scale
+        # Dividing by the scale would leave round-off errors in the case after every run
+        self.Pd[:], self.Qd[:], self.Pg[:] = self.unscaled
+        self.unscaled = None
         self.scale = 1.0
 
+class RunStats:
+    """Wall time and number of calls of the phases of a run, and counters of events.
+
+    Phases are timed with `with stats.phase(name):`. Nested phases are included in
+    the time of the outer ones. A disabled object records nothing.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.time = dict()      # phase: seconds
+        self.calls = dict()     # phase: number of calls
+        self.counters = dict()  # event: count
+
+    def phase(self, name):
+        if not self.enabled:
+            return _no_phase
+        return _Phase(self, name)
+
+    def add(self, name, seconds, calls=1):
+        self.time[name] = self.time.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        """Add the phases and counters of other RunStats"""
+        for name, seconds in other.time.items():
+            self.add(name, seconds, other.calls[name])
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    def as_dict(self):
+        return {'time': dict(self.time), 'calls': dict(self.calls), 'counters': dict(self.counters)}
+
+    def __str__(self):
+        lines = ["%-24s %12s %8s"%('Phase', 'Time (ms)', 'Calls')]
+        lines += ["%-24s %12.3f %8d"%(name, 1e3*seconds, self.calls[name]) for name, seconds in self.time.items()]
+        lines += ["%-24s %21d"%(name, n) for name, n in self.counters.items()]
+        return "\n".join(lines)
+
+
+class _Phase:
+    """Context manager that adds its wall time to a phase of a RunStats"""
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.add(self.name, time.perf_counter() - self.start)
+
+
+_no_phase = nullcontext()
+
+
+def structure_bytes(obj):
+    """Bytes of the arrays, sparse matrices, DataFrames and lists held by the attributes
+    of obj, {attribute: bytes}. Views of other arrays are not counted."""
+    sizes = dict()
+    for name, value in vars(obj).items():
+        if isinstance(value, np.ndarray):
+            if value.base is None:
+                sizes[name] = value.nbytes
+        elif issparse(value):
+            sizes[name] = sum(getattr(value, part).nbytes for part in ('data', 'indices', 'indptr', 'row', 'col')
+                              if hasattr(value, part))
+        elif hasattr(value, 'memory_usage'):
+            # pandas DataFrame
+            sizes[name] = int(value.memory_usage(index=True).sum())
+        elif isinstance(value, list):
+            sizes[name] = sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value
+                                                     if isinstance(item, list))
+    return sizes
+
+
+class MemoryReport:
+    """Memory of a run.
+
+    peak is the peak traced by tracemalloc during the run (NumPy arrays and Python
+    objects, not the internal memory of SuperLU), case and run the bytes of every
+    structure of CaseData and RunVariables (see structure_bytes) at the end of it.
+    """
+    def __init__(self, peak, case, run):
+        self.peak = peak
+        self.case = case
+        self.run = run
+
+    @property
+    def total(self):
+        return sum(self.case.values()) + sum(self.run.values())
+
+    def __str__(self):
+        lines = ["Peak traced memory: %.3f MB"%(self.peak/2**20) if self.peak is not None else
+                 "Peak traced memory: not traced"]
+        lines.append("Structures: %.3f MB"%(self.total/2**20))
+        structures = [('case.' + name, size) for name, size in self.case.items()] + \
+                     [('run.' + name, size) for name, size in self.run.items()]
+        for name, size in sorted(structures, key=lambda item: -item[1]):
+            if size:
+                lines.append("    %-32s %12.3f MB"%(name, size/2**20))
+        return "\n".join(lines)
+
+
 class RunVariables:
     """Group of variables neededed in the run."""
     def __init__(self, case, pv_bus_model, DSB_model, DSB_model_method, max_coef):
@@ -260,23 +356,53 @@ class RunVariables:
         self.list_gen_remove = []
         self.list_coef = []
         self.solve = None
+        # Factorization of the first Ytrans_mod. Restarts solve with low rank corrections of it
+        # while their rank is not greater than max_update_rank (0 refactors every restart)
+        self.base_Ytrans_mod = None
+        self.base_solve = None
+        self.max_update_rank = 0
+        self.update_rank = 0
+        # Fill-reducing bus ordering of the factorization (see bus_ordering) and its fill ratio
+        self.ordering = 'colamd'
+        self.bus_order = None
+        self.fill_ratio = None
+        # Backend of the factorization (see linear_solvers)
+        self.linear_solver = 'superlu'
+        # 'real' (modif_Ytrans) or 'complex' (modif_Ytrans_complex) system of the coefficients
+        self.formulation = 'real'
+        # (solve, PV buses, F^T A^-1 C of them) of modif_Ytrans_complex, reused on restarts
+        self.border_cache = None
+        # Timing and counters of the phases of the run. Disabled unless helm(stats=True)
+        self.stats = RunStats(enabled=False)
+        # MemoryReport of the run. Only with helm(memory_report=True)
+        self.memory = None
         self.coefficients = np.empty((length,set_coef), dtype=np.float64)
         self.Soluc_eval = np.empty((length,set_coef), dtype=np.float64)
         self.Soluc_no_eval = []
         self.V_complex = np.empty((N, set_coef), dtype=np.complex128)
         self.W = np.empty((N, set_coef), dtype=np.complex128)
 
+        # Condition number estimates of the Padé matrices of the last convergence check.
+        # Only with continuation='pade'
+        self.pade_conditioning = None
+
+        # Bus type codes (BUS_PQ, BUS_PV, BUS_SLACK). Set on every (re)start
+        self.bus_type_code = None
+
+        # HELM pv_bus_model 2 and DSB_model_method 2.
+        # Product Ytrans*V_complex per bus and coefficient
+        if pv_bus_model == 2 or DSB_model_method == 2:
+            self.barras_CC = np.empty((N, set_coef), dtype=np.complex128)
+        else: self.barras_CC = None
+
         # HELM pv_bus_model 2
         if pv_bus_model == 2:
-            self.barras_CC = dict()
-            for i in self.list_gen:
-                self.barras_CC[i] = np.empty(set_coef, dtype=np.complex128)
             self.VVanterior = np.empty(N, dtype=np.float64)
-        else: self.barras_CC=None; self.VVanterior=None
+        else: self.VVanterior = None
 
         # HELM pv_bus_model 1
         if pv_bus_model == 1:
-            self.Y_Vsp_PV = []
+            self.Y_Vsp_PV = None  # Sparse (length, N) matrix with the moved PV columns
             self.Vre_PV = np.empty((N, set_coef), dtype=np.float64)
             self.resta_columnas_PV = np.empty(length, dtype=np.float64)
         else: self.Y_Vsp_PV=None; self.Vre_PV=None; self.resta_columnas_PV=None
@@ -286,16 +412,6 @@ class RunVariables:
         if DSB_model_method is not None:
             self.Pg_imbalance = np.sum(case.Pd) - np.sum(case.Pg)
         else: self.Pg_imbalance=None
-
-        # DSB_model_method 2
-        if DSB_model_method == 2:
-            if pv_bus_model == 2:
-                self.barras_CC[case.slack] = np.empty(set_coef, dtype=np.complex128)
-                self.slack_CC = None
-            else: 
-                self.slack_CC  = np.empty(set_coef, dtype=np.complex128)
-        else:
-            self.slack_CC = None
         
     def expand_coef_arrays(self):
         """
@@ -336,21 +452,292 @@ class RunVariables:
                 self.Vre_PV = np.empty((N, max_coef), dtype=np.float64)
                 self.Vre_PV[:,0:set_coef] = Vre_PV
 
-            if self.pv_bus_model == 2:
+            if self.barras_CC is not None:
                 # barras_CC
-                for i in self.list_gen:
-                    barras_CC = self.barras_CC[i]
-                    self.barras_CC[i] = np.empty(max_coef, dtype=np.complex128)
-                    self.barras_CC[i][:set_coef] = barras_CC
-
-            # DSB_model_method 2
-            if self.DSB_model_method == 2:
-                if self.pv_bus_model == 2:
-                    barras_CC = self.barras_CC[self.slack]
-                    self.barras_CC[self.slack] = np.empty(max_coef, dtype=np.complex128)
-                    self.barras_CC[self.slack][:set_coef] = barras_CC
-                else: 
-                    slack_CC = self.slack_CC
-                    self.slack_CC = np.empty(max_coef, dtype=np.complex128)
-                    self.slack_CC[:set_coef] = slack_CC
+                barras_CC = self.barras_CC
+                self.barras_CC = np.empty((N, max_coef), dtype=np.complex128)
+                self.barras_CC[:,0:set_coef] = barras_CC
+
+
+class BatchResults:
+    """Per scenario data and results of a batch run (helm_batch).
+
+    Arrays have one column per scenario: (N, S).
+    """
+    def __init__(self, case, Pd, Qd, Pg, DSB_model_method):
+        N, S = Pd.shape
+        self.N = N
+        self.S = S
+
+        # Scenarios data
+        self.Pd = np.array(Pd, dtype=np.float64)
+        self.Qd = np.array(Qd, dtype=np.float64)
+        self.Pg = np.array(Pg, dtype=np.float64)
+        if DSB_model_method is not None:
+            self.Pg_imbalance = np.sum(self.Pd, axis=0) - np.sum(self.Pg, axis=0)
+        else: self.Pg_imbalance = None
+
+        # Bus types and K factors of every scenario. They change with PVLIM to PQ switches
+        self.Buses_type = np.repeat(case.Buses_type[:, np.newaxis], S, axis=1)
+        self.K = np.zeros((N, S), dtype=np.float64)
 
+        # Results
+        self.Qg = np.zeros((N, S), dtype=np.float64)
+        self.V_complex_profile = np.full((N, S), np.nan, dtype=np.complex128)
+        self.series_large = np.zeros(S, dtype=np.int64)
+        self.flag_divergence = np.zeros(S, dtype=bool)
+        self.list_coef = [[] for _ in range(S)]
+
+
+class BatchRunVariables:
+    """Group of variables needed in the run of a group of scenarios that share the
+    bus types and K factors, and so the factorization of the modified Y matrix.
+
+    Arrays of coefficients have the scenarios in the last axis: (length, n, S).
+    """
+    def __init__(self, case, results, scenarios, pv_bus_model, DSB_model_method, max_coef):
+        # For readability
+        N = case.N
+        S = len(scenarios)
+
+        # Set number of coefficientis to start arrays. This is to reduce the array size
+        set_coef = 40 if max_coef > 40 else max_coef
+        self.not_expanded = True # Variable execute expand_coef_arrays only once
+
+        # Scenarios of the group and the data they share
+        self.scenarios = np.asarray(scenarios)
+        self.Buses_type = np.copy(results.Buses_type[:, scenarios[0]])
+        self.list_gen = np.flatnonzero((self.Buses_type == 'PV') | (self.Buses_type == 'PVLIM'))
+        self.K = np.copy(results.K[:, scenarios[0]])
+        self.N = N
+        self.slack = case.slack
+
+        # Length. Number of equations
+        length = 2*N if DSB_model_method is None else 2*N+1
+        self.length = length
+
+        # Variables
+        self.pv_bus_model = pv_bus_model
+        self.DSB_model_method = DSB_model_method
+        self.max_coef = max_coef
+        self.Pi = results.Pg[:, scenarios] - results.Pd[:, scenarios]
+        self.Si = self.Pi + 1j*(results.Qg[:, scenarios] - results.Qd[:, scenarios])
+        self.solve = None
+        # Factorization shared by the groups of scenarios (see RunVariables)
+        self.base_Ytrans_mod = None
+        self.base_solve = None
+        self.max_update_rank = 0
+        self.update_rank = 0
+        self.ordering = 'colamd'
+        self.bus_order = None
+        self.fill_ratio = None
+        self.linear_solver = 'superlu'
+        self.stats = RunStats(enabled=False)
+        # Convolution kernels of the recursion (Kernels)
+        self.kernels = None
+        self.bus_type_code = None
+        self.coefficients = np.empty((length, set_coef, S), dtype=np.float64)
+        self.Soluc_eval = np.empty((length, set_coef, S), dtype=np.float64)
+        self.Soluc_no_eval = []
+        self.V_complex = np.empty((N, set_coef, S), dtype=np.complex128)
+        self.W = np.empty((N, set_coef, S), dtype=np.complex128)
+        self.V_continued_previous = None
+
+        # pv_bus_model 2 and DSB_model_method 2. Product Ytrans*V_complex per bus and coefficient
+        if pv_bus_model == 2 or DSB_model_method == 2:
+            self.barras_CC = np.empty((N, set_coef, S), dtype=np.complex128)
+        else: self.barras_CC = None
+
+        # pv_bus_model 2
+        if pv_bus_model == 2:
+            self.VVanterior = np.empty((N, S), dtype=np.float64)
+        else: self.VVanterior = None
+
+        # pv_bus_model 1
+        self.Y_Vsp_PV = None
+        if pv_bus_model == 1:
+            self.Vre_PV = np.empty((N, set_coef, S), dtype=np.float64)
+            self.resta_columnas_PV = np.empty((length, S), dtype=np.float64)
+        else: self.Vre_PV = None; self.resta_columnas_PV = None
+
+    def expand_coef_arrays(self):
+        """
+        Expand the arrays of coefficients to the maximum number of coefficents (max_coef).
+        They were originally set to 40 coeffcients if max_coef was higher than 40.
+        """
+        if self.not_expanded:
+            self.not_expanded = False
+            for name in ('coefficients', 'Soluc_eval', 'V_complex', 'W', 'barras_CC', 'Vre_PV'):
+                array = getattr(self, name)
+                if array is not None:
+                    expanded = np.empty((array.shape[0], self.max_coef, array.shape[2]), dtype=array.dtype)
+                    expanded[:, :array.shape[1]] = array
+                    setattr(self, name, expanded)
+
+    def select(self, keep):
+        """Keep only the scenarios of the group where keep (boolean, S) is True"""
+        self.scenarios = self.scenarios[keep]
+        for name in ('Pi', 'Si', 'coefficients', 'Soluc_eval', 'V_complex', 'W', 'V_continued_previous',
+                     'barras_CC', 'VVanterior', 'Vre_PV', 'resta_columnas_PV'):
+            array = getattr(self, name)
+            if array is not None:
+                setattr(self, name, np.ascontiguousarray(array[..., keep]))
+
+
+class NRRunVariables:
+    """Group of variables needed in a run of nr or nr_ds. Every run has its own, so
+    runs in different threads do not share any state."""
+    def __init__(self, N, N_generators, N_branches, mismatch=1e-4, scale=1, iterations_limit=15):
+        self.N = N
+        self.N_generators = N_generators
+        self.N_branches = N_branches
+        # Run parameters
+        self.Mis = mismatch
+        self.scale = scale
+        self.iterations_limit = iterations_limit
+
+        # Case data
+        self.ref = 0
+        self.Number_bus = dict()
+        self.Buses = [0 for i in range(N)]
+        self.V = np.ones(N)
+        self.tita = np.zeros(N)
+        self.Pg = np.zeros(N)
+        self.Pesp = np.copy(self.Pg)
+        self.Qg = np.zeros(N)
+        self.Pd = np.zeros(N)
+        self.Qd = np.zeros(N)
+        self.Qgmax = np.zeros(N)
+        self.Qgmin = np.zeros(N)
+        self.Shunt = np.zeros(N, dtype=complex)
+        self.list_gen = np.zeros(N_generators-1, dtype=int)
+        self.PVLIM_flag = 0
+        self.PVLIM_buses = False
+        # Distributed slack (nr_ds): participation factors, generators that contribute
+        # to the slack and active power losses
+        self.K_factors = np.zeros(N, dtype=float)
+        self.Gen_contribute = []
+        self.Ploss = 0
+
+        # Admittances, those of the CaseData of the run (CSR Y and branches_buses)
+        self.Y = None
+        self.branches_buses = [[i] for i in range(N)]
+        self.Ybr_list = list()
+
+        # State and injections
+        self.Vre = np.ones(N, dtype=float)
+        self.Vimag = np.zeros(N, dtype=float)
+        self.V_complex_profile = np.ones(N, dtype=complex)
+        self.Pi = np.zeros(N, dtype=float)
+        self.Qi = np.zeros(N, dtype=float)
+
+        # Jacobian: known and unknown deltas and their positions per bus. Sparsity pattern:
+        # pairs of buses of the entries, their admittances, pairs of the blocks H, N, J
+        # and L, order of the entries in the CSC matrix Jaco and buses of the participation
+        # factors (nr_ds)
+        self.dimension = 0
+        self.known = []
+        self.unknown = []
+        self.known_dict = dict()
+        self.unknown_dict = dict()
+        # Buses and positions of the deltas dP, dQ, dtita and dV
+        self.dP_buses = self.dP_positions = None
+        self.dQ_buses = self.dQ_positions = None
+        self.tita_buses = self.tita_positions = None
+        self.V_buses = self.V_positions = None
+        self.jaco_bus_i = None
+        self.jaco_bus_k = None
+        self.jaco_diagonal = None
+        self.jaco_G = None
+        self.jaco_B = None
+        self.jaco_blocks = []
+        self.jaco_order = None
+        self.jaco_K_buses = None
+        self.Jaco = None
+        self.deltas_P_Q = 0
+        self.deltas = None
+
+        # Iterations
+        self.iterations = 0
+        self.list_iterations = []
+        self.divergence = False
+
+
+class PVCurve:
+    """Voltages of every bus along a sweep of loading values (scales) of a case.
+
+    Arrays have one column per loading value: (N, M).
+    """
+    def __init__(self, case, scales):
+        N = case.N
+        M = len(scales)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.V_complex = np.full((N, M), np.nan, dtype=np.complex128)
+        self.Buses_type = np.repeat(case.Buses_type[:, np.newaxis], M, axis=1)
+        # Points where the power flow was solved with helm. The others come from the
+        # Padé approximants of the loading series
+        self.solved = np.zeros(M, dtype=bool)
+        # Last loading value with solution and first one without, if helm diverged
+        self.collapse = None
+
+    @property
+    def magnitudes(self):
+        return np.abs(self.V_complex)
+
+    @property
+    def angles(self):
+        """Phase angles in degrees"""
+        return np.angle(self.V_complex, deg=True)
+
+    def table(self):
+        """PV-curve table. One row per loading value and one column per bus (position) magnitude"""
+        import pandas as pd
+        table = pd.DataFrame(self.magnitudes.T, index=self.scales)
+        table.index.name = 'Scale'
+        table['Solved'] = self.solved
+        return table
+
+
+class CollapsePoint:
+    """Estimation of the maximum loading (voltage collapse point) of a case."""
+    def __init__(self, case, base_scale):
+        # Loading scale of the helm run whose approximants give the estimation
+        self.base_scale = base_scale
+        # Estimated maximum loading scale
+        self.scale = np.nan
+        # Fraction of the estimations of the weakest buses that agree with scale
+        self.confidence = 0.0
+        # Buses (positions) with the largest voltage magnitude sensitivity near the collapse
+        self.weakest_buses = np.empty(0, dtype=np.int64)
+        # Loading scale of the first real positive pole or zero of every bus' Padé approximant
+        self.pade_branch_points = np.full(case.N, np.nan)
+        # Loading scale where a PV bus reaches its Qgen limit along the approximants
+        # before scale (NaN if none). The bus types change there
+        self.limit_scale = np.nan
+        # Maximum loading located by bisection with helm (collapse_point with verify):
+        # the largest solved scale and the bracket of the collapse
+        self.verified_scale = np.nan
+        self.bracket = (np.nan, np.nan)
+        # Number of power flows solved with helm
+        self.solves = 0
+
+
+class ContingencyResults:
+    """Results of the outages of a contingency analysis, stacked in one column each.
+
+    Branch flows are the complex powers (MVA) injected at the from and to ends of every
+    branch, like in the branch results of helm.
+    """
+    def __init__(self, case, outages):
+        N = case.N
+        C = len(outages)
+        self.outages = list(outages)
+        self.V_complex_profile = np.full((N, C), np.nan, dtype=np.complex128)
+        self.S_from = np.full((case.N_branches, C), np.nan, dtype=np.complex128)
+        self.S_to = np.full((case.N_branches, C), np.nan, dtype=np.complex128)
+        self.Buses_type = np.repeat(case.Buses_type[:, np.newaxis], C, axis=1)
+        self.series_large = np.zeros(C, dtype=np.int64)
+        self.flag_divergence = np.zeros(C, dtype=bool)
+        # Outages that split the grid in islands. They are not solved
+        self.islanded = np.zeros(C, dtype=bool)
+        self.list_coef = [[] for _ in range(C)]
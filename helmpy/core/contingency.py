@@ -0,0 +1,177 @@
+"""
+HELMpy, open source package of power flow solvers developed on Python 3
+Copyright (C) 2019 Tulio Molina tuliojose8@gmail.com and Juan José Ortega juanjoseop10@gmail.com
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+N-1 contingency analysis with HELM.
+
+Every outage system is derived from the base CaseData: a branch outage processes
+the branches again with the admittances of the branch set to zero, and a generator
+outage turns its bus into a PQ bus without generation. Their modified Y matrices
+differ from the base one in the rows and columns of a few buses, so helm solves
+them with low rank corrections of the base factorization (see modif_Ytrans).
+
+The outages are solved in a process pool. SuperLU factorizations cannot be sent to
+other processes, so every worker factorizes the base matrix once when it starts.
+"""
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from helmpy.core.classes import RunVariables, ContingencyResults, process_branches
+from helmpy.core.helm import helm, modif_Ytrans, compute_k_factor, K_slack_1, branch_flows
+
+
+# Base case and options of the process. Set by init_worker
+_worker = {}
+
+
+def check_outage(case, outage):
+    """Raise ValueError if outage is not ('branch', position) or ('generator', bus number) of case"""
+    kind, element = outage
+    if kind == 'branch':
+        if not 0 <= element < case.N_branches:
+            raise ValueError("Branch %s does not exist."%str(element))
+    elif kind == 'generator':
+        if not 0 < element <= len(case.Number_bus) or case.Number_bus[element-1] < 0:
+            raise ValueError("Bus %s does not exist."%str(element))
+        bus = case.Number_bus[element-1]
+        if bus == case.slack:
+            raise ValueError("The generator of the slack bus cannot be taken out.")
+        if bus not in case.list_gen:
+            raise ValueError("Bus %d has no generator."%element)
+    else:
+        raise ValueError("Outages must be ('branch', position) or ('generator', bus number).")
+
+def outage_case(case, outage):
+    """
+    CaseData of case after the outage ('branch', position of the branch in the
+    Branches sheet) or ('generator', bus number). The base case is not modified.
+    """
+    check_outage(case, outage)
+    kind, element = outage
+    outage_case = copy.copy(case)
+    if kind == 'branch':
+        branches = case.branches_data.copy()
+        # Without impedance, line charging and shunts the branch has no admittances
+        branches.iloc[element, [2, 3, 4]] = 0
+        outage_case.Yshunt = np.copy(case.Shunt)
+        outage_case.phase_barras = np.full(case.N, False)
+        outage_case.phase_dict = dict()
+        process_branches(branches, case.N_branches, outage_case)
+        outage_case.branches_data = branches
+        outage_case.conduc_buses = outage_case.Yshunt.real != 0
+    else: # kind == 'generator'
+        bus = case.Number_bus[element-1]
+        outage_case.Buses_type = np.copy(case.Buses_type)
+        outage_case.Buses_type[bus] = 'PQ'
+        outage_case.list_gen = case.list_gen[case.list_gen != bus]
+        outage_case.N_generators = case.N_generators - 1
+        outage_case.Pg = np.copy(case.Pg)
+        outage_case.Pg[bus] = 0
+    return outage_case
+
+def islands(case):
+    """Number of groups of buses connected by branches with series admittance"""
+    # Pattern of the nonzero admittances, connected_components takes real weights
+    return connected_components(case.Ytrans != 0, directed=False, return_labels=False)
+
+def base_factorization(case, pv_bus_model, DSB_model, DSB_model_method, K_factors, ordering, linear_solver):
+    """(Ytrans_mod, solve) of the first start of helm on case"""
+    run = RunVariables(case, pv_bus_model, DSB_model, DSB_model_method, 5)
+    run.external_K = K_factors
+    run.ordering = ordering
+    run.linear_solver = linear_solver
+    if DSB_model:
+        compute_k_factor(case, run)
+    elif DSB_model_method is not None:
+        K_slack_1(case, run)
+    modif_Ytrans(DSB_model_method, pv_bus_model, case, run)
+    return run.base_Ytrans_mod, run.base_solve
+
+def init_worker(case, options):
+    """Keep the base case and options in the process and factorize the base matrix"""
+    _worker['case'] = case
+    _worker['options'] = options
+    _worker['islands'] = islands(case)
+    _worker['factorization'] = base_factorization(case, options['pv_bus_model'], options['DSB_model'],
+                                                  options['DSB_model_method'], options['K_factors'],
+                                                  options['ordering'], options['linear_solver'])
+
+def solve_outage(outage):
+    """
+    helm of one outage of the base case of the process.
+    Returns None if it is islanded, else (V_complex_profile, branch flows, Buses_type,
+    series_large, flag_divergence, list_coef).
+    """
+    case = outage_case(_worker['case'], outage)
+    if islands(case) > _worker['islands']:
+        return None
+    run, series_large, flag_divergence = helm(case, factorization=_worker['factorization'], **_worker['options'])
+    V = run.V_complex_profile
+    return V, branch_flows(V, case), run.Buses_type, series_large, flag_divergence, run.list_coef
+
+def contingencies(case, outages, mismatch=1e-4, max_coefficients=100, enforce_Q_limits=True, pv_bus_model=2,
+                  DSB_model=False, DSB_model_method=None, K_factors=None, max_update_rank=50,
+                  ordering='colamd', linear_solver='superlu', processes=None) -> ContingencyResults:
+    """
+    Solve the outages of case with helm, in parallel.
+
+    outages is a list of ('branch', position of the branch in the Branches sheet) and
+    ('generator', bus number). The other arguments are those of helm. processes is the
+    number of processes of the pool (default os.cpu_count()), 1 solves in this process.
+
+    Returns a ContingencyResults object with the voltages, bus types (N, C) and branch
+    flows (N_branches, C) of the outages, and their convergence status (C,). Outages
+    that split the grid in islands are not solved.
+    """
+    if case.branches_data is None:
+        raise ValueError("The branches data of the case is needed to apply the outages.")
+    for outage in outages:
+        # Arguments validation before starting the processes
+        check_outage(case, outage)
+
+    if DSB_model and DSB_model_method is None:
+        DSB_model_method = 2
+    options = dict(mismatch=mismatch, max_coefficients=max_coefficients, enforce_Q_limits=enforce_Q_limits,
+                   pv_bus_model=pv_bus_model, DSB_model=DSB_model, DSB_model_method=DSB_model_method,
+                   K_factors=K_factors, max_update_rank=max_update_rank, ordering=ordering,
+                   linear_solver=linear_solver)
+    results = ContingencyResults(case, outages)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(outages))
+    if processes <= 1:
+        init_worker(case, options)
+        solutions = list(map(solve_outage, outages))
+    else:
+        with ProcessPoolExecutor(processes, initializer=init_worker, initargs=(case, options)) as pool:
+            solutions = list(pool.map(solve_outage, outages, chunksize=max(1, len(outages)//(4*processes))))
+
+    for c, solution in enumerate(solutions):
+        if solution is None:
+            results.islanded[c] = True
+            results.flag_divergence[c] = True
+            continue
+        V, S_branches, Buses_type, series_large, flag_divergence, list_coef = solution
+        results.V_complex_profile[:, c] = V
+        results.S_from[:, c] = S_branches[:, 0]
+        results.S_to[:, c] = S_branches[:, 1]
+        results.Buses_type[:, c] = Buses_type
+        results.series_large[c] = series_large
+        results.flag_divergence[c] = flag_divergence
+        results.list_coef[c] = list_coef
+
+    return results
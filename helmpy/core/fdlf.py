@@ -0,0 +1,240 @@
+"""
+HELMpy, open source package of power flow solvers developed on Python 3
+Copyright (C) 2019 Tulio Molina tuliojose8@gmail.com and Juan José Ortega juanjoseop10@gmail.com
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Fast decoupled load flow (FDLF), XB and BX versions.
+
+The P-theta and Q-V halves of every iteration solve the constant matrices B' and B'',
+factorized once per set of bus types (again only after PVLIM to PQ switches):
+    B' dtita = dP/V,    B'' dV = dQ/V
+XB neglects the resistances in B', BX in B''. B' also neglects line charging, bus shunts
+and taps, B'' phase shifts. With the distributed slack bus model (DSB_model=True), B' has
+the column of the participation factors K of the active power losses Ploss, as the
+jacobian of nr_ds. The case processing, the mismatch and the PVLIM checks are those of nr
+and nr_ds, so the solution is the same within the mismatch.
+"""
+
+import logging
+
+import numpy as np
+from scipy.sparse import coo_matrix, csc_matrix, hstack
+
+from helmpy.core.functions import *
+from helmpy.core.linear_solvers import get_linear_solver
+from helmpy.core.classes import RunStats, NRRunVariables, CaseData
+from helmpy.core.logs import log_event, details_enabled, print_details, get_logger
+from helmpy.core.nr import preprocess_case_data, Jacobian, Convergence_Check, Check_Generators_Limits, \
+    Power_Injections, Update_Voltages, case_data
+from helmpy.core.nr_ds import Jacobian as Jacobian_DS, Convergence_Check as Convergence_Check_DS, \
+    Compute_K_factors
+
+logger = get_logger(__name__)
+
+
+# -imag(Y) of the branches, (N, N) sparse
+def branches_susceptance(From, To, R, X, BTotal, Tap, Shift_degree, N):
+    Z = R + 1j*X
+    Yseries = np.zeros(len(Z), dtype=complex)
+    Yseries[Z != 0] = 1/Z[Z != 0]
+    Tap_complex = Tap*np.exp(1j*np.deg2rad(Shift_degree))
+    Bshunt = 1j*BTotal/2
+    Y = coo_matrix((
+        np.concatenate(((Yseries + Bshunt)/(Tap*Tap), Yseries + Bshunt,
+                        -Yseries/np.conj(Tap_complex), -Yseries/Tap_complex)),
+        (np.concatenate((From, To, From, To)), np.concatenate((From, To, To, From)))
+    ), shape=(N, N)).tocsr()
+    return -Y.imag
+
+
+# B' and B'' of the case, (N, N) sparse
+def Susceptance_Matrices(case, method, run):
+    N = run.N
+    branches = case.branches_data
+    From = case.Number_bus[branches[0].to_numpy(dtype=np.int64) - 1]
+    To = case.Number_bus[branches[1].to_numpy(dtype=np.int64) - 1]
+    R = np.asarray(branches[2], dtype=float)
+    X = np.asarray(branches[3], dtype=float)
+    BTotal = np.asarray(branches[4], dtype=float)
+    Tap = np.array(branches[8], dtype=float)
+    Tap[Tap == 0] = 1
+    Shift_degree = np.asarray(branches[9], dtype=float)
+    zeros = np.zeros(len(R))
+
+    B_p = branches_susceptance(From, To, zeros if method=='XB' else R, X, zeros, np.ones(len(R)),
+                               Shift_degree, N)
+    B_pp = branches_susceptance(From, To, zeros if method=='BX' else R, X, BTotal, Tap, zeros, N)
+    B_pp = B_pp - coo_matrix((np.imag(run.Shunt), (np.arange(N), np.arange(N))), shape=(N, N))
+    return B_p.tocsr(), B_pp.tocsr()
+
+
+# main function
+@print_details('Print_Details')
+def fdlf(
+        grid_data_file_path,
+        Print_Details=False, Mismatch=1e-4, Scale=1,
+        MaxIterations=100, Enforce_Qlimits=True, DSB_model=False, method='XB',
+        Results_FileName='',  Save_results=False, linear_solver='superlu', stats=False,
+):
+    if (not(
+                type(grid_data_file_path) is str or
+                isinstance(grid_data_file_path, CaseData)
+        ) or \
+        type(Print_Details) is not bool or \
+        type(Mismatch) is not float or \
+        type(Results_FileName)is not str or \
+        not(
+                type(Scale) is float or
+                type(Scale) is int
+        ) or \
+        type(MaxIterations) is not int or \
+        type(Enforce_Qlimits) is not bool or \
+        type(DSB_model) is not bool
+    ):
+        print("Erroneous argument type.")
+        return
+    if method not in ('XB', 'BX'):
+        print("'method' must be the string 'XB' or 'BX'.")
+        return
+    if linear_solver not in ('superlu', 'umfpack', 'dense', 'auto') and not hasattr(linear_solver, 'factorize'):
+        print("'linear_solver' must be the string 'superlu', 'umfpack', 'dense' or 'auto', or a solver object.")
+        return
+    if type(stats) is not bool:
+        print("'stats' must be a boolean.")
+        return
+
+    # Opt-in timing of the phases of the run and counters. With stats=True the
+    # RunStats object is returned with the voltages
+    run_stats = RunStats(stats)
+
+    algorithm = 'FDLF ' + method
+    if DSB_model:
+        algorithm += ' DS'
+    # Data of the case. Parsed here if grid_data_file_path is the path of the .xlsx file
+    case = case_data(grid_data_file_path)
+    if stats and case is not grid_data_file_path:
+        # Parsing and Y assembly times, only if the case was parsed by this call
+        run_stats.merge(case.stats)
+    if(Results_FileName==''):
+        # Next to the .xlsx file of the case, or the name of the CaseData object
+        results_file_name = case.name if case is grid_data_file_path else grid_data_file_path[0:-5]
+    else:
+        results_file_name = Results_FileName
+    Q_limits = Enforce_Qlimits
+
+    # Variables of the run
+    run = NRRunVariables(case.N, case.N_generators, case.N_branches, Mismatch, Scale, MaxIterations)
+    N = run.N
+
+    with run_stats.phase('case data'):
+        preprocess_case_data(case, run)
+        B_p, B_pp = Susceptance_Matrices(case, method, run)
+    factorization_p = None
+    # Loop that stops when the deltas P and Q be less than the specified mismatch, or the program diverges
+    while(True):
+        if DSB_model:
+            Compute_K_factors(run)
+            Jacobian_DS(run)
+            check = Convergence_Check_DS
+        else:
+            Jacobian(run)
+            check = Convergence_Check
+
+        # B' changes with the participation factors, B'' with the PQ buses
+        with run_stats.phase('factorization'):
+            if DSB_model:
+                matrix = hstack((csc_matrix(run.K_factors[run.dP_buses].reshape(-1, 1)),
+                                 B_p[run.dP_buses][:, run.tita_buses]))
+                factorization_p = get_linear_solver(linear_solver, len(run.dP_buses)).factorize(matrix)
+            elif factorization_p is None:
+                factorization_p = get_linear_solver(linear_solver, len(run.dP_buses)).factorize(
+                    B_p[run.dP_buses][:, run.tita_buses])
+            factorization_pp = None
+            if len(run.dQ_buses):
+                factorization_pp = get_linear_solver(linear_solver, len(run.dQ_buses)).factorize(
+                    B_pp[run.dQ_buses][:, run.V_buses])
+
+        while(True):
+            with run_stats.phase('mismatch'):
+                converged = check(run, algorithm)
+            if converged: # Check convergence and iterations number
+                break # Stop iterations
+            run_stats.count('iterations')
+
+            # P-tita half iteration
+            with run_stats.phase('solve'):
+                deltas = factorization_p.solve(run.deltas_P_Q[run.dP_positions]/run.V[run.dP_buses])
+            with run_stats.phase('state update'):
+                if DSB_model:
+                    run.Ploss -= deltas[0]
+                    deltas = deltas[1:]
+                run.tita[run.tita_buses] += deltas
+                Update_Voltages(run)
+
+            # Q-V half iteration
+            if factorization_pp is None:
+                continue
+            with run_stats.phase('mismatch'):
+                Power_Injections(run)
+                deltas_Q = (run.Qg - run.Qd - run.Qi)[run.dQ_buses]
+            with run_stats.phase('solve'):
+                deltas = factorization_pp.solve(deltas_Q/run.V[run.dQ_buses])
+            with run_stats.phase('state update'):
+                run.V[run.V_buses] += deltas
+                Update_Voltages(run)
+        if(run.divergence):
+            break
+        if not Q_limits:
+            run.list_iterations.append(run.iterations)
+            log_event(logger, logging.INFO, 'converged', "Convergence has been reached",
+                      algorithm=algorithm, iterations=list(run.list_iterations))
+            break
+        with run_stats.phase('Q-limit checks'):
+            violation = Check_Generators_Limits(run)
+        if not violation:
+            log_event(logger, logging.INFO, 'converged', "Convergence has been reached",
+                      algorithm=algorithm, iterations=list(run.list_iterations))
+            break
+        run_stats.count('restarts')
+    tita_degree = np.rad2deg(run.tita)
+    if not(run.divergence):
+        V_polar_final = create_polar_voltages_variable(run.V, tita_degree, N)
+        details = details_enabled(logger)
+        if details or Save_results:
+            with run_stats.phase('power_balance'):
+                balance = power_balance(
+                    run.V_complex_profile, run.Ybr_list,
+                    run.N_branches, N, run.Shunt, run.Number_bus[run.ref], run.Pd, run.Qd, run.Pg, run.Qg,
+                    0, 0, 0, Q_limits, run.list_gen,
+                    run.Vre, run.Vimag, None, None, run.branches_buses, algorithm,
+                    Pi=run.Pi, Qi=run.Qi, K=run.K_factors, Pmismatch=0
+                )
+            Power_branches, S_gen, S_load, S_mismatch = balance[0:4]
+            # Active power losses of the distributed slack bus model
+            Ploss, Pmismatch = (run.Ploss, balance[4]) if DSB_model else (None, None)
+            if details:
+                print_voltage_profile(V_polar_final,N)
+                logger.debug("%s", create_power_balance_string(
+                    run.scale, run.Mis, algorithm,
+                    run.list_iterations, S_gen, S_load, S_mismatch,
+                    Ploss, Pmismatch
+                ))
+            if Save_results:
+                write_results_on_files(
+                results_file_name, run.scale, run.Mis, algorithm,
+                V_polar_final, run.V_complex_profile, Power_branches,
+                run.list_iterations, S_gen, S_load, S_mismatch,
+                Ploss, Pmismatch
+            )
+        if stats:
+            return run.V_complex_profile, run_stats
+        return run.V_complex_profile
+    if stats:
+        return None, run_stats
@@ -1,9 +1,12 @@
 
+import logging
 from os.path import basename 
 
 import numpy as np
-import pandas as pd
 
+from helmpy.core.logs import log_event, get_logger
+
+logger = get_logger(__name__)
 
 
 # Branches data processing to construct Ytrans, Yshunt, branches_buses and others
@@ -269,8 +272,9 @@ def Check_PVLIM(
             Buses_type[i] = 'PQ'
             list_gen_remove.append(i)
             Qg[i] = Qgmax[i] if Qg_incog > Qgmax[i] else Qgmin[i]
-            if detailed_run_print:
-                print('Bus %d exceeded its Qgen limit with %f. The exceeded limit %f will be assigned to the bus'%(i+1,Qg_incog,Qg[i]))
+            log_event(logger, logging.DEBUG, 'bus_type_switch',
+                      'Bus %d exceeded its Qgen limit with %f. The exceeded limit %f will be assigned to the bus',
+                      i+1, Qg_incog, Qg[i], bus=int(i+1), Qg=Qg_incog, limit=Qg[i])
     return flag_violacion, Qg, Buses_type,
 
 
@@ -362,7 +366,7 @@ def power_balance(
         else:
             Pgen = np.sum(Pg) + P_iny(slack, Vre, Vimag, Yre, Yimag, branches_buses) + Pd[slack]
 
-    elif 'NR' in algorithm:
+    elif 'NR' in algorithm or 'FDLF' in algorithm:
 
         if not Q_limits:
             for i in list_gen:
@@ -385,19 +389,17 @@ def power_balance(
         return (Power_branches, S_gen, S_load, S_mismatch)
 
 
+# Voltage profile table, logged as a DEBUG record
 def print_voltage_profile(V_polar_final,N):
-    print("\n\tVoltage profile:")
-    print("   Bus    Magnitude (p.u.)    Phase Angle (degrees)")
+    row = "{:>6d}\t     {:1.6f}\t\t{:11.6f}"
+    lines = ["\n\tVoltage profile:", "   Bus    Magnitude (p.u.)    Phase Angle (degrees)"]
     if N <= 31:
-        print(*("{:>6d}\t     {:1.6f}\t\t{:11.6f}" \
-            .format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final)), sep='\n')
+        lines += [row.format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final)]
     else:
-        print(*("{:>6d}\t     {:1.6f}\t\t{:11.6f}" \
-            .format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[0:14])), sep='\n')
-        print(* 3*("     .\t         .\t\t      .",), sep='\n')
-        print(*("{:>6d}\t     {:1.6f}\t\t{:11.6f}" \
-            .format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[N-14:N],N-14)), sep='\n')
-    print()
+        lines += [row.format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[0:14])]
+        lines += 3*["     .\t         .\t\t      ."]
+        lines += [row.format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[N-14:N],N-14)]
+    logger.debug("%s", "\n".join(lines) + "\n")
 
 
 def create_power_balance_string(
@@ -446,6 +448,9 @@ def write_results_on_files(
         str(scale) + ' ' + \
         str(Mis)
 
+    # pandas and openpyxl are only loaded to write the results
+    import pandas as pd
+
     # Write voltage profile and branch data to .xlsx file
     voltages_dataframe = pd.DataFrame()
     voltages_dataframe["Complex Voltages"] = V_complex_profile
@@ -461,10 +466,9 @@ def write_results_on_files(
     power_flow_dataframe['P flow through branch and elements (MW)'] = Power_branches[:,6]
     power_flow_dataframe['Q flow through branch and elements (MVAR)'] = Power_branches[:,7]
     xlsx_name = files_name + '.xlsx'
-    xlsx_file = pd.ExcelWriter(xlsx_name) # pylint: disable=abstract-class-instantiated
-    voltages_dataframe.to_excel(xlsx_file, sheet_name="Buses")
-    power_flow_dataframe.to_excel(xlsx_file, sheet_name="Branches")
-    xlsx_file.save()
+    with pd.ExcelWriter(xlsx_name) as xlsx_file: # pylint: disable=abstract-class-instantiated
+        voltages_dataframe.to_excel(xlsx_file, sheet_name="Buses")
+        power_flow_dataframe.to_excel(xlsx_file, sheet_name="Branches")
 
     # Write power balance and other data to .txt file
     # Coefficients/Iterations per PVLIM-PQ switches are written
@@ -478,4 +482,5 @@ def write_results_on_files(
     txt_file.write(txt_content)
     txt_file.close()
 
-    print("\nResults have been written on the files:\n\t%s \n\t%s"%(xlsx_name,txt_name))
+    log_event(logger, logging.INFO, 'results_written', "Results have been written on the files:\n\t%s \n\t%s",
+              xlsx_name, txt_name, files=[xlsx_name, txt_name])
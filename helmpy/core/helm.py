@@ -9,129 +9,389 @@ This program is distributed in the hope that it will be useful, but WITHOUT ANY
 You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
-import cmath as cm
-import warnings 
+import logging
+import tracemalloc
 
 import numpy as np
-import pandas as pd
-from scipy.sparse import csc_matrix
-from scipy.sparse.linalg import factorized
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import splu
+from scipy.sparse.csgraph import reverse_cuthill_mckee
 
-from helmpy.core.classes import RunVariables, CaseData
-from helmpy.core.analytic_continuation import Pade
-
-warnings.filterwarnings("ignore")
-pd.set_option('display.max_rows',1000)
-pd.set_option('display.max_columns',1000)
-pd.set_option('display.width',1000)
+from helmpy.core.classes import RunVariables, RunStats, MemoryReport, structure_bytes, CaseData, BUS_PQ, BUS_PV, BUS_SLACK
+from helmpy.core.analytic_continuation import pade_batch, EpsilonTable
+from helmpy.core.kernels import Kernels
+from helmpy.core.linear_solvers import get_linear_solver
+from helmpy.core.logs import log_event, details_enabled, print_details, get_logger
 
 from typing import Tuple
 
+logger = get_logger(__name__)
+
+def bus_ordering(case, ordering='colamd'):
+    """Fill-reducing order of the buses from the graph of branches_buses
+
+    'colamd' and 'mmd' (multiple minimum degree of the symmetric pattern) are the
+    column orderings of SuperLU, computed on the (N, N) bus graph instead of the
+    (2N, 2N) system. 'rcm' is the reverse Cuthill-McKee ordering.
+    """
+    N = case.N
+    degree = np.array([len(buses) for buses in case.branches_buses])
+    rows = np.repeat(np.arange(N), degree)
+    cols = np.concatenate(case.branches_buses)
+    # Diagonally dominant values so the ordering factorization needs no pivoting
+    vals = np.where(rows == cols, degree[rows], -1.0)
+    graph = coo_matrix((vals, (rows, cols)), shape=(N, N)).tocsc()
+    if ordering == 'rcm':
+        return reverse_cuthill_mckee(graph.tocsr(), symmetric_mode=True)
+    permc_spec = 'COLAMD' if ordering == 'colamd' else 'MMD_AT_PLUS_A'
+    return np.argsort(splu(graph, permc_spec=permc_spec, diag_pivot_thresh=0).perm_c)
+
+def run_bus_ordering(case, run):
+    """bus_ordering of run.ordering, computed once and kept in run.bus_order"""
+    if run.bus_order is None:
+        run.bus_order = bus_ordering(case, run.ordering)
+    return run.bus_order
+
+def block_index(order, length):
+    """Order of the rows of a system with the real and imaginary rows of every bus
+    together (2i, 2i+1) for the bus order. Rows after 2N keep their place"""
+    index = np.empty(length, dtype=np.int64)
+    index[0:2*len(order):2] = 2*order
+    index[1:2*len(order):2] = 2*order + 1
+    index[2*len(order):] = np.arange(2*len(order), length)
+    return index
+
+def factorize(matrix, index=None, linear_solver='superlu'):
+    """Solve function of the sparse matrix and the fill ratio nnz(L+U)/nnz(matrix)
+
+    linear_solver is a backend of linear_solvers ('superlu', 'umfpack', 'dense', 'auto')
+    or a solver object. With index, the SuperLU backend permutes rows and columns
+    symmetrically to that order and keeps it (NATURAL column ordering).
+    """
+    factorization = get_linear_solver(linear_solver, matrix.shape[0]).factorize(matrix, index)
+    return factorization.solve, factorization.fill_ratio
+
+def low_rank_difference(difference):
+    """Factors U (n, k) and Vt (k, n) of the sparse difference = U*Vt
+
+    Greedy cover of the nonzeros of difference by rows and columns, picking the one
+    with most nonzeros left each time. A picked row r adds e_r to U and its entries to
+    Vt, a picked column c adds its entries to U and e_c to Vt. k is the number of picks.
+    """
+    difference = difference.tocoo()
+    nonzero = difference.data != 0
+    r, c, v = difference.row[nonzero], difference.col[nonzero], difference.data[nonzero]
+    n = difference.shape[0]
+
+    U_rows, U_cols, U_vals, Vt_rows, Vt_cols, Vt_vals = [], [], [], [], [], []
+    remaining = np.ones(len(v), dtype=bool)
+    k = 0
+    while remaining.any():
+        row_count = np.bincount(r[remaining], minlength=n)
+        col_count = np.bincount(c[remaining], minlength=n)
+        if row_count.max() >= col_count.max():
+            i = row_count.argmax()
+            picked = remaining & (r == i)
+            U_rows.append([i]); U_cols.append([k]); U_vals.append([1.0])
+            Vt_rows.append(np.full(picked.sum(), k)); Vt_cols.append(c[picked]); Vt_vals.append(v[picked])
+        else:
+            j = col_count.argmax()
+            picked = remaining & (c == j)
+            U_rows.append(r[picked]); U_cols.append(np.full(picked.sum(), k)); U_vals.append(v[picked])
+            Vt_rows.append([k]); Vt_cols.append([j]); Vt_vals.append([1.0])
+        remaining &= ~picked
+        k += 1
+
+    if k == 0:
+        return coo_matrix((n, 0)).tocsr(), coo_matrix((0, n)).tocsr()
+    U = coo_matrix((np.concatenate(U_vals), (np.concatenate(U_rows), np.concatenate(U_cols))), shape=(n, k))
+    Vt = coo_matrix((np.concatenate(Vt_vals), (np.concatenate(Vt_rows), np.concatenate(Vt_cols))), shape=(k, n))
+    return U.tocsr(), Vt.tocsr()
+
+def woodbury_solve(base_solve, U, Vt, max_condition=1e10):
+    """Solve function of the matrix A + U*Vt from the solve function of A
+
+    Sherman-Morrison-Woodbury formula:
+    (A + U*Vt)^-1 b = y - Z (I + Vt*Z)^-1 Vt*y, with y = A^-1 b and Z = A^-1 U.
+    Z and the LU factors of the (k, k) capacitance matrix are computed once.
+    Returns None if the capacitance matrix is ill-conditioned.
+    """
+    k = U.shape[1]
+    if k == 0:
+        return base_solve
+    Z = base_solve(U.toarray())
+    capacitance = np.eye(k) + Vt @ Z
+    if np.linalg.cond(capacitance) > max_condition:
+        return None
+    capacitance_lu = lu_factor(capacitance)
+
+    def solve(b):
+        y = base_solve(b)
+        return y - Z @ lu_solve(capacitance_lu, Vt @ y)
+    return solve
+
 def modif_Ytrans(DSB_model_method, pv_bus_model, case, run):
-    """Create modified Y matrix and list that contains the respective column 
-    to its voltage on PV and PVLIM buses 
+    """Create modified Y matrix and the matrix that contains the respective column
+    to its voltage on PV and PVLIM buses
+
+    Both are assembled in sparse triplet form from the nonzeros of Ytrans, so
+    memory and time grow with the number of branches and not with N**2.
+    The buses are reordered for the factorization with run.ordering (bus_ordering),
+    which is done by the backend run.linear_solver.
+
+    Ytrans_mod is factorized on the first start. After bus type changes, its
+    difference with the factorized matrix only spans the rows and columns of the
+    switched buses (and the K column), so it is solved with a low rank correction
+    of the factorization while the rank is not greater than run.max_update_rank.
     """
     # Assign local variables for faster access
     N = case.N
     slack = case.slack
-    Ytrans = case.Ytrans
-    branches_buses = case.branches_buses
+    Ytrans = case.Ytrans.tocoo()
     Buses_type = run.Buses_type
+    list_gen = run.list_gen
     K = run.K
-
-    # Declare new variables
-    Ytrans_mod = np.zeros((run.length,run.length), dtype=float)
-    Y_Vsp_PV =[]
-
-    for i in range(N):
-        if Buses_type[i] == 'Slack':
-            Ytrans_mod[2*i][2*i] = 1
-            Ytrans_mod[2*i + 1][2*i + 1] = 1
-        elif Buses_type[i] == 'PQ' or pv_bus_model == 1:
-            for j in branches_buses[i]:
-                Ytrans_mod[2*i][2*j] = Ytrans[i][j].real
-                Ytrans_mod[2*i][2*j + 1] = Ytrans[i][j].imag*-1
-                Ytrans_mod[2*i + 1][2*j] = Ytrans[i][j].imag
-                Ytrans_mod[2*i + 1][2*j + 1] = Ytrans[i][j].real
-        else: # pv_bus_model == 2:
-            Ytrans_mod[2*i + 1][2*i] = 1
-            for j in branches_buses[i]:
-                Ytrans_mod[2*i][2*j] = Ytrans[i][j].real
-                Ytrans_mod[2*i][2*j + 1] = Ytrans[i][j].imag*-1
+    length = run.length
+
+    # Bus groups
+    is_slack = Buses_type == 'Slack'
+    is_pv = (Buses_type == 'PV') | (Buses_type == 'PVLIM')
+    full_rows = ~is_slack & (~is_pv | (pv_bus_model == 1))   # real and imaginary equations
+    half_rows = ~is_slack & is_pv & (pv_bus_model == 2)      # only real equation
+
+    # Ytrans entries of the buses with full and half rows
+    r, c, y = Ytrans.row, Ytrans.col, Ytrans.data
+    full = full_rows[r]
+    half = half_rows[r]
+    rf, cf, yf = r[full], c[full], y[full]
+    rh, ch, yh = r[half], c[half], y[half]
+    slack_row = r == slack
+    cs, ys = c[slack_row], y[slack_row]
+    slack_buses = np.flatnonzero(is_slack)
+    half_buses = np.flatnonzero(half_rows)
+
+    rows = [2*rf, 2*rf, 2*rf + 1, 2*rf + 1, 2*rh, 2*rh, 2*slack_buses, 2*slack_buses + 1, 2*half_buses + 1]
+    cols = [2*cf, 2*cf + 1, 2*cf, 2*cf + 1, 2*ch, 2*ch + 1, 2*slack_buses, 2*slack_buses + 1, 2*half_buses]
+    vals = [yf.real, -yf.imag, yf.imag, yf.real, yh.real, -yh.imag,
+            np.ones(2*len(slack_buses)), np.ones(len(half_buses))]
 
     if DSB_model_method is not None:
-        # Last row
-        for j in branches_buses[slack]:
-            Ytrans_mod[2*N][2*j] = Ytrans[slack][j].real
-            Ytrans_mod[2*N][2*j + 1] = Ytrans[slack][j].imag*-1
-        # Last column
-        for i in run.list_gen:
-            Ytrans_mod[i*2][2*N] = -K[i]
-        Ytrans_mod[2*N][2*N] = -K[slack]
+        # Last row and last column
+        rows += [np.full(2*len(cs), 2*N), 2*list_gen, [2*N]]
+        cols += [np.concatenate((2*cs, 2*cs + 1)), np.full(len(list_gen), 2*N), [2*N]]
+        vals += [np.concatenate((ys.real, -ys.imag)), -K[list_gen], [-K[slack]]]
+
+    rows = np.concatenate(rows).astype(np.int64)
+    cols = np.concatenate(cols).astype(np.int64)
+    vals = np.concatenate(vals).astype(np.float64)
 
     if pv_bus_model == 1:
-        if DSB_model_method is None:
-            for i in run.list_gen:
-                array = np.zeros( 2*len(branches_buses[i]), dtype=np.float64)
-                pos = 0
-                for k in branches_buses[i]:
-                    array[pos] = Ytrans_mod[2*k][2*i]
-                    array[pos+1] = Ytrans_mod[2*k+1][2*i]
-                    Ytrans_mod[2*k][2*i] = 0
-                    Ytrans_mod[2*k+1][2*i] = 0
-                    pos += 2
-                Y_Vsp_PV.append([i, array.copy()])
-                Ytrans_mod[2*i + 1][2*i] = 1
+        # Move the columns of the real voltages of PV buses to Y_Vsp_PV
+        gen_column = np.zeros(length + 1, dtype=bool)
+        gen_column[2*list_gen] = True
+        moved = gen_column[cols]
+        run.Y_Vsp_PV = coo_matrix((vals[moved], (rows[moved], cols[moved]//2)), shape=(length, N)).tocsr()
+        rows = np.concatenate((rows[~moved], 2*list_gen + 1))
+        cols = np.concatenate((cols[~moved], 2*list_gen))
+        vals = np.concatenate((vals[~moved], np.ones(len(list_gen))))
+
+    Ytrans_mod = coo_matrix((vals, (rows, cols)), shape=(length, length)).tocsc()
+    Ytrans_mod.eliminate_zeros()
+
+    index = None
+    if run.ordering is not None:
+        index = block_index(run_bus_ordering(case, run), length)
+    run.solve = factorize_or_update(Ytrans_mod, index, run)
+
+def factorize_or_update(matrix, index, run):
+    """Solve function of matrix, with a low rank correction of the factorization of
+    run.base_Ytrans_mod if there is one and its rank is not greater than
+    run.max_update_rank. Otherwise matrix is factorized and becomes the base.
+    """
+    if run.base_Ytrans_mod is not None and run.max_update_rank > 0 and run.base_Ytrans_mod.shape == matrix.shape:
+        with run.stats.phase('low rank update'):
+            U, Vt = low_rank_difference(matrix - run.base_Ytrans_mod)
+            solve = None
+            if U.shape[1] <= run.max_update_rank:
+                solve = woodbury_solve(run.base_solve, U, Vt)
+        if solve is not None:
+            run.update_rank = U.shape[1]
+            run.stats.count('low rank updates')
+            return solve
+
+    # Function for solving a sparse linear system, with the matrix pre-factorized.
+    with run.stats.phase('factorization'):
+        solve, run.fill_ratio = factorize(matrix, index, run.linear_solver)
+    run.base_Ytrans_mod = matrix
+    run.base_solve = solve
+    run.update_rank = 0
+    return solve
+
+def modif_Ytrans_complex(DSB_model_method, pv_bus_model, case, run):
+    """Complex formulation of the system of modif_Ytrans, of half its dimension
+
+    Every bus but the slack keeps one complex equation and voltage, A v = r, with A
+    the rows and columns of Ytrans of those buses. A does not depend on the bus
+    types, so restarts keep its factorization. The known real voltage of PV buses,
+    the imaginary part of their equation (free with pv_bus_model 2, an unknown with
+    pv_bus_model 1) and the Ploss unknown and slack equation of the DSB models are a
+    small real border of A, with real unknowns u:
+        A v + C u = r
+        Re(F^T v) + D u = g
+    It is solved with the Schur complement S = D - Re(F^T A^-1 C), (p, p) for p
+    PV buses (+1 with DSB): u from S and y = A^-1 r, then v = A^-1 (r - C u).
+    F^T A^-1 C needs p solves, restarts reuse them. Two
+    complex solves of dimension N-1 cost less than the dense (N-1, p) product with
+    A^-1 C. run.solve takes and returns the vectors of the real system of
+    modif_Ytrans, so the right hand sides are evaluated as with it.
+    """
+    # Assign local variables for faster access
+    N = case.N
+    slack = case.slack
+    Ytrans = case.Ytrans.tocsr()
+    Buses_type = run.Buses_type
+    list_gen = run.list_gen
+    K = run.K
+    length = run.length
+
+    # Complex unknowns and their position in v
+    buses = np.flatnonzero(Buses_type != 'Slack')
+    position = np.full(N, -1, dtype=np.int64)
+    position[buses] = np.arange(len(buses))
+    pv = np.flatnonzero((Buses_type == 'PV') | (Buses_type == 'PVLIM'))
+    pv_position = position[pv]
+    p = len(pv)
+
+    Y_buses = Ytrans[buses]
+    A = Y_buses[:, buses].tocsc()
+    A.eliminate_zeros()
+    # Terms of the known slack voltage in the equations of the other buses and in its own
+    Y_slack_column = Y_buses[:, slack].toarray().ravel()
+    Y_slack_row = Ytrans[slack, buses].toarray().ravel()
+    Y_slack_slack = Ytrans[slack, slack]
+
+    if pv_bus_model == 1:
+        # Columns of the real voltages of PV buses, as in modif_Ytrans
+        Ytrans_coo = Ytrans.tocoo()
+        r, c, y = Ytrans_coo.row, Ytrans_coo.col, Ytrans_coo.data
+        gen_column = np.zeros(N, dtype=bool)
+        gen_column[list_gen] = True
+        moved = gen_column[c] & (r != slack)
+        rows = [2*r[moved], 2*r[moved] + 1]
+        cols = [c[moved], c[moved]]
+        vals = [y[moved].real, y[moved].imag]
+        if DSB_model_method is not None:
+            slack_row = gen_column[c] & (r == slack)
+            rows.append(np.full(slack_row.sum(), 2*N))
+            cols.append(c[slack_row])
+            vals.append(y[slack_row].real)
+        run.Y_Vsp_PV = coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                  shape=(length, N)).tocsr()
+
+    index = None
+    if run.ordering is not None:
+        order = run_bus_ordering(case, run)
+        index = position[order[order != slack]]
+    solve_A = factorize_or_update(A, index, run)
+
+    # Border. Columns of u: the imaginary part of the equation of every PV bus and Ploss
+    n_border = p + (DSB_model_method is not None)
+    rows, cols, vals = [pv_position], [np.arange(p)], [np.full(p, 1j)]
+    D = np.zeros((n_border, n_border), dtype=np.float64)
+    if DSB_model_method is not None:
+        rows.append(position[list_gen]); cols.append(np.full(len(list_gen), p)); vals.append(-K[list_gen])
+        D[p, p] = -K[slack]
+    C = coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                   shape=(len(buses), n_border)).tocsr()
+    if n_border:
+        # F^T A^-1 C. The block of the PV buses is kept for the restarts, whose PV buses
+        # are a subset of the previous ones while A keeps its factorization
+        cache = run.border_cache
+        if cache is not None and cache[0] is solve_A and np.isin(pv, cache[1]).all():
+            k = np.searchsorted(cache[1], pv)
+            FZ_pv, slack_Z_pv = cache[2][np.ix_(k, k)], cache[3][k]
         else:
-            for i in run.list_gen:
-                if slack in branches_buses[i]:
-                    array = np.zeros( 2*len(branches_buses[i])+1, dtype=np.float64)
-                else:
-                    array = np.zeros( 2*len(branches_buses[i]), dtype=np.float64)
-                pos = 0
-                for k in branches_buses[i]:
-                    array[pos] = Ytrans_mod[2*k][2*i]
-                    array[pos+1] = Ytrans_mod[2*k+1][2*i]
-                    Ytrans_mod[2*k][2*i] = 0
-                    Ytrans_mod[2*k+1][2*i] = 0
-                    pos += 2
-                if slack in branches_buses[i]:
-                    array[pos] = Ytrans_mod[2*N][2*i]
-                    Ytrans_mod[2*N][2*i] = 0
-                Y_Vsp_PV.append([i, array.copy()])
-                Ytrans_mod[2*i + 1][2*i] = 1
-        run.Y_Vsp_PV = Y_Vsp_PV
-    
-    # Return a function for solving a sparse linear system, with Ytrans_mod pre-factorized.
-    solve = factorized(csc_matrix(Ytrans_mod))
+            Z = solve_A(C[:, :p].toarray())
+            FZ_pv, slack_Z_pv = Z[pv_position], Y_slack_row @ Z
+            run.border_cache = (solve_A, pv, FZ_pv, slack_Z_pv)
+        FZ = np.zeros((n_border, n_border), dtype=np.complex128)
+        FZ[:p, :p] = FZ_pv
+        if DSB_model_method is not None:
+            z = solve_A(C[:, p].toarray().ravel())
+            FZ[p, :p] = slack_Z_pv
+            FZ[:p, p] = z[pv_position]
+            FZ[p, p] = Y_slack_row @ z
+        S_lu = lu_factor(D - FZ.real)
+
+    def solve(b):
+        V_slack = b[2*slack] + 1j*b[2*slack + 1]
+        rhs = b[2*buses] + 1j*b[2*buses + 1] - Y_slack_column*V_slack
+        g = np.zeros(n_border, dtype=np.float64)
+        if pv_bus_model == 2:
+            # Real power equation and known real voltage
+            rhs[pv_position] = b[2*pv] - Y_slack_column[pv_position]*V_slack
+            g[:p] = b[2*pv + 1]
+        if DSB_model_method is not None:
+            g[p] = b[2*N] - (Y_slack_slack*V_slack).real
+
+        v = solve_A(rhs)
+        if n_border:
+            Fv = v[pv_position]
+            if DSB_model_method is not None:
+                Fv = np.append(Fv, Y_slack_row @ v)
+            u = lu_solve(S_lu, g - Fv.real)
+            v = solve_A(rhs - C @ u)
+
+        x = np.empty(length, dtype=np.float64)
+        x[2*buses] = v.real
+        x[2*buses + 1] = v.imag
+        x[2*slack] = b[2*slack]
+        x[2*slack + 1] = b[2*slack + 1]
+        if pv_bus_model == 1:
+            x[2*pv] = u[:p]
+        if DSB_model_method is not None:
+            x[2*N] = u[p]
+        return x
+
     run.solve = solve
 
 def Unknowns_soluc(DSB_model_method, pv_bus_model, N, run):
-    """Arrays and lists creation"""
+    """Arrays and lists creation
+
+    Buses are grouped by their type code. Soluc_no_eval holds one
+    [buses, function] pair per group that evaluates the whole group at once.
+    Also used by helm_batch, whose arrays have a trailing scenario axis.
+    """
     # Assign local variables for faster access
     coefficients = run.coefficients
     Soluc_no_eval = run.Soluc_no_eval
     Buses_type = run.Buses_type
 
+    # Integer type code of every bus
+    bus_type_code = np.full(N, BUS_PQ, dtype=np.int8)
+    bus_type_code[(Buses_type == 'PV') | (Buses_type == 'PVLIM')] = BUS_PV
+    bus_type_code[Buses_type == 'Slack'] = BUS_SLACK
+    run.bus_type_code = bus_type_code
+
     # Assign 0 to the first coefficients and evaluated solutions.
+    # The real part of the voltage is 1 except on PV buses with pv_bus_model 1.
     coefficients[:,0].fill(0)
     run.Soluc_eval[:,0].fill(0)
-    # Clear list of not evaluated solutions (function per bus)
+    if pv_bus_model == 1:
+        coefficients[0:2*N:2, 0] = scenario_axis(bus_type_code != BUS_PV, run.V_complex)
+    else: # pv_bus_model == 2:
+        coefficients[0:2*N:2, 0] = 1
+    # Clear list of not evaluated solutions (function per group of buses)
     Soluc_no_eval.clear()
 
-    for i in range(N):
-        if Buses_type[i] == 'PV' or Buses_type[i] == 'PVLIM':
-            if pv_bus_model == 1:
-                Soluc_no_eval.append([i,evaluate_bus_eq_dsb_generator_pv1])
-            else: # pv_bus_model == 2:
-                coefficients[2*i][0] = 1
-                Soluc_no_eval.append([i,evaluate_bus_eq_dsb_generator_pv2])
-        else:
-            coefficients[2*i][0] = 1
-            if Buses_type[i] == 'PQ':
-                Soluc_no_eval.append([i, evaluate_bus_eq_dsb_load])
-            else: # Buses_type[i] == 'slack'
-                Soluc_no_eval.append([i, evaluate_bus_eq_dsb_slack])
+    pv_function = evaluate_bus_eq_dsb_generator_pv1 if pv_bus_model == 1 else evaluate_bus_eq_dsb_generator_pv2
+    for code, function in ((BUS_PQ, evaluate_bus_eq_dsb_load),
+                           (BUS_PV, pv_function),
+                           (BUS_SLACK, evaluate_bus_eq_dsb_slack)):
+        buses = np.flatnonzero(bus_type_code == code)
+        if len(buses):
+            Soluc_no_eval.append([buses, function])
     if DSB_model_method == 1:
         Soluc_no_eval.append([N,evaluate_bus_eq_dsb_method1])
     elif DSB_model_method == 2:
@@ -147,17 +407,57 @@ def Calculo_Vre_PV(n, case, run):
     V_complex = run.V_complex
     Vre_PV = run.Vre_PV
 
-    for i in run.list_gen:
-        if n > 1:
-            aux = 0
-            for k in range(1,n):
-                aux += V_complex[i][k] * np.conj(V_complex[i][n-k])
-            Vre_PV[i][n] = -aux/2
-        elif n == 1:
-            Vre_PV[i][n] = (V[i]**2 - 1)/2
+    list_gen = run.list_gen
+
+    if n > 1:
+        Vre_PV[list_gen, n] = -run.kernels.self_convolution(V_complex, list_gen, n)/2
+    elif n == 1:
+        Vre_PV[list_gen, n] = scenario_axis((V[list_gen]**2 - 1)/2, V_complex)
 
 #---------------------------------------------------------------------------------------
-# Functions lo evaluate the rigth hand side of the matrix equation
+# Functions lo evaluate the rigth hand side of the matrix equation.
+# Each one evaluates a whole group of buses (an array of bus indexes).
+# With the arrays of helm_batch, (rows, n, S), they evaluate every scenario at once.
+def scenario_axis(values, V_complex):
+    """Values of the buses with the trailing scenario axis of V_complex, if it has one"""
+    return values.reshape(values.shape + (1,)*(V_complex.ndim - 2))
+
+def phase_shifters_injection(buses, n, case, run):
+    """Current injected by the phase shifters into the buses with V_complex[:, n]"""
+    return (case.Yphase @ run.V_complex[:, n])[buses]
+
+def evaluate_real_power_eq(buses, n, Pi, VVanterior, case, run):
+    """Right hand side of the real power equation of PV buses (pv_bus_model 2) 
+    and of the slack (DSB_model_method 2).
+
+    buses, coefficient n, VVanterior is the coefficient n-1 of |V|**2 - 1 
+    """
+    # Assign local variables for faster access
+    V_complex = run.V_complex
+    Yshunt = scenario_axis(case.Yshunt[buses], V_complex)
+    barras_CC = run.barras_CC
+
+    if n == 1:
+        CC = Pi[buses] - np.real(Yshunt)
+        # Valores phase
+        CC -= scenario_axis(np.real(np.asarray(case.Yphase[buses].sum(axis=1)).ravel()), V_complex)
+        return CC
+
+    # Ytrans*V of coefficient n-1 and convolution with the previous ones
+    barras_CC[buses, n-1] = (case.Ytrans @ V_complex[:, n-1])[buses]
+    PPP = run.kernels.conj_convolution(V_complex, buses, barras_CC, buses, n)
+    CC = -PPP.real
+    # Valor Shunt
+    CC -= np.real(Yshunt) * ( VVanterior + 2*V_complex[buses, n-1].real )
+    # Valores phase
+    phase_buses = case.phase_barras[buses]
+    if phase_buses.any():
+        PP = case.Yphase[buses[phase_buses]] @ V_complex[:, :n].reshape(case.N, -1)
+        PP = PP.reshape((-1,) + V_complex[:, :n].shape[1:])
+        PPP = np.sum(np.conj(V_complex[buses[phase_buses], :n]) * PP[:, ::-1], axis=1)
+        CC[phase_buses] -= PPP.real
+    return CC
+
 def evaluate_bus_eq_dsb_method1(_, n, Si, Pi, case, run):
     """Function to evaluate the PV bus equation for the slack bus by method 1
     
@@ -165,20 +465,12 @@ def evaluate_bus_eq_dsb_method1(_, n, Si, Pi, case, run):
     """
     # Assign local variables for faster access
     N = case.N
-    phase_dict = case.phase_dict
     W = run.W
     V_complex = run.V_complex
-    coefficients = run.coefficients
     i = case.slack
 
-    aux_Ploss = 0
-    for k in range(1,n):
-        aux_Ploss += coefficients[N*2][k]*np.conj(W[i][n-k])
-    
-    PP = 0
-    if case.phase_barras[i]:
-        for k in range(len(phase_dict[i][0])):
-            PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1]
+    aux_Ploss = run.kernels.conj_convolution(W, np.array([i]), run.coefficients, np.array([N*2]), n)[0]
+    PP = phase_shifters_injection(i, n-1, case, run)
 
     result = Pi[i]*np.conj(W[i][n-1]) - case.Yshunt[i]*V_complex[i][n-1] - PP + run.K[i]*aux_Ploss
 
@@ -190,205 +482,93 @@ def evaluate_bus_eq_dsb_method2(_, n, Si, Pi, case, run):
     
     coefficient n"""
     # Assign local variables for faster access
-    Ytrans = case.Ytrans
-    branches_buses = case.branches_buses
-    phase_dict = case.phase_dict
     V_complex = run.V_complex
-    i = case.slack
-    if run.pv_bus_model == 2:
-        slack_CC = run.barras_CC[i]
-    else:
-        slack_CC = run.slack_CC
-
-    if n > 2:
-        CC = 0
-        PPP = 0
-        for x in range(1, n-1):
-            PPP += np.conj(V_complex[i][n-x]) * slack_CC[x]
-        PP = 0
-        for k in branches_buses[i]:
-            PP += Ytrans[i][k] * V_complex[k][n-1]
-        slack_CC[n-1] = PP
-        PPP += np.conj(V_complex[i][1]) * PP
-        CC -= PPP.real
-        # Valor Shunt
-        if case.conduc_buses[i]:
-            VV = 0
-            for k in range(1,n-1):
-                VV += V_complex[i][k] * np.conj(V_complex[i][n-k])
-            CC -= np.real(case.Yshunt[i]) * ( VV + 2*V_complex[i][n-1].real )
-        # Valores phase
-        if case.phase_barras[i]:
-            PPP = 0
-            for x in range(n):
-                PP = 0
-                for k in range(len(phase_dict[i][0])):
-                    PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1-x]
-                PPP += np.conj(V_complex[i][x]) * PP
-            CC -= PPP.real
-    elif n == 1:
-        CC = Pi[i] - np.real(case.Yshunt[i])
-        # Valores phase
-        if case.phase_barras[i]:
-            for valor in phase_dict[i][1]:
-                CC -= valor.real
-    elif n == 2:
-        CC = 0
-        PP = 0
-        for k in branches_buses[i]:
-            PP += Ytrans[i][k] * V_complex[k][1]
-        slack_CC[1] = PP
-        CC -= ( np.conj(V_complex[i][1]) * PP ).real
-        # Valor Shunt
-        if case.conduc_buses[i]:
-            CC -= np.real(case.Yshunt[i])*2*V_complex[i][1].real
-        # Valores phase
-        if case.phase_barras[i]:
-            PPP = 0
-            for x in range(n):
-                PP = 0
-                for k in range(len(phase_dict[i][0])):
-                    PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1-x]
-                PPP += np.conj(V_complex[i][x]) * PP
-            CC -= PPP.real
-
-    run.Soluc_eval[2*case.N][n] = CC
-
-def evaluate_bus_eq_dsb_generator_pv1(i, n, Si, Pi, case, run):
+    slack = np.array([case.slack])
+
+    # Coefficient n-1 of |V|**2 - 1
+    VVanterior = run.kernels.self_convolution(V_complex, slack, n-1)
+
+    CC = evaluate_real_power_eq(slack, n, Pi, VVanterior, case, run)
+
+    run.Soluc_eval[2*case.N][n] = CC[0]
+
+def evaluate_bus_eq_dsb_generator_pv1(buses, n, Si, Pi, case, run):
     """Function to evaluate the PV buses equation by py model 1
     
-    bus i, coefficient n
+    buses, coefficient n
     """
     # Assign local variables for faster access
     N = case.N
-    phase_dict = case.phase_dict
     W = run.W
     V_complex = run.V_complex
     coefficients = run.coefficients
 
-    aux = 0
-    for k in range(1,n):
-        aux += coefficients[i*2][k]*np.conj(W[i][n-k])
-    
+    aux = run.kernels.conj_convolution(W, buses, coefficients, 2*buses, n)
+
     aux_Ploss = 0
     if run.DSB_model_method is not None:
-        for k in range(1,n):
-            aux_Ploss += coefficients[N*2][k]*np.conj(W[i][n-k])
-    
-    PP = 0
-    if case.phase_barras[i]:
-        for k in range(len(phase_dict[i][0])):
-            PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1]
-    
-    result = Pi[i]*np.conj(W[i][n-1]) - case.Yshunt[i]*V_complex[i][n-1]  - PP - aux*1j + run.K[i]*aux_Ploss
-    
-    run.Soluc_eval[2*i][n] = np.real(result)
-    run.Soluc_eval[2*i + 1][n] = np.imag(result)
+        aux_Ploss = run.kernels.conj_convolution(W, buses, coefficients, np.full(len(buses), N*2), n)
+
+    PP = phase_shifters_injection(buses, n-1, case, run)
 
-def evaluate_bus_eq_dsb_generator_pv2(i, n, Si, Pi, case, run):
+    Yshunt = scenario_axis(case.Yshunt[buses], V_complex)
+    result = Pi[buses]*np.conj(W[buses, n-1]) - Yshunt*V_complex[buses, n-1] - PP - aux*1j \
+             + scenario_axis(run.K[buses], V_complex)*aux_Ploss
+
+    run.Soluc_eval[2*buses, n] = np.real(result)
+    run.Soluc_eval[2*buses + 1, n] = np.imag(result)
+
+def evaluate_bus_eq_dsb_generator_pv2(buses, n, Si, Pi, case, run):
     """Function to evaluate the PV buses equation by py model 2
     
-    bus i, coefficient n
+    buses, coefficient n
     """
     # Assign local variables for faster access
-    Ytrans = case.Ytrans
-    branches_buses = case.branches_buses
-    phase_dict = case.phase_dict
     V_complex = run.V_complex
-    barras_CC = run.barras_CC
+    VVanterior = run.VVanterior
 
-    if n > 2:
-        CC = 0
-        PPP = 0
-        for x in range(1,n-1):
-            PPP += np.conj(V_complex[i][n-x]) * barras_CC[i][x]
-        PP = 0
-        for k in branches_buses[i]:
-            PP += Ytrans[i][k] * V_complex[k][n-1]
-        barras_CC[i][n-1] = PP
-        PPP += np.conj(V_complex[i][1]) * PP
-        CC -= PPP.real
-        # Valor Shunt
-        if case.conduc_buses[i]:
-            CC -= np.real(case.Yshunt[i]) * ( run.VVanterior[i] + 2*V_complex[i][n-1].real )
-        # Valores phase
-        if case.phase_barras[i]:
-            PPP = 0
-            for x in range(n):
-                PP = 0
-                for k in range(len(phase_dict[i][0])):
-                    PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1-x]
-                PPP += np.conj(V_complex[i][x]) * PP
-            CC -= PPP.real
-    elif n == 2:
-        CC = 0
-        PP = 0
-        for k in branches_buses[i]:
-            PP += Ytrans[i][k] * V_complex[k][1]
-        barras_CC[i][1] = PP
-        CC -= ( np.conj(V_complex[i][1]) * PP ).real
-        # Valor Shunt
-        if case.conduc_buses[i]:
-            CC -= np.real(case.Yshunt[i])*2*V_complex[i][1].real
-        # Valores phase
-        if case.phase_barras[i]:
-            PPP = 0
-            for x in range(n):
-                PP = 0
-                for k in range(len(phase_dict[i][0])):
-                    PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1-x]
-                PPP += np.conj(V_complex[i][x]) * PP
-            CC -= PPP.real
-    elif n == 1:
-        CC = Pi[i] - np.real(case.Yshunt[i])
-        # Valores phase
-        if case.phase_barras[i]:
-            for valor in phase_dict[i][1]:
-                CC -= valor.real
+    if n == 1:
+        VVanterior[buses] = 0
+
+    CC = evaluate_real_power_eq(buses, n, Pi, VVanterior[buses], case, run)
 
     if n == 1:
-        VV = case.V[i]**2 - 1
+        VV = scenario_axis(case.V[buses]**2 - 1, V_complex)
     else:
-        VV = 0
-        for k in range(1,n):
-            VV += V_complex[i][k] * np.conj(V_complex[i][n-k])
-        run.VVanterior[i] = VV
+        VV = run.kernels.self_convolution(V_complex, buses, n)
+        VVanterior[buses] = VV
         VV = -VV
 
-    run.Soluc_eval[2*i][n] = CC
-    run.Soluc_eval[2*i + 1][n] = VV/2
+    run.Soluc_eval[2*buses, n] = CC
+    run.Soluc_eval[2*buses + 1, n] = VV/2
 
-def evaluate_bus_eq_dsb_load(i, n, Si, Pi, case, run):
+def evaluate_bus_eq_dsb_load(buses, n, Si, Pi, case, run):
     """Function to evaluate the PQ buses equation
     
-    bus i, coefficient n
+    buses, coefficient n
     """
     # Assign local variables for faster access
-    phase_dict = case.phase_dict
     W = run.W
     V_complex = run.V_complex
 
-    PP = 0
-    if case.phase_barras[i]:
-        for k in range(len(phase_dict[i][0])):
-            PP += phase_dict[i][1][k] * V_complex[phase_dict[i][0][k]][n-1]
-    
-    result = np.conj(Si[i])*np.conj(W[i][n-1]) - case.Yshunt[i]*V_complex[i][n-1] - PP
-    
-    run.Soluc_eval[2*i][n] = np.real(result)
-    run.Soluc_eval[2*i + 1][n] = np.imag(result)
+    PP = phase_shifters_injection(buses, n-1, case, run)
+
+    Yshunt = scenario_axis(case.Yshunt[buses], V_complex)
+    result = np.conj(Si[buses])*np.conj(W[buses, n-1]) - Yshunt*V_complex[buses, n-1] - PP
 
-def evaluate_bus_eq_dsb_slack(i, n, Si, Pi, case, run):
+    run.Soluc_eval[2*buses, n] = np.real(result)
+    run.Soluc_eval[2*buses + 1, n] = np.imag(result)
+
+def evaluate_bus_eq_dsb_slack(buses, n, Si, Pi, case, run):
     """Function to evaluate the slack bus equation
     
-    bus i, coefficient n
+    buses, coefficient n
     """
     if n == 1:
-        run.Soluc_eval[2*i][n] = case.V[i] - 1
-        run.Soluc_eval[2*i + 1][n] = 0
+        run.Soluc_eval[2*buses, n] = scenario_axis(case.V[buses] - 1, run.V_complex)
     else:
-        run.Soluc_eval[2*i][n] = 0
-        run.Soluc_eval[2*i + 1][n] = 0
+        run.Soluc_eval[2*buses, n] = 0
+    run.Soluc_eval[2*buses + 1, n] = 0
 
 #---------------------------------------------------------------------------------------
 def compute_complex_voltages(n, pv_bus_model, case, run):
@@ -396,64 +576,40 @@ def compute_complex_voltages(n, pv_bus_model, case, run):
     
     coefficient n"""
     # Assign local variables for faster access
-    Vre_PV = run.Vre_PV
     V_complex = run.V_complex
     coefficients = run.coefficients
-    Buses_type = run.Buses_type
 
-    if pv_bus_model == 2:
-        for i in range(case.N):
-            V_complex[i][n] = coefficients[i*2][n] + 1j*coefficients[i*2 + 1][n]
-    else: # pv_bus_model == 1:
-        for i in range(case.N):
-            if Buses_type[i] == 'PV' or Buses_type[i] == 'PVLIM':
-                V_complex[i][n] = Vre_PV[i][n] + 1j*coefficients[i*2 + 1][n]
-            else:
-                V_complex[i][n] = coefficients[i*2][n] + 1j*coefficients[i*2 + 1][n]
+    V_complex[:, n] = coefficients[0:2*case.N:2, n] + 1j*coefficients[1:2*case.N:2, n]
+    if pv_bus_model == 1:
+        # PV and PVLIM buses
+        list_gen = run.list_gen
+        V_complex[list_gen, n] = run.Vre_PV[list_gen, n] + 1j*coefficients[2*list_gen + 1, n]
 
 def calculate_inverse_voltages_w_array(n, case, run):
     """W computing - Inverse voltages "W" array"""
-    # Assign local variables for faster access
-    W = run.W
-    V_complex = run.V_complex
-
-    for i in range(case.N):
-        aux = 0
-        for k in range(n):
-            aux += (W[i][k] * V_complex[i][n-k])
-        W[i][n] = -aux
+    run.kernels.inverse_voltages(run.W, run.V_complex, n)
 
 def P_iny(i, case, run):
     """Computing P injection at bus i. Must be used after Voltages_profile()"""
     # Assign local variables for faster access
-    Yre = case.Yre
-    Yimag = case.Yimag
-    branches_buses = case.branches_buses
-    Vre = run.Vre
-    Vimag = run.Vimag
-
-    Piny = 0
-    for k in branches_buses[i]:
-        Piny += Vre[i] * (Yre[i][k]*Vre[k] - Yimag[i][k]*Vimag[k]) \
-                + Vimag[i] * (Yre[i][k]*Vimag[k] + Yimag[i][k]*Vre[k])
-    return Piny
+    Y = case.Y
+    V_complex_profile = run.V_complex_profile
+
+    row = slice(Y.indptr[i], Y.indptr[i+1])
+    I = Y.data[row] @ V_complex_profile[Y.indices[row]]
+    return (V_complex_profile[i] * np.conj(I)).real
 
 def Q_iny(i, case, run):
     """Computing Q injection at bus i. Must be used after Voltages_profile()"""
     # Assign local variables for faster access
-    Yre = case.Yre
-    Yimag = case.Yimag
-    branches_buses = case.branches_buses
-    Vre = run.Vre
-    Vimag = run.Vimag
-
-    Qiny = 0
-    for k in branches_buses[i]:
-        Qiny += Vimag[i] * (Yre[i][k]*Vre[k] - Yimag[i][k]*Vimag[k]) \
-                - Vre[i] * (Yre[i][k]*Vimag[k] + Yimag[i][k]*Vre[k])
-    return Qiny
-
-def check_PVLIM_violation(detailed_run_print, case, run):
+    Y = case.Y
+    V_complex_profile = run.V_complex_profile
+
+    row = slice(Y.indptr[i], Y.indptr[i+1])
+    I = Y.data[row] @ V_complex_profile[Y.indices[row]]
+    return (V_complex_profile[i] * np.conj(I)).imag
+
+def check_PVLIM_violation(case, run):
     """Verification of Qgen limits for PVLIM buses"""
     # Assign local variables for faster access
     Qd = case.Qd
@@ -473,8 +629,9 @@ def check_PVLIM_violation(detailed_run_print, case, run):
             Buses_type[i] = 'PQ'
             list_gen_remove.append(i)
             Qg[i] = Qgmax[i] if Qg_incog > Qgmax[i] else Qgmin[i]
-            if detailed_run_print:
-                print('Bus %d exceeded its Qgen limit with %f. The exceeded limit %f will be assigned to the bus'%(i+1,Qg_incog,Qg[i]))
+            log_event(logger, logging.DEBUG, 'bus_type_switch',
+                      'Bus %d exceeded its Qgen limit with %f. The exceeded limit %f will be assigned to the bus',
+                      i+1, Qg_incog, Qg[i], bus=int(i+1), Qg=Qg_incog, limit=Qg[i])
     return flag_violacion
 
 def compute_k_factor(case, run):
@@ -522,25 +679,76 @@ def K_slack_1(case, run):
     run.K[case.slack] = 1
 
 
+def continued_voltages(series_large, continuation, run):
+    """Analytic continuation of the voltages with series_large coefficients.
+
+    With run.continuation == 'epsilon' it is read from the running epsilon table. 
+    Buses whose table broke down (a zero difference in the table) and every bus 
+    with run.continuation == 'pade' are continued with the batched matrix method,
+    solved with run.pade_solver. With 'pade', the condition number estimates of the
+    Hankel matrices are kept in run.pade_conditioning.
+    """
+    run.stats.count('continuation evaluations')
+    if run.continuation == 'pade':
+        run.stats.count('Padé evaluations')
+        V_continued, run.pade_conditioning = pade_batch(run.V_complex, series_large, run.pade_solver,
+                                                        True, run.kernels)
+        return V_continued
+    V_continued = continuation.value()
+    broken = ~np.isfinite(V_continued)
+    if broken.any():
+        run.stats.count('Padé evaluations')
+        V_continued[broken] = pade_batch(run.V_complex[broken], series_large, run.pade_solver,
+                                          kernels=run.kernels)
+    return V_continued
+
+def coefficient_step(n, Si, Pi, pv_bus_model, case, run):
+    """Coefficient n of the voltages: right hand side, solution of the system of
+    modif_Ytrans, voltages and inverse voltages"""
+    # Assign local variables for faster access
+    Soluc_no_eval = run.Soluc_no_eval
+    Soluc_eval = run.Soluc_eval
+    stats = run.stats
+
+    stats.count('coefficients')
+    with stats.phase('RHS evaluation'):
+        # Compute Vre_PV for current coefficient. Only for pv_bus_model 1 
+        if pv_bus_model == 1:
+            Calculo_Vre_PV(n, case, run)
+
+        # Compute the right hand side of the matrix equation
+        for i in range(len(Soluc_no_eval)):
+            Soluc_no_eval[i][1](Soluc_no_eval[i][0], n, Si, Pi, case, run)
+
+        # Determine right_hand_side of matrix equation
+        if pv_bus_model == 1:
+            # Columns to subtract
+            run.resta_columnas_PV[:] = run.Y_Vsp_PV @ run.Vre_PV[:,n]
+            right_hand_side = Soluc_eval[:,n] - run.resta_columnas_PV
+        else: # pv_bus_model == 2:
+            right_hand_side = Soluc_eval[:,n]
+
+    # New column of coefficients
+    with stats.phase('solve'):
+        run.coefficients[:,n] = run.solve(right_hand_side)
+
+    # Compute V_complex and inverse voltages for current coefficient 
+    with stats.phase('W/V convolution'):
+        compute_complex_voltages(n, pv_bus_model, case, run)
+        calculate_inverse_voltages_w_array(n, case, run)
+
 def computing_voltages_mismatch(
-    detailed_run_print, mismatch, max_coef, enforce_Q_limits,
+    mismatch, max_coef, enforce_Q_limits,
     pv_bus_model, DSB_model_method, case, run
 ):
     """Loop of coefficients computing until the mismatch is reached"""
     # Assign local variables for faster access
-    slack = case.slack
-    branches_buses = case.branches_buses
-    Soluc_no_eval = run.Soluc_no_eval
     N = case.N
-    Y_Vsp_PV = run.Y_Vsp_PV
     list_coef = run.list_coef
-    solve = run.solve
     V_complex_profile = run.V_complex_profile
-    Soluc_eval = run.Soluc_eval
-    coefficients = run.coefficients
-    resta_columnas_PV = run.resta_columnas_PV
     Vre_PV = run.Vre_PV
     V_complex = run.V_complex
+    stats = run.stats
     
     # Variables initialization
     coef_actual = 0
@@ -552,12 +760,17 @@ def computing_voltages_mismatch(
         Vre_PV[:,0] = 1
     compute_complex_voltages(0, pv_bus_model, case, run)
 
+    # Running analytic continuation of the voltage series of every bus
+    continuation = None
+    if run.continuation == 'epsilon':
+        continuation = EpsilonTable(N, max_coef)
+        continuation.add(V_complex[:,0])
+
     # Compute active and complex power injection
     Pi = run.Pg - case.Pd
     Si = Pi + run.Qg*1j - case.Qd*1j
 
     # Flags
-    first_check = True
     flag_recalculate = False
     flag_divergence = False
 
@@ -566,90 +779,53 @@ def computing_voltages_mismatch(
         if coef_actual == 40:
             # Expand the coeffcients arrays to the maximum. They were originally set to 40
             run.expand_coef_arrays()
-        if detailed_run_print:
-            print("Computing coefficient: %d"%coef_actual)
+            V_complex = run.V_complex
+        logger.debug("Computing coefficient: %d", coef_actual)
 
-        # Compute Vre_PV for current coefficient. Only for pv_bus_model 1 
-        if pv_bus_model == 1:
-            Calculo_Vre_PV(coef_actual, case, run)
+        coefficient_step(coef_actual, Si, Pi, pv_bus_model, case, run)
 
-        # Compute the right hand side of the matrix equation
-        for i in range(len(Soluc_no_eval)):
-            Soluc_no_eval[i][1](Soluc_no_eval[i][0], coef_actual, Si, Pi, case, run)
+        # Add the new coefficient to the continuation of every bus
+        if continuation is not None:
+            with stats.phase('Padé checks'):
+                continuation.add(V_complex[:,coef_actual])
 
-        # Determine right_hand_side of matrix equation
-        if pv_bus_model == 1:
-            # Columns to subtract
-            resta_columnas_PV.fill(0)
-            for Vre_vec in Y_Vsp_PV:
-                array = Vre_PV[Vre_vec[0]][coef_actual] * Vre_vec[1]
-                pos = 0
-                for k in branches_buses[Vre_vec[0]]:
-                    resta_columnas_PV[2*k] += array[pos]
-                    resta_columnas_PV[2*k+1] += array[pos+1]
-                    pos += 2
-                if DSB_model_method is not None:
-                    if slack in branches_buses[Vre_vec[0]]:
-                        resta_columnas_PV[2*N] += array[pos]
-            right_hand_side = Soluc_eval[:,coef_actual] - resta_columnas_PV
-        else: # pv_bus_model == 2:
-            right_hand_side = Soluc_eval[:,coef_actual]
-
-        # New column of coefficients
-        coefficients[:,coef_actual] = solve(right_hand_side)
-
-        # Compute V_complex and inverse voltages for current coefficient 
-        compute_complex_voltages(coef_actual, pv_bus_model, case, run)
-        calculate_inverse_voltages_w_array(coef_actual, case, run)
-        
         # Mismatch check
         flag_mismatch = False
         series_large += 1
-        if (series_large - 1) % 2 == 0 and series_large > 3:
-            if first_check:
-                first_check = False
-                for i in range(N):
-                    magn1,rad1 = cm.polar(Pade(V_complex[i],series_large-2))
-                    V_complex_profile[i] = Pade(V_complex[i],series_large)
-                    magn2, rad2 = cm.polar(V_complex_profile[i])
-                    if((abs(magn1-magn2)>mismatch) or (abs(rad1-rad2)>mismatch)):
-                        flag_mismatch = True
-                        pade_til = i+1
-                        break
-            else:
-                continue_check = True
-                for i in range(pade_til):
-                    magn1,rad1 = cm.polar(V_complex_profile[i])
-                    V_complex_profile[i] = Pade(V_complex[i],series_large)
-                    magn2, rad2 = cm.polar(V_complex_profile[i])
-                    if((abs(magn1-magn2)>mismatch) or (abs(rad1-rad2)>mismatch)):
-                        flag_mismatch = True
-                        pade_til = i+1
-                        continue_check = False
-                        break
-                if continue_check:
-                    for i in range(pade_til,N):
-                        magn1,rad1 = cm.polar(Pade(V_complex[i],series_large-2))
-                        V_complex_profile[i] = Pade(V_complex[i],series_large)
-                        magn2, rad2 = cm.polar(V_complex_profile[i])
-                        if((abs(magn1-magn2)>mismatch) or (abs(rad1-rad2)>mismatch)):
-                            flag_mismatch = True
-                            pade_til = i+1
+        if (series_large - 1) % 2 == 0:
+            with stats.phase('Padé checks'):
+                V_continued = continued_voltages(series_large, continuation, run)
+            if run.pade_conditioning is not None and details_enabled(logger):
+                logger.debug("Padé matrices conditioning: %.3e (worst bus %d)",
+                             np.max(run.pade_conditioning), np.argmax(run.pade_conditioning))
+            if series_large > 3:
+                flag_mismatch = np.any(
+                    (np.abs(np.abs(V_continued) - np.abs(V_continued_previous)) > mismatch) |
+                    (np.abs(np.angle(V_continued) - np.angle(V_continued_previous)) > mismatch)
+                )
+                V_complex_profile[:] = V_continued
+                if not flag_mismatch:
+                    # Qgen check or ignore limits
+                    if enforce_Q_limits:
+                        with stats.phase('Q-limit checks'):
+                            violation = check_PVLIM_violation(case, run)
+                        if violation:
+                            log_event(logger, logging.INFO, 'restart',
+                                      "At coefficient %d the system is to be resolved due to PVLIM to PQ switches",
+                                      series_large, algorithm='HELM', coefficients=series_large)
+                            list_coef.append(series_large)
+                            flag_recalculate = True
                             break
-            if not flag_mismatch:
-                # Qgen check or ignore limits
-                if enforce_Q_limits:
-                    if check_PVLIM_violation(detailed_run_print, case, run):
-                        if detailed_run_print:
-                            print("At coefficient %d the system is to be resolved due to PVLIM to PQ switches\n"%series_large)
-                        list_coef.append(series_large)
-                        flag_recalculate = True
-                        break
-                print('\nConvergence has been reached. %d coefficients were calculated'%series_large)
-                list_coef.append(series_large)
-                break
+                    list_coef.append(series_large)
+                    log_event(logger, logging.INFO, 'converged',
+                              'Convergence has been reached. %d coefficients were calculated', series_large,
+                              algorithm='HELM', coefficients=series_large, list_coef=list(list_coef))
+                    break
+            V_continued_previous = V_continued
         if series_large > max_coef-1:
-            print('\nMaximum number of coefficients has been reached. The problem has no physical solution')
+            log_event(logger, logging.WARNING, 'diverged',
+                      'Maximum number of coefficients has been reached. The problem has no physical solution',
+                      algorithm='HELM', coefficients=series_large, list_coef=list(list_coef))
             flag_divergence = True
             break
     
@@ -663,12 +839,17 @@ def convert_complex_to_polar_voltages(complex_voltage, N):
     return polar_voltage
 
 
+def branch_flows(V_complex_profile, case):
+    """Complex powers (MVA) injected at the from and to ends of every branch, (N_branches, 2)"""
+    V_branches = V_complex_profile[case.Ybr_buses]
+    I = np.einsum('bij,bj->bi', case.Ybr, V_branches)
+    return V_branches * np.conj(I) * 100
+
 def power_balance(enforce_Q_limits, algorithm, case, run):
     """Computation of power flow through branches and power balance"""
     # Save for later: Pi=None, Qi=None, K=None 
 
     # Assign local variables for faster access
-    Ybr_list = case.Ybr_list
     Shunt = case.Shunt
     slack = case.slack
     Pd = case.Pd
@@ -682,39 +863,23 @@ def power_balance(enforce_Q_limits, algorithm, case, run):
     # Define array to power flow through branches data
     Power_branches = np.zeros((case.N_branches,8), dtype=np.float64)
 
-    for branch in range(case.N_branches):
-
-        Bus_from =  Power_branches[branch][0] = int(Ybr_list[branch][0])
-        Bus_to = Power_branches[branch][1] = int(Ybr_list[branch][1])
-        Ybr = Ybr_list[branch][2]
-
-        V_from = V_complex_profile[Bus_from]
-        V_to = V_complex_profile[Bus_to]
-        V_vector = np.array([V_from,V_to])
-        
-        I =  np.matmul(Ybr,V_vector)
-
-        S_ft = V_from * np.conj(I[0]) * 100
-        S_tf = V_to * np.conj(I[1]) * 100
-        S_branch_elements = S_ft + S_tf
-
-        Power_branches[branch][2] = np.real(S_ft)
-        Power_branches[branch][3] = np.imag(S_ft)
+    # Currents and powers at both ends of every branch
+    S_ft_tf = branch_flows(V_complex_profile, case)
+    S_branch_elements = S_ft_tf[:,0] + S_ft_tf[:,1]
 
-        Power_branches[branch][4] = np.real(S_tf)
-        Power_branches[branch][5] = np.imag(S_tf)
-
-        Power_branches[branch][6] = np.real(S_branch_elements)
-        Power_branches[branch][7] = np.imag(S_branch_elements)
+    Power_branches[:,0:2] = case.Ybr_buses
+    Power_branches[:,2] = np.real(S_ft_tf[:,0])
+    Power_branches[:,3] = np.imag(S_ft_tf[:,0])
+    Power_branches[:,4] = np.real(S_ft_tf[:,1])
+    Power_branches[:,5] = np.imag(S_ft_tf[:,1])
+    Power_branches[:,6] = np.real(S_branch_elements)
+    Power_branches[:,7] = np.imag(S_branch_elements)
 
     P_losses_line = np.sum(Power_branches[:,6])/100
     Q_losses_line = np.sum(Power_branches[:,7]) * 1j /100
 
     # Computation of power through shunt capacitors, reactors or conductantes, Power balanca
-    S_shunt = 0
-    for i in range(case.N):
-        if Shunt[i] != 0:
-            S_shunt += V_complex_profile[i] * np.conj(V_complex_profile[i]*Shunt[i])
+    S_shunt = np.sum(V_complex_profile * np.conj(V_complex_profile*Shunt))
 
     Qload = np.sum(Qd) * 1j
     Pload = np.sum(Pd)
@@ -754,20 +919,21 @@ def power_balance(enforce_Q_limits, algorithm, case, run):
     else:
         return (Power_branches, S_gen, S_load, S_mismatch, None)
 
-def print_voltage_profile(V_polar_final, N):
-    """Print voltage profile."""
-    print("\n\tVoltage profile:")
-    print("   Bus    Magnitude (p.u.)    Phase Angle (degrees)")
+def voltage_profile_string(V_polar_final, N):
+    """Table of the voltage profile, the first and last 14 buses of cases with more than 31"""
+    row = "{:>6d}\t     {:1.6f}\t\t{:11.6f}"
+    lines = ["\n\tVoltage profile:", "   Bus    Magnitude (p.u.)    Phase Angle (degrees)"]
     if N <= 31:
-        print(*("{:>6d}\t     {:1.6f}\t\t{:11.6f}" \
-            .format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final)), sep='\n')
+        lines += [row.format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final)]
     else:
-        print(*("{:>6d}\t     {:1.6f}\t\t{:11.6f}" \
-            .format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[0:14])), sep='\n')
-        print(* 3*("     .\t         .\t\t      .",), sep='\n')
-        print(*("{:>6d}\t     {:1.6f}\t\t{:11.6f}" \
-            .format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[N-14:N],N-14)), sep='\n')
-    print()
+        lines += [row.format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[0:14])]
+        lines += 3*["     .\t         .\t\t      ."]
+        lines += [row.format(i,mag,ang) for i,(mag,ang) in enumerate(V_polar_final[N-14:N],N-14)]
+    return "\n".join(lines) + "\n"
+
+def print_voltage_profile(V_polar_final, N):
+    """Log the voltage profile (DEBUG)."""
+    logger.debug("%s", voltage_profile_string(V_polar_final, N))
 
 def create_power_balance_string(
     mismatch, scale, algorithm,
@@ -813,6 +979,9 @@ def write_results_on_files(
         str(scale) + ' ' + \
         str(mismatch)
 
+    # pandas and openpyxl are only loaded to write the results
+    import pandas as pd
+
     # Write voltage profile and branch data to .xlsx file
     voltages_dataframe = pd.DataFrame()
     voltages_dataframe["Complex Voltages"] = run.V_complex_profile
@@ -828,10 +997,9 @@ def write_results_on_files(
     power_flow_dataframe['P flow through branch and elements (MW)'] = Power_branches[:,6]
     power_flow_dataframe['Q flow through branch and elements (MVAR)'] = Power_branches[:,7]
     xlsx_name = files_name + '.xlsx'
-    xlsx_file = pd.ExcelWriter(xlsx_name) # pylint: disable=abstract-class-instantiated
-    voltages_dataframe.to_excel(xlsx_file, sheet_name="Buses")
-    power_flow_dataframe.to_excel(xlsx_file, sheet_name="Branches")
-    xlsx_file.save()
+    with pd.ExcelWriter(xlsx_name) as xlsx_file: # pylint: disable=abstract-class-instantiated
+        voltages_dataframe.to_excel(xlsx_file, sheet_name="Buses")
+        power_flow_dataframe.to_excel(xlsx_file, sheet_name="Branches")
 
     # Write power balance and other data to .txt file
     # Coefficients/Iterations per PVLIM-PQ switches are written
@@ -840,7 +1008,51 @@ def write_results_on_files(
     txt_file.write(power_balance_string)
     txt_file.close()
 
-    print("\nResults have been written on the files:\n\t%s \n\t%s"%(xlsx_name,txt_name))
+    log_event(logger, logging.INFO, 'results_written', "Results have been written on the files:\n\t%s \n\t%s",
+              xlsx_name, txt_name, files=[xlsx_name, txt_name])
+
+def estimate_run_bytes(case, pv_bus_model, DSB_model_method, max_coef, continuation, formulation):
+    """Bytes of the largest structures of a helm run of case, {structure: bytes}
+
+    The coefficient arrays are allocated for 40 coefficients and copied to arrays of
+    max_coef ones at coefficient 40, both are counted. The factorization is not
+    included, its fill is only known after factorizing (see factorization_bytes).
+    """
+    N = case.N
+    length = 2*N if DSB_model_method is None else 2*N+1
+    columns = max_coef + (40 if max_coef > 40 else 0)
+    estimate = {
+        'coefficients': 8*length*columns,
+        'Soluc_eval': 8*length*columns,
+        'V_complex': 16*N*columns,
+        'W': 16*N*columns,
+    }
+    if pv_bus_model == 2 or DSB_model_method == 2:
+        estimate['barras_CC'] = 16*N*columns
+    if pv_bus_model == 1:
+        estimate['Vre_PV'] = 8*N*columns
+    if continuation == 'epsilon':
+        estimate['EpsilonTable'] = 2*16*N*max_coef
+    if formulation == 'complex':
+        estimate['Ytrans_mod'] = (16 + 4)*case.Ytrans.nnz + 4*N
+    else:
+        estimate['Ytrans_mod'] = (8 + 4)*(4*case.Ytrans.nnz + length) + 4*length
+    return estimate
+
+def factorization_bytes(run):
+    """Bytes of the factors of run.base_Ytrans_mod (values and row indices), 0 if it was given"""
+    matrix = run.base_Ytrans_mod
+    if run.fill_ratio is None:
+        return 0
+    return int(run.fill_ratio*matrix.nnz*(matrix.dtype.itemsize + 4))
+
+def check_memory_budget(memory_budget, estimate):
+    """Raise MemoryError if the bytes of estimate ({structure: bytes}) exceed memory_budget"""
+    total = sum(estimate.values())
+    if total > memory_budget:
+        largest = sorted(estimate.items(), key=lambda item: -item[1])[:3]
+        raise MemoryError("The run needs about %d bytes, more than the memory budget of %d bytes. Largest: %s"%(
+            total, memory_budget, ", ".join("%s %d"%item for item in largest)))
 
 def validate_arguments(
         case,
@@ -848,6 +1060,8 @@ def validate_arguments(
         max_coefficients, enforce_Q_limits,
         results_file_name, save_results,
         pv_bus_model, DSB_model, DSB_model_method, 
+        backend='numba', continuation='epsilon', pade_solver='dense', max_update_rank=50, ordering='colamd',
+        linear_solver='superlu', formulation='real', stats=False, memory_report=False, memory_budget=None,
 ):
     if (type(detailed_run_print) is not bool or \
         type(mismatch) is not float or \
@@ -870,29 +1084,61 @@ def validate_arguments(
         )
     ):
         print("Erroneous argument type.")
-        return False, None
+        return False
     if max_coefficients < 5:
         print("'max_coefficients' must be equal or greater than five (5).")
-        return False, None
+        return False
     if pv_bus_model not in (1, 2):
         print("'pv_bus_model' must be the integer 1 or 2.",)
-        return False, None
+        return False
     if DSB_model_method is not None and DSB_model_method not in (1, 2):
         print("'DSB_model_method' must be the integer 1 or 2.",)
-        return False, None
+        return False
+    if backend not in ('numpy', 'numba'):
+        print("'backend' must be the string 'numpy' or 'numba'.",)
+        return False
+    if continuation not in ('epsilon', 'pade'):
+        print("'continuation' must be the string 'epsilon' or 'pade'.",)
+        return False
+    if pade_solver not in ('dense', 'levinson'):
+        print("'pade_solver' must be the string 'dense' or 'levinson'.",)
+        return False
+    if type(max_update_rank) is not int or max_update_rank < 0:
+        print("'max_update_rank' must be a non-negative integer.",)
+        return False
+    if ordering not in ('colamd', 'mmd', 'rcm', None):
+        print("'ordering' must be the string 'colamd', 'mmd' or 'rcm', or None.",)
+        return False
+    if linear_solver not in ('superlu', 'umfpack', 'dense', 'auto') and not hasattr(linear_solver, 'factorize'):
+        print("'linear_solver' must be the string 'superlu', 'umfpack', 'dense' or 'auto', or a solver object.",)
+        return False
+    if formulation not in ('real', 'complex'):
+        print("'formulation' must be the string 'real' or 'complex'.",)
+        return False
+    if type(stats) is not bool or type(memory_report) is not bool:
+        print("'stats' and 'memory_report' must be booleans.",)
+        return False
+    if memory_budget is not None and (type(memory_budget) not in (int, float) or memory_budget <= 0):
+        print("'memory_budget' must be a positive number of bytes or None.",)
+        return False
 
     return True
 
 
 # Main loop
+@print_details('detailed_run_print')
 def helm(case, detailed_run_print=False, mismatch=1e-4, scale=1, max_coefficients=100, enforce_Q_limits=True,
          results_file_name=None, save_results=False, pv_bus_model=2, DSB_model=False, DSB_model_method=None,
-         K_factors=None,
+         K_factors=None, backend='numba', continuation='epsilon', pade_solver='dense', max_update_rank=50,
+         factorization=None, ordering='colamd', linear_solver='superlu', formulation='real',
+         stats=False, memory_report=False, memory_budget=None,
          ) -> Tuple[RunVariables, int, bool]:
 
     # Arguments validation
     if not validate_arguments(case, detailed_run_print, mismatch, scale, max_coefficients, enforce_Q_limits,
-                              results_file_name, save_results, pv_bus_model, DSB_model, DSB_model_method):
+                              results_file_name, save_results, pv_bus_model, DSB_model, DSB_model_method,
+                              backend, continuation, pade_solver, max_update_rank, ordering, linear_solver,
+                              formulation, stats, memory_report, memory_budget):
         raise ValueError('Arguments were wrong.')
 
     if DSB_model and DSB_model_method is None:
@@ -911,65 +1157,129 @@ def helm(case, detailed_run_print=False, mismatch=1e-4, scale=1, max_coefficient
 
     max_coef = max_coefficients
 
+    # Fail before allocating the run if the case and its series arrays exceed memory_budget
+    if memory_budget is not None:
+        estimate = estimate_run_bytes(case, pv_bus_model, DSB_model_method, max_coef, continuation, formulation)
+        estimate['case'] = sum(structure_bytes(case).values())
+        check_memory_budget(memory_budget, estimate)
+
+    # Peak memory of the run, traced unless it is already being traced
+    start_tracing = memory_report and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    elif memory_report:
+        tracemalloc.reset_peak()
+
     # set case at the scale
     if scale != 1:
         case.set_scale(scale)
 
-    # Declare run_variables_class objects.
-    # Variables/arrays initialization are inside it
-    run = RunVariables(case, pv_bus_model, DSB_model, DSB_model_method, max_coef)
+    try:
+        # Declare run_variables_class objects.
+        # Variables/arrays initialization are inside it
+        run = RunVariables(case, pv_bus_model, DSB_model, DSB_model_method, max_coef)
+
+        # Optional externally-supplied distributed-slack participation factors (one weight per
+        # bus). When given, they override the default generation-proportional K factors.
+        run.external_K = K_factors
+
+        # Convolution kernels of the recursion. 'numba' falls back to 'numpy' if numba is missing
+        run.kernels = Kernels(backend)
+
+        # Analytic continuation of the convergence checks: running epsilon table or batched Padé
+        run.continuation = continuation
+        # Solver of the Padé linear systems: stacked dense LU or O(L^2) Levinson-Trench recursion
+        run.pade_solver = pade_solver
+        # Maximum rank of the corrections of the Ytrans_mod factorization after bus type changes
+        run.max_update_rank = max_update_rank
+        # Optional (Ytrans_mod, solve) factorized by a run of a case with the same buses and models
+        # (run.base_Ytrans_mod, run.base_solve). This run solves with low rank corrections of it
+        if factorization is not None:
+            run.base_Ytrans_mod, run.base_solve = factorization
+        # Fill-reducing bus ordering of the factorization. None lets SuperLU order the columns
+        run.ordering = ordering
+        # Backend of the factorization: 'superlu', 'umfpack', 'dense' or 'auto' (see linear_solvers)
+        run.linear_solver = linear_solver
+        # System of every coefficient: 'real' (2N real unknowns) or 'complex' (N-1 complex unknowns
+        # and a real border of the PV and DSB constraints, see modif_Ytrans_complex)
+        run.formulation = formulation
+        # Opt-in timing of the phases of the run and counters (RunStats), kept in run.stats.
+        # The parsing and Y assembly times of the case are in case.stats
+        run.stats = RunStats(stats)
+
+        while True:
+            # Re-construct list_gen. List of generators (PV buses)
+            run.list_gen = np.setdiff1d(run.list_gen, run.list_gen_remove, assume_unique=True)
+
+            # Define K factors
+            if DSB_model:
+                # Computing the K factor for each PV bus and the slack bus.
+                compute_k_factor(case, run)
+            elif DSB_model_method is not None:
+                # Set the slack's participation factor to 1 and the rest to 0. Classic slack bus model.
+                K_slack_1(case, run)
+
+            # Create modified Y matrix and list that contains the respective column to its voltage on PV and PVLIM buses 
+            with run.stats.phase('modif_Ytrans'):
+                if formulation == 'complex':
+                    modif_Ytrans_complex(DSB_model_method, pv_bus_model, case, run)
+                else:
+                    modif_Ytrans(DSB_model_method, pv_bus_model, case, run)
+            if memory_budget is not None and not run.update_rank:
+                # With the size of the factors
+                estimate['factorization'] = factorization_bytes(run)
+                check_memory_budget(memory_budget, estimate)
+            if run.update_rank:
+                logger.debug("Rank %d update of the factorization", run.update_rank)
+            else:
+                logger.debug("Fill ratio of the factorization: %.3f (ordering: %s, linear solver: %s)",
+                             run.fill_ratio, run.ordering, getattr(run.linear_solver, 'name', run.linear_solver))
 
-    # Optional externally-supplied distributed-slack participation factors (one weight per
-    # bus). When given, they override the default generation-proportional K factors.
-    run.external_K = K_factors
+            # Arrays and lists creation
+            Unknowns_soluc(DSB_model_method, pv_bus_model, case.N, run)
 
-    while True:
-        # Re-construct list_gen. List of generators (PV buses)
-        run.list_gen = np.setdiff1d(run.list_gen, run.list_gen_remove, assume_unique=True)
-
-        # Define K factors
-        if DSB_model:
-            # Computing the K factor for each PV bus and the slack bus.
-            compute_k_factor(case, run)
-        elif DSB_model_method is not None:
-            # Set the slack's participation factor to 1 and the rest to 0. Classic slack bus model.
-            K_slack_1(case, run)
-
-        # Create modified Y matrix and list that contains the respective column to its voltage on PV and PVLIM buses 
-        modif_Ytrans(DSB_model_method, pv_bus_model, case, run)
-
-        # Arrays and lists creation
-        Unknowns_soluc(DSB_model_method, pv_bus_model, case.N, run)
-
-        # Loop of coefficients computing until the mismatch is reached
-        flag_recalculate, flag_divergence, series_large = computing_voltages_mismatch(detailed_run_print, mismatch,
-                                                                                      max_coef, enforce_Q_limits,
-                                                                                      pv_bus_model, DSB_model_method,
-                                                                                      case, run)
-
-        if not flag_recalculate:
-            break
-    # reset scale case
-    if scale != 1:
-        case.reset_scale()
+            # Loop of coefficients computing until the mismatch is reached
+            flag_recalculate, flag_divergence, series_large = computing_voltages_mismatch(mismatch,
+                                                                                          max_coef, enforce_Q_limits,
+                                                                                          pv_bus_model, DSB_model_method,
+                                                                                          case, run)
 
+            if not flag_recalculate:
+                break
+            run.stats.count('restarts')
+
+        if memory_report:
+            run_bytes = structure_bytes(run)
+            run_bytes['factorization'] = factorization_bytes(run)
+            run.memory = MemoryReport(tracemalloc.get_traced_memory()[1], structure_bytes(case), run_bytes)
+    finally:
+        # reset scale case, also if the run raised
+        if scale != 1:
+            case.reset_scale()
+        if start_tracing:
+            tracemalloc.stop()
+
+    details = details_enabled(logger)
     if not flag_divergence:
-        if detailed_run_print or save_results:
+        if details or save_results:
             Ploss = None
 
             if DSB_model_method is not None:
-                Ploss = Pade(run.coefficients[2*case.N], series_large)
+                Ploss = pade_batch(run.coefficients[2*case.N:2*case.N+1], series_large, pade_solver,
+                                   kernels=run.kernels)[0]
 
-            Power_branches, S_gen, S_load, S_mismatch, Pmismatch = power_balance(enforce_Q_limits, algorithm, case, run)
+            with run.stats.phase('power_balance'):
+                Power_branches, S_gen, S_load, S_mismatch, Pmismatch = power_balance(enforce_Q_limits, algorithm,
+                                                                                     case, run)
 
-            if detailed_run_print or save_results:
+            if details or save_results:
                 V_polar_final = convert_complex_to_polar_voltages(run.V_complex_profile, case.N)
 
                 power_balance_string = create_power_balance_string(mismatch, scale, algorithm, run.list_coef, S_gen,
                                                                    S_load, S_mismatch, Ploss, Pmismatch)
-                if detailed_run_print:
+                if details:
                     print_voltage_profile(V_polar_final, case.N)
-                    print(power_balance_string)
+                    logger.debug("%s", power_balance_string)
                 if save_results:
                     write_results_on_files(mismatch, scale, algorithm, V_polar_final, Power_branches, results_file_name,
                                            run, power_balance_string)
@@ -0,0 +1,308 @@
+"""
+HELMpy, open source package of power flow solvers developed on Python 3
+Copyright (C) 2019 Tulio Molina tuliojose8@gmail.com and Juan José Ortega juanjoseop10@gmail.com
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Batched HELM. Several load/generation scenarios of one case are solved at once.
+
+The modified Y matrix depends only on the topology, the bus types and the K factors.
+The scenarios that share them share its factorization: the coefficients of all of
+them are computed with one multi right hand side solve per coefficient. Arrays of
+coefficients have the scenarios in the last axis, e.g. coefficients (length, n, S). The
+right hand side and the coefficients are computed with the functions of helm, which
+evaluate every scenario at once with these arrays.
+Scenarios with PVLIM to PQ switches are restarted. The restarts of all the groups are
+grouped again by their new bus types.
+"""
+
+import logging
+
+import numpy as np
+
+from helmpy.core.classes import BatchResults, BatchRunVariables, BUS_PQ, BUS_PV, BUS_SLACK
+from helmpy.core.helm import modif_Ytrans, Unknowns_soluc, compute_complex_voltages, coefficient_step
+from helmpy.core.analytic_continuation import pade_batch, EpsilonTable
+from helmpy.core.kernels import Kernels
+from helmpy.core.logs import log_event, details_enabled, print_details, get_logger
+
+logger = get_logger(__name__)
+
+
+def compute_k_factors(scenarios, DSB_model, K_factors, case, results):
+    """K factors of the scenarios. Same rules as compute_k_factor and K_slack_1 of helm"""
+    K = results.K
+    Pg = results.Pg
+    slack = case.slack
+
+    K[:, scenarios] = 0
+    if not DSB_model:
+        # Classic slack bus model
+        K[slack, scenarios] = 1
+        return
+    if K_factors is not None:
+        weights = np.asarray(K_factors, dtype=np.float64)
+        total = weights.sum()
+        if total > 0:
+            K[:, scenarios] = (weights / total)[:, np.newaxis]
+            return
+
+    # Active power that the slack must generate to compensate the system
+    Pg[slack, scenarios] = results.Pg_imbalance[scenarios]
+    is_gen = (results.Buses_type[:, scenarios] == 'PV') | (results.Buses_type[:, scenarios] == 'PVLIM')
+    is_gen[slack] = True
+    Pgen = np.where(is_gen & (Pg[:, scenarios] > 0), Pg[:, scenarios], 0)
+    Pgen_total = np.sum(Pgen, axis=0)
+    K[:, scenarios] = Pgen / np.where(Pgen_total > 0, Pgen_total, 1)
+
+
+def split_scenarios(scenarios, results):
+    """Group the scenarios whose bus types and K factors are the same"""
+    if len(scenarios) == 0:
+        return []
+    Buses_type = results.Buses_type[:, scenarios]
+    code = np.full(Buses_type.shape, BUS_PQ, dtype=np.float64)
+    code[(Buses_type == 'PV') | (Buses_type == 'PVLIM')] = BUS_PV
+    code[Buses_type == 'Slack'] = BUS_SLACK
+    # + 0.0 turns -0.0 into 0.0, so equal keys have equal bytes
+    keys = np.vstack((code, results.K[:, scenarios] + 0.0)).T
+    groups = {}
+    for s, key in zip(scenarios, keys):
+        groups.setdefault(key.tobytes(), []).append(s)
+    return [np.array(group, dtype=np.int64) for group in groups.values()]
+
+
+def continued_voltages(series_large, continuation, pade_solver, run):
+    """Analytic continuation of the voltages of every bus and scenario, (N, S).
+
+    Read from the running epsilon table continuation, or with the matrix Padé method
+    (pade_batch) if it is None.
+    """
+    if continuation is not None:
+        return continuation.value()
+    N, _, S = run.V_complex.shape
+    series = np.moveaxis(run.V_complex[:, :series_large], 2, 1).reshape(N*S, series_large)
+    return pade_batch(series, series_large, pade_solver, kernels=run.kernels).reshape(N, S)
+
+def check_PVLIM_violation(scenarios, V_profile, case, results):
+    """Verification of Qgen limits of the PV and PVLIM buses of the scenarios.
+
+    V_profile (N, len(scenarios)). Buses that exceed their limits are switched to PQ
+    in results. Returns the scenarios with any switch.
+    """
+    Buses_type = results.Buses_type[:, scenarios]
+    is_gen = (Buses_type == 'PV') | (Buses_type == 'PVLIM')
+    Qg_incog = np.imag(V_profile * np.conj(case.Y @ V_profile)) + results.Qd[:, scenarios]
+    Qgmax = case.Qgmax[:, np.newaxis]
+    Qgmin = case.Qgmin[:, np.newaxis]
+    above = is_gen & (Qg_incog > Qgmax)
+    below = is_gen & (Qg_incog < Qgmin)
+    violation = above | below
+
+    Qg = results.Qg[:, scenarios]
+    Qg[is_gen] = Qg_incog[is_gen]
+    Qg = np.where(above, Qgmax, np.where(below, Qgmin, Qg))
+    results.Qg[:, scenarios] = Qg
+    Buses_type[violation] = 'PQ'
+    results.Buses_type[:, scenarios] = Buses_type
+
+    if details_enabled(logger):
+        for i, s in zip(*np.nonzero(violation)):
+            log_event(logger, logging.DEBUG, 'bus_type_switch',
+                      'Scenario %d: bus %d exceeded its Qgen limit with %f. The exceeded limit %f will be assigned to the bus',
+                      scenarios[s], i+1, Qg_incog[i, s], Qg[i, s],
+                      scenario=int(scenarios[s]), bus=int(i+1), Qg=Qg_incog[i, s], limit=Qg[i, s])
+    return scenarios[violation.any(axis=0)]
+
+def computing_voltages_mismatch(
+    mismatch, max_coef, enforce_Q_limits,
+    pv_bus_model, continuation_method, pade_solver, case, run, results
+):
+    """Loop of coefficients computing of a group of scenarios until the mismatch of all
+    of them is reached.
+
+    Scenarios leave the group when they converge or when they must be restarted due to
+    PVLIM to PQ switches. Returns the scenarios to be restarted.
+    """
+    restart = []
+
+    coef_actual = 0
+    series_large = 1
+    run.W[:, 0] = 1
+    if pv_bus_model == 1:
+        run.Vre_PV[:, 0] = 1
+    compute_complex_voltages(0, pv_bus_model, case, run)
+
+    # Running analytic continuation of the voltage series of every bus and scenario
+    continuation = None
+    if continuation_method == 'epsilon':
+        continuation = EpsilonTable(run.V_complex.shape[::2], max_coef)
+        continuation.add(run.V_complex[:, 0])
+
+    while True:
+        coef_actual += 1
+        if coef_actual == 40:
+            run.expand_coef_arrays()
+
+        # New coefficients of all the scenarios with one multi right hand side solve
+        coefficient_step(coef_actual, run.Si, run.Pi, pv_bus_model, case, run)
+        if continuation is not None:
+            continuation.add(run.V_complex[:, coef_actual])
+
+        # Mismatch check of every scenario
+        series_large += 1
+        if (series_large - 1) % 2 == 0:
+            V_continued = continued_voltages(series_large, continuation, pade_solver, run)
+            if series_large > 3:
+                V_previous = run.V_continued_previous
+                converged = ~np.any(
+                    (np.abs(np.abs(V_continued) - np.abs(V_previous)) > mismatch) |
+                    (np.abs(np.angle(V_continued) - np.angle(V_previous)) > mismatch),
+                    axis=0
+                )
+                if converged.any():
+                    scenarios = run.scenarios[converged]
+                    results.V_complex_profile[:, scenarios] = V_continued[:, converged]
+                    results.series_large[scenarios] = series_large
+                    for s in scenarios:
+                        results.list_coef[s].append(series_large)
+                    if enforce_Q_limits:
+                        switched = check_PVLIM_violation(scenarios, V_continued[:, converged], case, results)
+                        restart.extend(switched)
+                    else:
+                        # Reactive power of the generators, as helm does in power_balance
+                        V_profile = V_continued[:, converged]
+                        Qg = np.imag(V_profile * np.conj(case.Y @ V_profile)) + results.Qd[:, scenarios]
+                        results.Qg[run.list_gen[:, np.newaxis], scenarios] = Qg[run.list_gen]
+                    log_event(logger, logging.INFO, 'converged',
+                              'At coefficient %d, %d scenarios reached the mismatch', series_large, len(scenarios),
+                              algorithm='HELM batch', coefficients=series_large, scenarios=scenarios.tolist())
+                    if converged.all():
+                        break
+                    run.select(~converged)
+                    if continuation is not None:
+                        continuation.select(~converged)
+                    V_continued = V_continued[:, ~converged]
+            run.V_continued_previous = V_continued
+        if series_large > max_coef-1:
+            log_event(logger, logging.WARNING, 'diverged',
+                      'Maximum number of coefficients has been reached by %d scenarios. '
+                      'They have no physical solution', len(run.scenarios),
+                      algorithm='HELM batch', coefficients=series_large, scenarios=run.scenarios.tolist())
+            results.flag_divergence[run.scenarios] = True
+            if run.V_continued_previous is not None:
+                # Last continued voltages, as helm does
+                results.V_complex_profile[:, run.scenarios] = run.V_continued_previous
+            results.series_large[run.scenarios] = series_large
+            break
+
+    return np.array(restart, dtype=np.int64)
+
+def validate_arguments(case, P_scenarios, Q_scenarios, Pg_scenarios, mismatch, max_coefficients,
+                       pv_bus_model, DSB_model_method, backend, continuation, pade_solver, max_update_rank,
+                       ordering, linear_solver):
+    if np.ndim(P_scenarios) != 2 or np.shape(P_scenarios)[0] != case.N or \
+       np.shape(Q_scenarios) != np.shape(P_scenarios) or \
+       (Pg_scenarios is not None and np.shape(Pg_scenarios) != np.shape(P_scenarios)):
+        print("'P_scenarios', 'Q_scenarios' and 'Pg_scenarios' must be arrays of shape (N, S).")
+        return False
+    if type(mismatch) is not float or type(max_coefficients) is not int:
+        print("Erroneous argument type.")
+        return False
+    if max_coefficients < 5:
+        print("'max_coefficients' must be equal or greater than five (5).")
+        return False
+    if pv_bus_model not in (1, 2):
+        print("'pv_bus_model' must be the integer 1 or 2.",)
+        return False
+    if DSB_model_method is not None and DSB_model_method not in (1, 2):
+        print("'DSB_model_method' must be the integer 1 or 2.",)
+        return False
+    if backend not in ('numpy', 'numba'):
+        print("'backend' must be the string 'numpy' or 'numba'.",)
+        return False
+    if continuation not in ('epsilon', 'pade'):
+        print("'continuation' must be the string 'epsilon' or 'pade'.",)
+        return False
+    if pade_solver not in ('dense', 'levinson'):
+        print("'pade_solver' must be the string 'dense' or 'levinson'.",)
+        return False
+    if type(max_update_rank) is not int or max_update_rank < 0:
+        print("'max_update_rank' must be a non-negative integer.",)
+        return False
+    if ordering not in ('colamd', 'mmd', 'rcm', None):
+        print("'ordering' must be the string 'colamd', 'mmd' or 'rcm', or None.",)
+        return False
+    if linear_solver not in ('superlu', 'umfpack', 'dense', 'auto') and not hasattr(linear_solver, 'factorize'):
+        print("'linear_solver' must be the string 'superlu', 'umfpack', 'dense' or 'auto', or a solver object.",)
+        return False
+    return True
+
+
+@print_details('detailed_run_print')
+def helm_batch(case, P_scenarios, Q_scenarios, Pg_scenarios=None, detailed_run_print=False, mismatch=1e-4,
+               max_coefficients=100, enforce_Q_limits=True, pv_bus_model=2, DSB_model=False,
+               DSB_model_method=None, K_factors=None, backend='numba', continuation='epsilon', pade_solver='dense',
+               max_update_rank=50, ordering='colamd', linear_solver='superlu') -> BatchResults:
+    """
+    Solve S load/generation scenarios of case with HELM.
+
+    P_scenarios and Q_scenarios are the active and reactive power demanded at every bus
+    in each scenario, and Pg_scenarios the active power generated (default case.Pg), all
+    of them (N, S) arrays in p.u. like case.Pd. The other arguments are those of helm.
+    The voltages are continued as in helm, with a running epsilon table of all the buses
+    and scenarios (continuation='epsilon') or the matrix Padé method ('pade').
+
+    Scenarios are grouped by bus types and K factors and each group shares one
+    factorization. The groups after the first one solve with low rank corrections of
+    it, up to max_update_rank. With DSB_model the K factors depend on the generation
+    of every scenario, pass K_factors to share the factorization among them.
+
+    Returns a BatchResults object: V_complex_profile, Qg, Buses_type (N, S),
+    series_large, flag_divergence (S,) and list_coef per scenario.
+    """
+    if not validate_arguments(case, P_scenarios, Q_scenarios, Pg_scenarios, mismatch, max_coefficients,
+                              pv_bus_model, DSB_model_method, backend, continuation, pade_solver, max_update_rank,
+                              ordering, linear_solver):
+        raise ValueError('Arguments were wrong.')
+
+    if DSB_model and DSB_model_method is None:
+        DSB_model_method = 2
+
+    if Pg_scenarios is None:
+        Pg_scenarios = np.repeat(case.Pg[:, np.newaxis], np.shape(P_scenarios)[1], axis=1)
+    results = BatchResults(case, P_scenarios, Q_scenarios, Pg_scenarios, DSB_model_method)
+    # Convolution kernels of the recursion. 'numba' falls back to 'numpy' if numba is missing
+    kernels = Kernels(backend)
+
+    scenarios = np.arange(results.S)
+    base_Ytrans_mod = base_solve = bus_order = None
+    while len(scenarios):
+        if DSB_model_method is not None:
+            compute_k_factors(scenarios, DSB_model, K_factors, case, results)
+        # Scenarios whose bus types or K factors differ are solved in different groups. The
+        # restarts of all the groups are grouped again in the next round
+        restart = []
+        for group in split_scenarios(scenarios, results):
+            logger.debug('Solving a group of %d scenarios', len(group))
+            run = BatchRunVariables(case, results, group, pv_bus_model, DSB_model_method, max_coefficients)
+            run.base_Ytrans_mod, run.base_solve = base_Ytrans_mod, base_solve
+            run.max_update_rank = max_update_rank
+            run.ordering = ordering
+            run.bus_order = bus_order
+            run.linear_solver = linear_solver
+            run.kernels = kernels
+            modif_Ytrans(DSB_model_method, pv_bus_model, case, run)
+            base_Ytrans_mod, base_solve, bus_order = run.base_Ytrans_mod, run.base_solve, run.bus_order
+            Unknowns_soluc(DSB_model_method, pv_bus_model, case.N, run)
+            restart.append(computing_voltages_mismatch(mismatch, max_coefficients, enforce_Q_limits, pv_bus_model,
+                                                       continuation, pade_solver, case, run, results))
+        scenarios = np.concatenate(restart)
+
+    return results
@@ -0,0 +1,202 @@
+"""
+Convolution kernels of the HELM recursion and the Levinson-Trench recursion of the
+Padé systems.
+
+Two backends are available: 'numpy' and 'numba'. The numba kernels are compiled
+in nopython mode, release the GIL and are cached on disk. If numba is not
+installed, the numpy backend is used instead.
+
+The arrays of coefficients are (rows, n) or, in helm_batch, (rows, n, S) with the
+scenarios in a trailing axis. Results then have that axis too, e.g. (len(buses), S).
+"""
+
+import numpy as np
+
+
+
+#---------------------------------------------------------------------------------------
+# NumPy kernels
+def inverse_voltages_numpy(W, V_complex, n):
+    """Coefficient n of the inverse voltages W of every bus.
+
+    W[i][n] = -sum(W[i][k]*V_complex[i][n-k]) for k in 0..n-1
+    """
+    W[:, n] = -np.sum(W[:, :n] * V_complex[:, n:0:-1], axis=1)
+
+
+def self_convolution_numpy(V_complex, buses, n):
+    """Real part of sum(V_complex[i][k]*conj(V_complex[i][n-k])) for k in 1..n-1 and i in buses"""
+    if n < 2:
+        return np.zeros((len(buses),) + V_complex.shape[2:], dtype=np.float64)
+    return np.sum(V_complex[buses, 1:n] * np.conj(V_complex[buses, n-1:0:-1]), axis=1).real
+
+
+def conj_convolution_numpy(A, rows_A, B, rows_B, n):
+    """sum(conj(A[a][n-x])*B[b][x]) for x in 1..n-1 and every pair (a, b) of rows_A and rows_B"""
+    return np.sum(np.conj(A[rows_A, n-1:0:-1]) * B[rows_B, 1:n], axis=1)
+
+
+def levinson_numpy(t, rhs):
+    """Levinson-Trench recursion of the Toeplitz systems T_i x_i = rhs[i], T_i[r][c] = t[i][L-1+r-c].
+
+    Each step m grows the forward (T f = e_1), backward (T b = e_m) and solution vectors 
+    of the leading m x m submatrices, O(L^2) per system. There is no pivoting: a singular
+    leading submatrix gives non-finite values in its row.
+    Returns the solutions, forward and backward vectors.
+    """
+    n_rows, L = rhs.shape
+    forward = np.zeros((n_rows, L), dtype=np.complex128)
+    backward = np.zeros((n_rows, L), dtype=np.complex128)
+    solution = np.zeros((n_rows, L), dtype=np.complex128)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        forward[:, 0] = backward[:, 0] = 1/t[:, L-1]
+        solution[:, 0] = rhs[:, 0]*forward[:, 0]
+        for m in range(1, L):
+            # Last row (t[m], ..., t[1]) and first row (t[-1], ..., t[-m]) of the new submatrix
+            last_row = t[:, L-1+m:L-1:-1]
+            first_row = t[:, L-2::-1][:, :m]
+            error_f = np.sum(last_row * forward[:, :m], axis=1)
+            error_b = np.sum(first_row * backward[:, :m], axis=1)
+            error_x = np.sum(last_row * solution[:, :m], axis=1)
+            scale = (1/(1 - error_f*error_b))[:, np.newaxis]
+            f_prev = forward[:, :m].copy()
+            b_prev = backward[:, :m].copy()
+            forward[:, :m+1] = 0
+            forward[:, :m] = f_prev
+            forward[:, 1:m+1] -= error_f[:, np.newaxis]*b_prev
+            forward[:, :m+1] *= scale
+            backward[:, :m+1] = 0
+            backward[:, 1:m+1] = b_prev
+            backward[:, :m] -= error_b[:, np.newaxis]*f_prev
+            backward[:, :m+1] *= scale
+            solution[:, :m+1] += (rhs[:, m] - error_x)[:, np.newaxis]*backward[:, :m+1]
+    return solution, forward, backward
+
+
+#---------------------------------------------------------------------------------------
+# Numba kernels. numba is imported and the kernels are defined on the first use of the
+# backend, so importing helmpy does not import numba. Compiled kernels are cached on disk
+_numba_kernels = {}
+
+def numba_kernels():
+    """The numba kernels {name: function}, empty if numba is not installed"""
+    if 'loaded' in _numba_kernels:
+        return _numba_kernels['loaded']
+    try:
+        import numba
+    except ImportError:
+        _numba_kernels['loaded'] = {}
+        return _numba_kernels['loaded']
+
+    @numba.njit(nogil=True, cache=True)
+    def inverse_voltages_numba(W, V_complex, n):
+        for i in range(W.shape[0]):
+            aux = 0j
+            for k in range(n):
+                aux += W[i, k] * V_complex[i, n-k]
+            W[i, n] = -aux
+
+    @numba.njit(nogil=True, cache=True)
+    def self_convolution_numba(V_complex, buses, n):
+        result = np.zeros(len(buses), dtype=np.float64)
+        for pos in range(len(buses)):
+            i = buses[pos]
+            aux = 0.0
+            for k in range(1, n):
+                aux += (V_complex[i, k] * np.conj(V_complex[i, n-k])).real
+            result[pos] = aux
+        return result
+
+    @numba.njit(nogil=True, cache=True)
+    def conj_convolution_numba(A, rows_A, B, rows_B, n):
+        result = np.zeros(len(rows_A), dtype=np.complex128)
+        for pos in range(len(rows_A)):
+            a = rows_A[pos]
+            b = rows_B[pos]
+            aux = 0j
+            for x in range(1, n):
+                aux += np.conj(A[a, n-x]) * B[b, x]
+            result[pos] = aux
+        return result
+
+    @numba.njit(nogil=True, cache=True, error_model='numpy')
+    def levinson_numba(t, rhs):
+        n_rows, L = rhs.shape
+        forward = np.zeros((n_rows, L), dtype=np.complex128)
+        backward = np.zeros((n_rows, L), dtype=np.complex128)
+        solution = np.zeros((n_rows, L), dtype=np.complex128)
+        f_prev = np.empty(L, dtype=np.complex128)
+        b_prev = np.empty(L, dtype=np.complex128)
+        for i in range(n_rows):
+            # Complex division by zero raises in numba. A singular leading submatrix
+            # gives non-finite values in its row, as in levinson_numpy
+            if t[i, L-1] == 0:
+                solution[i, :] = np.nan
+                continue
+            forward[i, 0] = 1/t[i, L-1]
+            backward[i, 0] = forward[i, 0]
+            solution[i, 0] = rhs[i, 0]*forward[i, 0]
+            for m in range(1, L):
+                error_f = 0j
+                error_b = 0j
+                error_x = 0j
+                for j in range(m):
+                    error_f += t[i, L-1+m-j]*forward[i, j]
+                    error_b += t[i, L-2-j]*backward[i, j]
+                    error_x += t[i, L-1+m-j]*solution[i, j]
+                    f_prev[j] = forward[i, j]
+                    b_prev[j] = backward[i, j]
+                if error_f*error_b == 1:
+                    solution[i, :] = np.nan
+                    break
+                scale = 1/(1 - error_f*error_b)
+                forward[i, 0] = f_prev[0]*scale
+                backward[i, 0] = -error_b*f_prev[0]*scale
+                for j in range(1, m):
+                    forward[i, j] = (f_prev[j] - error_f*b_prev[j-1])*scale
+                    backward[i, j] = (b_prev[j-1] - error_b*f_prev[j])*scale
+                forward[i, m] = -error_f*b_prev[m-1]*scale
+                backward[i, m] = b_prev[m-1]*scale
+                error_x = rhs[i, m] - error_x
+                for j in range(m+1):
+                    solution[i, j] += error_x*backward[i, j]
+        return solution, forward, backward
+
+    _numba_kernels['loaded'] = dict(inverse_voltages=inverse_voltages_numba, self_convolution=self_convolution_numba,
+                                    conj_convolution=conj_convolution_numba, levinson=levinson_numba)
+    return _numba_kernels['loaded']
+
+
+def over_scenarios(kernel):
+    """kernel of (rows, n) arrays also for (rows, n, S) arrays, called once per scenario"""
+    def kernel_over_scenarios(*args):
+        if args[0].ndim == 2:
+            return kernel(*args)
+        results = [
+            kernel(*(arg[..., s] if isinstance(arg, np.ndarray) and arg.ndim == 3 else arg for arg in args))
+            for s in range(args[0].shape[2])
+        ]
+        if results[0] is not None:
+            return np.stack(results, axis=-1)
+    return kernel_over_scenarios
+
+
+class Kernels:
+    """Group of kernels of one backend ('numpy' or 'numba')."""
+    def __init__(self, backend='numba'):
+        # Fall back to NumPy when numba is not installed
+        kernels = numba_kernels() if backend == 'numba' else {}
+        if not kernels:
+            backend = 'numpy'
+        self.backend = backend
+
+        if backend == 'numba':
+            self.inverse_voltages = over_scenarios(kernels['inverse_voltages'])
+            self.self_convolution = over_scenarios(kernels['self_convolution'])
+            self.conj_convolution = over_scenarios(kernels['conj_convolution'])
+            self.levinson = kernels['levinson']
+        else: # backend == 'numpy'
+            self.inverse_voltages = inverse_voltages_numpy
+            self.self_convolution = self_convolution_numpy
+            self.conj_convolution = conj_convolution_numpy
+            self.levinson = levinson_numpy
@@ -0,0 +1,204 @@
+"""
+HELMpy, open source package of power flow solvers developed on Python 3
+Copyright (C) 2019 Tulio Molina tuliojose8@gmail.com and Juan José Ortega juanjoseop10@gmail.com
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Linear solver backends of the HELM and NR systems.
+
+A backend factorizes a matrix once (factorize) and the factorization solves one
+(solve) or several (solve_many) right hand sides. Backends:
+    'superlu': SuperLU of SciPy, with a tunable column ordering (permc_spec).
+    'umfpack': UMFPACK, if scikit-umfpack is installed.
+    'dense': LAPACK LU of the dense matrix, for small cases.
+    'auto': the fastest of them for the size of the system on this machine,
+            measured with benchmark_linear_solvers.
+"""
+
+import time
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import coo_matrix, csc_matrix, issparse
+from scipy.sparse.linalg import splu
+
+try:
+    import scikits.umfpack as umfpack
+except ImportError:
+    umfpack = None
+
+
+class Factorization:
+    """Factors of a matrix. solve works with (n,) and (n, k) right hand sides"""
+    def __init__(self, solve, fill_ratio):
+        self.solve = solve
+        # nnz(L+U)/nnz(matrix)
+        self.fill_ratio = fill_ratio
+
+    def solve_many(self, B):
+        """Solutions of the columns of B, (n, k)"""
+        return self.solve(np.asarray(B))
+
+
+class SuperLUSolver:
+    """SuperLU. permc_spec is the column ordering of SuperLU when no index is given"""
+    name = 'superlu'
+
+    def __init__(self, permc_spec='COLAMD', diag_pivot_thresh=None):
+        self.permc_spec = permc_spec
+        self.diag_pivot_thresh = diag_pivot_thresh
+
+    def factorize(self, matrix, index=None):
+        """
+        Factorization of matrix. With index, rows and columns are permuted symmetrically
+        to that order, which SuperLU keeps (NATURAL column ordering), and solutions are
+        mapped back.
+        """
+        matrix = csc_matrix(matrix)
+        if index is None:
+            lu = splu(matrix, permc_spec=self.permc_spec, diag_pivot_thresh=self.diag_pivot_thresh)
+            solve = lu.solve
+        else:
+            lu = splu(matrix.tocsr()[index][:, index].tocsc(), permc_spec='NATURAL',
+                      diag_pivot_thresh=self.diag_pivot_thresh)
+
+            def solve(b):
+                x = np.empty_like(b)
+                x[index] = lu.solve(b[index])
+                return x
+        return Factorization(solve, (lu.L.nnz + lu.U.nnz)/matrix.nnz)
+
+
+class UmfpackSolver:
+    """UMFPACK of scikit-umfpack. It uses its own ordering, index is ignored"""
+    name = 'umfpack'
+
+    def __init__(self):
+        if umfpack is None:
+            raise ImportError("scikit-umfpack is not installed.")
+
+    def factorize(self, matrix, index=None):
+        matrix = csc_matrix(matrix)
+        lu = umfpack.splu(matrix)
+
+        def solve(b):
+            if b.ndim == 1:
+                return lu.solve(b)
+            return np.column_stack([lu.solve(b[:, k]) for k in range(b.shape[1])])
+        return Factorization(solve, (lu.L.nnz + lu.U.nnz)/matrix.nnz)
+
+
+class DenseSolver:
+    """LU with partial pivoting of LAPACK on the dense matrix. index is ignored"""
+    name = 'dense'
+
+    def factorize(self, matrix, index=None):
+        dense = matrix.toarray() if issparse(matrix) else np.asarray(matrix)
+        nnz = matrix.nnz if issparse(matrix) else np.count_nonzero(dense)
+        factors = lu_factor(dense, check_finite=False)
+
+        def solve(b):
+            return lu_solve(factors, b, check_finite=False)
+        return Factorization(solve, dense.size/nnz)
+
+
+def available_linear_solvers():
+    """Names of the backends that can be used on this machine"""
+    names = ['superlu', 'dense']
+    if umfpack is not None:
+        names.insert(1, 'umfpack')
+    return names
+
+def grid_like_matrix(N, seed=0):
+    """
+    (2N, 2N) matrix with the structure of Ytrans_mod: 2x2 blocks on a random meshed
+    graph of N buses with ~1.5 branches per bus, diagonally dominant.
+    """
+    rng = np.random.default_rng(seed)
+    # A spanning tree and extra branches, both between buses close in number like in
+    # real grids, so the fill of the factorization is that of a nearly planar graph
+    extra = rng.integers(0, N, N//2)
+    from_bus = np.concatenate((np.arange(1, N), extra))
+    to_bus = np.concatenate((np.maximum(np.arange(1, N) - rng.integers(1, 10, N-1), 0),
+                             np.minimum(extra + rng.integers(1, 20, N//2), N-1)))
+    keep = from_bus != to_bus
+    from_bus, to_bus = from_bus[keep], to_bus[keep]
+    y = rng.uniform(1, 10, len(from_bus)) * np.exp(-1j*rng.uniform(1.2, 1.5, len(from_bus)))
+    rows = np.concatenate((from_bus, to_bus, from_bus, to_bus))
+    cols = np.concatenate((to_bus, from_bus, from_bus, to_bus))
+    data = np.concatenate((-y, -y, 1.01*y, 1.01*y))
+    Y = coo_matrix((data, (rows, cols)), shape=(N, N)).tocsr().tocoo()
+    r, c, v = Y.row, Y.col, Y.data
+    return coo_matrix((np.concatenate((v.real, -v.imag, v.imag, v.real)),
+                       (np.concatenate((2*r, 2*r, 2*r + 1, 2*r + 1)),
+                        np.concatenate((2*c, 2*c + 1, 2*c, 2*c + 1)))), shape=(2*N, 2*N)).tocsc()
+
+def benchmark_linear_solvers(system, solves=50, repeats=3, solvers=None):
+    """
+    Time of every backend to factorize system and solve it solves times (about the
+    number of coefficients of a helm run). system is a sparse matrix or a number of
+    buses N for a grid_like_matrix. The best of repeats runs is kept.
+    Returns a dict name: seconds, fastest first.
+    """
+    matrix = grid_like_matrix(system) if np.isscalar(system) else csc_matrix(system)
+    b = np.ones(matrix.shape[0])
+    times = dict()
+    for name in (solvers or available_linear_solvers()):
+        solver = get_linear_solver(name)
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            factorization = solver.factorize(matrix)
+            for _ in range(solves):
+                factorization.solve(b)
+            best = min(best, time.perf_counter() - start)
+        times[name] = best
+    return dict(sorted(times.items(), key=lambda item: item[1]))
+
+# Fastest backend per system size (rounded to a power of 2) measured on this machine
+_fastest = dict()
+# Larger systems are not benchmarked with the dense backend, its O(n^3) LU never wins there
+DENSE_MAX_LENGTH = 1024
+
+def select_linear_solver(length):
+    """Fastest backend for systems of length rows, measured once per size class"""
+    size = 2**int(np.ceil(np.log2(max(length, 2))))
+    if size not in _fastest:
+        times = benchmark_linear_solvers(max(size//2, 1), solvers=[
+            name for name in available_linear_solvers() if name != 'dense' or size <= DENSE_MAX_LENGTH])
+        _fastest[size] = next(iter(times))
+    return _fastest[size]
+
+def get_linear_solver(linear_solver, length=None):
+    """
+    Backend object from its name ('superlu', 'umfpack', 'dense' or 'auto' with the
+    length of the systems). Objects with a factorize method are returned as they are.
+    """
+    if hasattr(linear_solver, 'factorize'):
+        return linear_solver
+    if linear_solver == 'auto':
+        linear_solver = select_linear_solver(length)
+    if linear_solver == 'superlu':
+        return SuperLUSolver()
+    if linear_solver == 'umfpack':
+        return UmfpackSolver()
+    if linear_solver == 'dense':
+        return DenseSolver()
+    raise ValueError("'linear_solver' must be 'superlu', 'umfpack', 'dense', 'auto' or a solver object.")
+
+
+if __name__ == '__main__':
+    # Time of every backend for a range of case sizes on this machine
+    names = available_linear_solvers()
+    print("   Buses    " + "".join("%12s"%name for name in names))
+    for N in (10, 100, 300, 1000, 3000, 10000):
+        times = benchmark_linear_solvers(N, solvers=[
+            name for name in names if name != 'dense' or 2*N <= 4*DENSE_MAX_LENGTH])
+        print("%8d    "%N + "".join("%10.2fms"%(1e3*times[name]) if name in times else "%12s"%"-"
+                                    for name in names))
@@ -0,0 +1,121 @@
+"""
+HELMpy, open source package of power flow solvers developed on Python 3
+Copyright (C) 2019 Tulio Molina tuliojose8@gmail.com and Juan José Ortega juanjoseop10@gmail.com
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+Logging of the runs.
+
+Every module logs on a child of the 'helmpy' logger, which is quiet unless the
+application configures logging. Levels:
+    DEBUG    details of the run: coefficients, iterations, factorizations, bus type
+             switches, voltage profile and power balance.
+    INFO     events of the run: convergence, restarts after PVLIM to PQ switches and
+             results written on files.
+    WARNING  divergence.
+Records of events carry the attribute 'event' ('converged', 'diverged', 'bus_type_switch',
+'restart', ...) and the data of the event ('algorithm', 'coefficients', 'iterations',
+'bus', ...), for machine readable logs.
+
+detailed_run_print=True (Print_Details=True in nr, nr_ds and fdlf) prints the records of the
+run on stdout, as the solvers did before they logged. Only the records of the calling thread
+(or task) are printed and the levels of the loggers are not changed, so concurrent runs and
+the handlers of the application are not affected.
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import sys
+
+
+logger = logging.getLogger('helmpy')
+logger.addHandler(logging.NullHandler())
+
+# stdout of the run that prints its details in this thread or task, if any. Runs inside
+# it (helm in pv_curve) print on it too
+_console = contextvars.ContextVar('helmpy_console', default=None)
+
+
+class ConsoleHandler(logging.Handler):
+    """
+    Handler of the 'helmpy' logger that prints the records of the runs that print their
+    details (see print_details) on their stdout. The records of other threads or tasks
+    are filtered out.
+    """
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.addFilter(lambda record: _console.get() is not None)
+
+    def emit(self, record):
+        try:
+            stream = _console.get()
+            stream.write(self.format(record) + '\n')
+            stream.flush()
+        except Exception:
+            self.handleError(record)
+
+_console_handler = ConsoleHandler()
+logger.addHandler(_console_handler)
+
+
+class RunLogger(logging.LoggerAdapter):
+    """
+    Logger of a helmpy module. The records of the levels enabled for the logger are logged
+    as usual. Inside a run that prints its details, the records of the levels below are
+    only given to the console handler, so the handlers of the application do not get them.
+    """
+    def __init__(self, log):
+        super().__init__(log, None)
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(level):
+            # Records the caller of the adapter
+            kwargs.setdefault('stacklevel', 2)
+            self.logger.log(level, msg, *args, **kwargs)
+        elif _console.get() is not None:
+            _console_handler.handle(self.logger.makeRecord(self.logger.name, level, '(unknown file)', 0, msg, args,
+                                                           None, extra=kwargs.get('extra')))
+
+def get_logger(name):
+    """Logger of the helmpy module name (RunLogger)"""
+    return RunLogger(logging.getLogger(name))
+
+
+def log_event(log, level, event, msg, *args, **data):
+    """Log msg % args on log (RunLogger) with the attribute event and the data of the event"""
+    log.log(level, msg, *args, extra=dict(event=event, **data), stacklevel=3)
+
+def details_enabled(log):
+    """Whether the DEBUG records of log are handled, to skip the work of the details otherwise"""
+    return log.isEnabledFor(logging.DEBUG) or _console.get() is not None
+
+def print_details(argument='detailed_run_print'):
+    """
+    Decorator of the solvers. While the decorated function runs with argument=True,
+    the records of the helmpy loggers from DEBUG up emitted by its thread or task are
+    printed on stdout.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _console.get() is not None or \
+               signature.bind_partial(*args, **kwargs).arguments.get(argument) is not True:
+                return function(*args, **kwargs)
+            token = _console.set(sys.stdout)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _console.reset(token)
+        return wrapper
+    return decorator
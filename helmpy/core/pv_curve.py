@@ -0,0 +1,392 @@
+"""
+HELMpy, open source package of power flow solvers developed on Python 3
+Copyright (C) 2019 Tulio Molina tuliojose8@gmail.com and Juan José Ortega juanjoseop10@gmail.com
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+PV-curves from power series in the loading.
+
+The voltages of helm are a series in an embedding parameter that also scales the
+slack and PV voltages and the shunts, so they are only a power flow solution at s=1.
+Here a solved operating point at loading scale0 is the germ of a second series,
+V(t), where only the loading is embedded: loads and generation are
+scale0 + t times those of the case, as case.set_scale does. Its coefficients come
+from one factorization of the power flow equations linearized at the germ. The
+Padé approximants of V(t) give the voltages on a grid of loading values. The power
+flow is only solved again where a PV bus reaches its Qgen limit (the bus types
+change) or where the approximants stop satisfying the power flow equations.
+
+The maximum loading is a square root branch point of the voltages on the positive
+real axis. collapse_point estimates it from the singularities of the Padé
+approximants of the voltage series of helm.
+"""
+
+import logging
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from helmpy.core.classes import PVCurve, CollapsePoint, BUS_PQ, BUS_PV, BUS_SLACK
+from helmpy.core.helm import helm, factorize, bus_ordering, block_index
+from helmpy.core.analytic_continuation import pade_rational, pade_evaluate, pade_poles_zeros, \
+    quadratic_pade_branch_points
+from helmpy.core.logs import log_event, print_details, get_logger
+
+logger = get_logger(__name__)
+
+
+def bus_type_codes(Buses_type):
+    """Integer type code of every bus"""
+    code = np.full(len(Buses_type), BUS_PQ, dtype=np.int8)
+    code[(Buses_type == 'PV') | (Buses_type == 'PVLIM')] = BUS_PV
+    code[Buses_type == 'Slack'] = BUS_SLACK
+    return code
+
+def loading_series_matrix(V0, bus_type_code, case):
+    """Matrix of the loading series equations linearized at the germ V0.
+
+    Unknowns are the real and imaginary parts of V[n] of every bus (2N). PQ buses:
+    V0*conj(Y V[n]) + V[n]*conj(Y V0) (both parts). PV buses: real part of the same
+    and 2*Re(conj(V0)*V[n]). Slack: V[n].
+    """
+    N = case.N
+    Y = case.Y.tocoo()
+    I0 = case.Y @ V0
+    r, c = Y.row, Y.col
+    is_pq = bus_type_code == BUS_PQ
+    is_pv = bus_type_code == BUS_PV
+    buses = np.arange(N)
+
+    # alpha*conj(V[n][c]) and beta*V[n][i] terms of the complex power of every bus
+    alpha = V0[r] * np.conj(Y.data)
+    beta = np.conj(I0)
+    power = ~is_pq[r] & ~is_pv[r]
+    alpha = alpha[~power]
+    r, c = r[~power], c[~power]
+    real_rows = np.concatenate((r, r, buses, buses))
+    real_cols = np.concatenate((2*c, 2*c + 1, 2*buses, 2*buses + 1))
+    real_vals = np.concatenate((alpha.real, alpha.imag, beta.real, -beta.imag))
+    keep = ~(bus_type_code[real_rows] == BUS_SLACK)
+    rows = [2*real_rows[keep]]
+    cols = [real_cols[keep]]
+    vals = [real_vals[keep]]
+
+    # Imaginary part of the complex power of PQ buses
+    q = is_pq[r]
+    pq = np.flatnonzero(is_pq)
+    rows += [2*r[q] + 1, 2*r[q] + 1, 2*pq + 1, 2*pq + 1]
+    cols += [2*c[q], 2*c[q] + 1, 2*pq, 2*pq + 1]
+    vals += [alpha[q].imag, -alpha[q].real, beta[pq].imag, beta[pq].real]
+
+    # Voltage magnitude of PV buses
+    pv = np.flatnonzero(is_pv)
+    rows += [2*pv + 1, 2*pv + 1]
+    cols += [2*pv, 2*pv + 1]
+    vals += [2*V0[pv].real, 2*V0[pv].imag]
+
+    # Slack
+    slack = np.flatnonzero(bus_type_code == BUS_SLACK)
+    rows += [2*slack, 2*slack + 1]
+    cols += [2*slack, 2*slack + 1]
+    vals += [np.ones(len(slack)), np.ones(len(slack))]
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    vals = np.concatenate(vals)
+    return coo_matrix((vals, (rows, cols)), shape=(2*N, 2*N)).tocsc()
+
+def loading_series(V0, dS, bus_type_code, max_coef, case):
+    """Coefficients of V(t), (N, max_coef), with the germ V0.
+
+    V(t)*conj(Y V(t)) = S0 + t*dS on PQ buses (real part on PV buses), |V(t)| = |V0| on
+    PV buses and V(t) = V0 on the slack.
+    """
+    N = case.N
+    Y = case.Y
+    pq = np.flatnonzero(bus_type_code == BUS_PQ)
+    pv = np.flatnonzero(bus_type_code == BUS_PV)
+
+    solve = factorize(loading_series_matrix(V0, bus_type_code, case), block_index(bus_ordering(case), 2*N))[0]
+
+    V = np.zeros((N, max_coef), dtype=np.complex128)
+    I = np.zeros((N, max_coef), dtype=np.complex128)
+    V[:, 0] = V0
+    I[:, 0] = Y @ V0
+    right_hand_side = np.zeros(2*N, dtype=np.float64)
+    for n in range(1, max_coef):
+        # Products of the coefficients 1..n-1
+        CC = -np.sum(V[:, 1:n] * np.conj(I[:, n-1:0:-1]), axis=1)
+        if n == 1:
+            CC += dS
+        VV = -np.sum(V[pv, 1:n] * np.conj(V[pv, n-1:0:-1]), axis=1).real
+        right_hand_side[2*pq] = CC[pq].real
+        right_hand_side[2*pq + 1] = CC[pq].imag
+        right_hand_side[2*pv] = CC[pv].real
+        right_hand_side[2*pv + 1] = VV
+
+        x = solve(right_hand_side)
+        V[:, n] = x[0::2] + 1j*x[1::2]
+        I[:, n] = Y @ V[:, n]
+    return V
+
+def power_flow_mismatch(V, scale, Qg, bus_type_code, case):
+    """Largest mismatch of the power flow equations of the voltages V at loading scale"""
+    S = V * np.conj(case.Y @ V)
+    S_specified = scale*(case.Pg - case.Pd) + 1j*(Qg - scale*case.Qd)
+    is_pq = bus_type_code == BUS_PQ
+    is_pv = bus_type_code == BUS_PV
+    is_slack = bus_type_code == BUS_SLACK
+    return max(np.max(np.abs(S[is_pq] - S_specified[is_pq]), initial=0),
+               np.max(np.abs(S[is_pv].real - S_specified[is_pv].real), initial=0),
+               np.max(np.abs(np.abs(V[is_pv]) - case.V[is_pv]), initial=0),
+               np.max(np.abs(V[is_slack] - case.V[is_slack]), initial=0))
+
+def bus_types_change(V, scale, Qg, bus_type_code, switched, case):
+    """Whether a PV bus exceeds its Qgen limits or a generator switched to PQ must be PV again.
+
+    A switched generator at its Qgmin (Qgmax) is PV again if its voltage magnitude is
+    below (above) the specified one.
+    """
+    gen = bus_type_code == BUS_PV
+    Qg_incog = np.imag(V[gen] * np.conj(case.Y[gen] @ V)) + scale*case.Qd[gen]
+    if np.any((Qg_incog > case.Qgmax[gen]) | (Qg_incog < case.Qgmin[gen])):
+        return True
+    V_magnitude = np.abs(V[switched])
+    return np.any(((Qg[switched] <= case.Qgmin[switched]) & (V_magnitude < case.V[switched])) |
+                  ((Qg[switched] >= case.Qgmax[switched]) & (V_magnitude > case.V[switched])))
+
+@print_details('detailed_run_print')
+def pv_curve(case, scales, detailed_run_print=False, mismatch=1e-8, max_coefficients=100,
+             enforce_Q_limits=True, pv_bus_model=2, series_coefficients=41, tolerance=1e-6,
+             pade_solver='dense') -> PVCurve:
+    """
+    Voltages of case on a grid of increasing loading values (scales).
+
+    helm is run (with mismatch, max_coefficients, enforce_Q_limits and pv_bus_model)
+    at scales[0], and then only where the Padé approximants of the loading series
+    (series_coefficients coefficients) have a power flow mismatch above tolerance, or
+    where the bus types change (see bus_types_change). When helm diverges, the rest of
+    the curve is left as NaN and PVCurve.collapse brackets the maximum loading.
+    Classic slack bus model only.
+    """
+    scales = np.asarray(scales, dtype=np.float64)
+    if np.ndim(scales) != 1 or len(scales) == 0 or np.any(np.diff(scales) <= 0):
+        raise ValueError("'scales' must be an increasing 1-D array.")
+    if series_coefficients < 3:
+        raise ValueError("'series_coefficients' must be equal or greater than three (3).")
+
+    curve = PVCurve(case, scales)
+    dS = case.Pg - case.Pd - 1j*case.Qd
+    M = len(scales)
+
+    k = 0
+    while k < M:
+        # Solve the power flow at scales[k]. It is the germ of the loading series
+        run, _, flag_divergence = helm(case, mismatch=mismatch, scale=float(scales[k]),
+                                       max_coefficients=max_coefficients, enforce_Q_limits=enforce_Q_limits,
+                                       pv_bus_model=pv_bus_model, continuation='pade', pade_solver=pade_solver)
+        if flag_divergence:
+            if k > 0:
+                curve.collapse = (scales[k-1], scales[k])
+            log_event(logger, logging.INFO, 'pv_curve_end', 'No solution at scale %f. The PV-curve ends', scales[k],
+                      scale=float(scales[k]))
+            break
+        V0 = run.V_complex_profile.copy()
+        bus_type_code = bus_type_codes(run.Buses_type)
+        Qg = np.where(bus_type_code == BUS_PQ, run.Qg, 0)
+        # Generators switched to PQ by helm
+        switched = (bus_type_code == BUS_PQ) & (bus_type_codes(case.Buses_type) == BUS_PV)
+        curve.V_complex[:, k] = V0
+        curve.Buses_type[:, k] = run.Buses_type
+        curve.solved[k] = True
+
+        # Padé approximants of the loading series on the next loading values
+        series = loading_series(V0, dS, bus_type_code, series_coefficients, case)
+        a, b = pade_rational(series, series_coefficients, pade_solver)
+        V_grid = pade_evaluate(a, b, scales[k+1:] - scales[k])
+
+        j = k + 1
+        while j < M:
+            V = V_grid[:, j-k-1]
+            if not np.all(np.isfinite(V)) or \
+               power_flow_mismatch(V, scales[j], Qg, bus_type_code, case) > tolerance:
+                logger.debug('The loading series is not accurate at scale %f', scales[j])
+                break
+            if enforce_Q_limits and \
+               bus_types_change(V, scales[j], Qg, bus_type_code, switched, case):
+                logger.debug('The bus types change at scale %f', scales[j])
+                break
+            curve.V_complex[:, j] = V
+            curve.Buses_type[:, j] = run.Buses_type
+            j += 1
+        k = j
+
+    return curve
+
+def first_real_singularity(singularities, angle=0.05):
+    """Smallest real part of the singularities close to the positive real axis of every row"""
+    candidates = np.isfinite(singularities) & (singularities.real > 0) & \
+                 (np.abs(singularities.imag) < angle*np.abs(singularities))
+    return np.min(np.where(candidates, singularities.real, np.inf), axis=1)
+
+def collapse_bisection(case, low, high, collapse, rtol, max_solves, helm_arguments):
+    """Bisection with helm of the maximum loading between low (solved) and high (no solution).
+
+    The bracket is kept in collapse.bracket and its solved end in collapse.verified_scale.
+    """
+    while high - low > rtol*high and collapse.solves < max_solves:
+        middle = (low + high)/2
+        collapse.solves += 1
+        if helm(case, scale=float(middle), **helm_arguments)[2]:
+            high = middle
+        else:
+            low = middle
+    collapse.verified_scale = low
+    collapse.bracket = (low, high)
+
+def reactive_limit(a, b, t_collapse, scale, bus_type_code, case, points=100):
+    """Embedding value of the first Qgen limit of a PV bus along the approximants (a, b)
+    of helm between 1 and t_collapse, or NaN if none is reached.
+
+    The loading of the embedding value s is s*scale, so the Qgen of the PV buses is
+    the reactive power they inject plus s*scale times their demand.
+    """
+    gen = bus_type_code == BUS_PV
+    if not gen.any():
+        return np.nan
+
+    def exceeds(s):
+        V = pade_evaluate(a, b, s)
+        Qg_incog = np.imag(V[gen] * np.conj(case.Y[gen] @ V)) + np.outer(case.Qd[gen], s)*scale
+        return np.any((Qg_incog > case.Qgmax[gen, np.newaxis]) | (Qg_incog < case.Qgmin[gen, np.newaxis]), axis=0)
+
+    grid = np.linspace(1, t_collapse, points + 1)
+    change = np.flatnonzero(exceeds(grid))
+    if len(change) == 0:
+        return np.nan
+    if change[0] == 0:
+        return 1.0
+    # Bisection of the approximants between the last grid point and this one
+    low, high = grid[change[0]-1], grid[change[0]]
+    while high - low > 1e-6*high:
+        middle = (low + high)/2
+        if exceeds(np.array([middle]))[0]:
+            high = middle
+        else:
+            low = middle
+    return high
+
+@print_details('detailed_run_print')
+def collapse_point(case, scale=1, detailed_run_print=False, mismatch=1e-8, max_coefficients=100,
+                   enforce_Q_limits=True, pv_bus_model=2, n_weakest=10, rtol=1e-2, verify=False,
+                   bracket_rtol=1e-3, max_solves=30) -> CollapsePoint:
+    """
+    Estimate the maximum loading scale of case from the Padé approximants of one helm run
+    at scale.
+
+    The embedding parameter s of helm scales the loading, so a branch point s of the
+    voltages is at the loading s*scale. The poles and zeros of the Padé approximants of
+    the voltage series of every bus accumulate on a cut that starts at the collapse point.
+    The first one on the positive real axis is CollapsePoint.pade_branch_points. It is
+    refined with the branch points of quadratic Padé approximants of two orders of the
+    n_weakest buses, those whose voltage magnitude series have the largest high order
+    coefficients. The estimation is their median and the confidence is the fraction of
+    them within rtol of it. The embedding also scales the shunts and the specified
+    voltages, so the estimation is exact only at the collapse (s = 1), and is a bit
+    above the maximum loading far from it.
+
+    With enforce_Q_limits, CollapsePoint.limit_scale is the loading where a PV bus
+    reaches its Qgen limit along the approximants. If it is before the estimation, the
+    bus types change and the collapse may be limit induced.
+
+    With verify, the maximum loading is also located by bisection with helm, up to
+    max_solves power flows and a bracket of relative width bracket_rtol. It is reported in
+    CollapsePoint.verified_scale and CollapsePoint.bracket, the estimation is kept.
+    Classic slack bus model only.
+    """
+    base_scale = float(scale)
+    helm_arguments = dict(mismatch=mismatch, max_coefficients=max_coefficients, enforce_Q_limits=enforce_Q_limits,
+                          pv_bus_model=pv_bus_model, continuation='pade')
+    run, series_large, flag_divergence = helm(case, scale=base_scale, **helm_arguments)
+    if flag_divergence:
+        log_event(logger, logging.WARNING, 'diverged',
+                  'There is no solution at scale %f. The collapse point cannot be estimated', base_scale,
+                  algorithm='HELM', scale=base_scale)
+        return None
+    collapse = CollapsePoint(case, base_scale)
+    collapse.solves = 1
+
+    # Voltage series and Padé approximants of the run, in the embedding parameter s
+    series = run.V_complex[:, :series_large]
+    bus_type_code = bus_type_codes(run.Buses_type)
+    a, b = pade_rational(series, series_large)
+    poles, zeros = pade_poles_zeros(a, b)
+    branch_points = np.minimum(first_real_singularity(poles), first_real_singularity(zeros))
+    branch_points[bus_type_code == BUS_SLACK] = np.inf
+    collapse.pade_branch_points[:] = np.where(np.isfinite(branch_points), base_scale*branch_points, np.nan)
+
+    # Weakest buses. Coefficients of |V(s)|**2 decay as C[i]*n**(-3/2)/s**n
+    VV = np.sum(series * np.conj(series[:, ::-1]), axis=1).real
+    VV[bus_type_code == BUS_SLACK] = 0
+    weakest = np.argsort(-np.abs(VV))[:n_weakest]
+    collapse.weakest_buses = weakest
+
+    # Refine the branch point of the weakest buses with quadratic Padé approximants
+    m = (series_large - 2)//3
+    estimates = []
+    for i in weakest:
+        if not np.isfinite(branch_points[i]):
+            continue
+        # Series in s/branch_points[i], so the branch point is close to 1
+        radius = branch_points[i]
+        scaled = series[i] * radius**np.arange(series_large)
+        for order in (m, m-2):
+            if order < 1:
+                continue
+            roots = radius*quadratic_pade_branch_points(scaled, order)
+            roots = roots[(roots.real > 0) & (np.abs(roots.imag) < 0.05*np.abs(roots))]
+            if len(roots):
+                # The one closest to the cut of the Padé approximant
+                estimates.append(roots[np.argmin(np.abs(roots - branch_points[i]))].real)
+    if estimates:
+        estimates = np.array(estimates)
+        t_collapse = np.median(estimates)
+        collapse.scale = base_scale*t_collapse
+        collapse.confidence = np.mean(np.abs(estimates - t_collapse) <= rtol*t_collapse)
+        if enforce_Q_limits and t_collapse > 1:
+            collapse.limit_scale = base_scale*reactive_limit(a, b, t_collapse, base_scale, bus_type_code, case)
+        log_event(logger, logging.INFO, 'collapse_point',
+                  'Collapse point estimated at scale %f from scale %f. Confidence: %f',
+                  collapse.scale, base_scale, collapse.confidence,
+                  scale=collapse.scale, base_scale=base_scale, confidence=collapse.confidence)
+    else:
+        logger.debug('No branch point was found on the positive real axis')
+
+    if not verify:
+        return collapse
+
+    # Bisection with helm. It must have no solution at the upper end of the bracket
+    low = base_scale
+    high = base_scale*(1 + bracket_rtol)
+    if collapse.scale > high:
+        high = collapse.scale
+    while collapse.solves < max_solves:
+        collapse.solves += 1
+        if helm(case, scale=float(high), **helm_arguments)[2]:
+            collapse_bisection(case, low, high, collapse, bracket_rtol, max_solves, helm_arguments)
+            break
+        low, high = high, 2*high - base_scale
+    else:
+        collapse.verified_scale = low
+        collapse.bracket = (low, np.inf)
+    log_event(logger, logging.INFO, 'collapse_point_verified',
+              'Collapse point located by helm between scales %f and %f with %d power flows',
+              collapse.bracket[0], collapse.bracket[1], collapse.solves,
+              bracket=list(collapse.bracket), solves=collapse.solves)
+    return collapse
@@ -0,0 +1,189 @@
+"""
+Benchmark the kernels of HELM and NR on the cases of data/cases
+
+Every kernel is timed on its own, with the state of a converged run of the case:
+    process_branches, modif_Ytrans (assembly and factorization), factorization,
+    coefficient_step (one coefficient: right hand side, solve, V and W),
+    pade_batch, Pade and Epsilon (one bus), EpsilonTable, power_balance,
+    nr_jacobian (entries of the sparse NR Jacobian) and nr_mismatch (Convergence_Check).
+The time of a kernel is the median of several repeats of as many calls as fit in
+--min-time seconds.
+
+Results are saved as a JSON baseline (--save) and compared with one (--compare):
+kernels slower than the baseline by more than --threshold (relative) are reported
+as regressions and the script exits with status 1.
+
+    python benchmark_helmpy.py --cases case9,case118 --save baseline.json
+    python benchmark_helmpy.py --cases case9,case118 --compare baseline.json --threshold 0.2
+"""
+
+import argparse
+import contextlib
+import copy
+import importlib
+import io
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from paths import helmpy, HELMPY_PATH
+from helmpy.core.classes import RunVariables, NRRunVariables, process_branches
+from helmpy.core.linear_solvers import get_linear_solver
+from helmpy.core.helm import modif_Ytrans, factorize, block_index, bus_ordering, coefficient_step, power_balance
+from helmpy.core.analytic_continuation import Pade, Epsilon, EpsilonTable, pade_batch
+
+# helmpy.core re-exports the function nr, import the modules
+nr_module = importlib.import_module('helmpy.core.nr')
+
+
+CASES = ['case9', 'case118', 'case1354pegase', 'case2869pegase']
+
+
+def time_kernel(function, min_time=0.05, repeat=5):
+    """Median time (s) of one call of function, from repeat runs of as many calls as fit in min_time"""
+    function()
+    start = time.perf_counter()
+    function()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time/max(once, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start)/number)
+    return float(np.median(times))
+
+def helm_kernels(case):
+    """Kernels of HELM with the state of a converged helm run of case (pv_bus_model 2)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        run, series_large, _ = helmpy.helm(case, mismatch=1e-8)
+    N = case.N
+    n = min(10, series_large - 1)
+    Pi = run.Pg - case.Pd
+    Si = Pi + run.Qg*1j - case.Qd*1j
+    index = block_index(bus_ordering(case), run.length)
+
+    branches_case = copy.copy(case)
+    def branches():
+        branches_case.Yshunt = np.copy(case.Shunt)
+        branches_case.phase_barras = np.full(N, False)
+        branches_case.phase_dict = dict()
+        process_branches(case.branches_data, case.N_branches, branches_case)
+
+    modif_run = RunVariables(case, 2, False, None, 100)
+    def modif():
+        modif_run.base_Ytrans_mod = None
+        modif_Ytrans(None, 2, case, modif_run)
+
+    def epsilon_table():
+        table = EpsilonTable(N, series_large)
+        for k in range(series_large):
+            table.add(run.V_complex[:, k])
+        return table.value()
+
+    bus = int(np.argmin(np.abs(run.V_complex_profile)))
+    return {
+        'process_branches': branches,
+        'modif_Ytrans': modif,
+        'factorization': lambda: factorize(run.base_Ytrans_mod, index),
+        'coefficient_step': lambda: coefficient_step(n, Si, Pi, 2, case, run),
+        'pade_batch': lambda: pade_batch(run.V_complex, series_large, kernels=run.kernels),
+        'Pade': lambda: Pade(run.V_complex[bus], series_large),
+        'Epsilon': lambda: Epsilon(run.V_complex[bus], series_large),
+        'EpsilonTable': epsilon_table,
+        'power_balance': lambda: power_balance(True, 'HELM PV2', case, run),
+    }
+
+def nr_kernels(case):
+    """Kernels of NR with the state of a converged nr run of case (Q limits not enforced)"""
+    run = NRRunVariables(case.N, case.N_generators, case.N_branches, 1e-8)
+    nr_module.preprocess_case_data(case, run)
+    nr_module.Jacobian(run)
+    nr_module.Jacobian_Functions(run)
+    while not nr_module.Convergence_Check(run):
+        nr_module.Compute_Iterative_Jacobian_Entries(run)
+        run.deltas = get_linear_solver('superlu', run.dimension).factorize(run.Jaco).solve(run.deltas_P_Q)
+        nr_module.Actualizacion_Resultados(run)
+
+    def mismatch():
+        run.iterations = 0
+        nr_module.Convergence_Check(run)
+
+    return {
+        'nr_jacobian': lambda: nr_module.Compute_Iterative_Jacobian_Entries(run),
+        'nr_mismatch': mismatch,
+    }
+
+def run_benchmarks(cases, min_time, repeat):
+    """{case: {kernel: seconds}}"""
+    results = dict()
+    for name in cases:
+        case = helmpy.create_case_data_object_from_xlsx(str(HELMPY_PATH / 'data' / 'cases' / (name + '.xlsx')))
+        kernels = helm_kernels(case)
+        kernels.update(nr_kernels(case))
+        results[name] = dict()
+        for kernel, function in kernels.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name][kernel] = time_kernel(function, min_time, repeat)
+            print("%-16s %-18s %12.4f ms"%(name, kernel, 1e3*results[name][kernel]))
+    return results
+
+def machine():
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+
+def compare(results, baseline, threshold):
+    """Kernels slower than the baseline by more than threshold: [(case, kernel, ratio)]"""
+    regressions = []
+    print("\n%-16s %-18s %12s %12s %8s"%('Case', 'Kernel', 'Base (ms)', 'Now (ms)', 'Ratio'))
+    for name, kernels in results.items():
+        for kernel, seconds in kernels.items():
+            base = baseline.get(name, dict()).get(kernel)
+            if base is None:
+                continue
+            ratio = seconds/base
+            flag = ''
+            if ratio > 1 + threshold:
+                regressions.append((name, kernel, ratio))
+                flag = '  REGRESSION'
+            print("%-16s %-18s %12.4f %12.4f %8.2f%s"%(name, kernel, 1e3*base, 1e3*seconds, ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the kernels of HELM and NR.")
+    parser.add_argument('--cases', default=','.join(CASES), help="Comma separated cases of data/cases")
+    parser.add_argument('--save', help="Write the results as a JSON baseline to this file")
+    parser.add_argument('--compare', help="JSON baseline to compare the results with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default 0.2)")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Seconds of every repeat (default 0.05)")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats of every kernel (default 5)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases.split(','), args.min_time, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'machine': machine(), 'results': results}, file, indent=2)
+        print("\nBaseline written on " + args.save)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get('machine') != machine():
+            print("\nThe baseline was measured on another machine or environment: " + str(baseline.get('machine')))
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print("\n%d kernels are slower than the baseline by more than %.0f%%."%(len(regressions),
+                                                                                 100*args.threshold))
+            sys.exit(1)
+        print("\nNo regressions.")
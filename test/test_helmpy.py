@@ -2,13 +2,27 @@
 Test helmpy
 """
 
+import contextlib
+import io
+import json
+import logging
+import subprocess
+import sys
 from os.path import basename 
 
 import numpy as np
 import pandas as pd
 import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 
 from paths import helmpy, HELMPY_PATH
+from helmpy.core.analytic_continuation import pade_batch
+from helmpy.core.classes import structure_bytes
+from helmpy.core.contingency import outage_case
+from helmpy.core.helm import estimate_run_bytes
+from helmpy.core.kernels import Kernels
+from helmpy.core.linear_solvers import available_linear_solvers
 
 
 
@@ -56,9 +70,13 @@ def algorithm_str(pv_bus_model, DSB_model, DSB_model_method):
     return algorithm
 
 
-def test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods): 
+def test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods, backend='numba', formulation='real',
+                          continuation='epsilon', pade_solver='dense', ordering='colamd'): 
     """
-    Test every pv_dsb_methods and case.
+    Test every pv_dsb_methods and case with the kernels of backend ('numpy' or 'numba'),
+    the real or complex formulation of the coefficient systems, the continuation
+    ('epsilon' or 'pade', with the 'dense' or 'levinson' pade_solver) and the bus
+    ordering of the factorization. The fill ratio of the factorization must be reported.
     """
     # Add all the error here for a final and fast check
     total_errors = []
@@ -75,7 +93,11 @@ def test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods):
             # Execute function
             run, _, _ = helmpy.helm(
                 case.case, mismatch=1e-8, scale=scale, # detailed_run_print=True,
-                pv_bus_model=pv_bus_model, DSB_model=DSB_model, DSB_model_method=DSB_model_method )
+                pv_bus_model=pv_bus_model, DSB_model=DSB_model, DSB_model_method=DSB_model_method,
+                backend=backend, formulation=formulation, continuation=continuation, pade_solver=pade_solver,
+                ordering=ordering )
+            if run.fill_ratio is None or not run.fill_ratio >= 1:
+                total_errors.append(np.inf)
             # Errors
             complex_voltage = run.V_complex_profile.copy()
             polar_voltage = convert_complex_to_polar_voltages( complex_voltage ) # Calculate polar voltage
@@ -102,6 +124,455 @@ def test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods):
     return total_errors
 
 
+def test_orderings_functions(detailed_print, cases_to_test, pv_dsb_methods, min_buses=1000):
+    """
+    Compare the fill ratios of the factorizations with every bus ordering. On the cases
+    with more than min_buses buses (the meshed PEGASE grids) the default 'colamd' must
+    not fill more than the column ordering of SuperLU (ordering=None).
+    """
+    total_errors = []
+    for case in cases_to_test:
+        for pv_bus_model, DSB_model, DSB_model_method in pv_dsb_methods:
+            fill_ratio = {}
+            for ordering in ('colamd', 'mmd', 'rcm', None):
+                run = helmpy.helm(case.case, mismatch=1e-8, scale=1.02 if DSB_model else 1,
+                                  pv_bus_model=pv_bus_model, DSB_model=DSB_model,
+                                  DSB_model_method=DSB_model_method, ordering=ordering)[0]
+                fill_ratio[ordering] = run.fill_ratio
+            if case.case.N > min_buses and fill_ratio['colamd'] > fill_ratio[None]:
+                total_errors.append(np.inf)
+            total_errors.append(0)
+            if detailed_print:
+                print("Case: " + case.name + "   Algorithm: " +
+                      algorithm_str(pv_bus_model, DSB_model, DSB_model_method) + "   Fill ratios: " +
+                      "   ".join("%s %.2f"%(ordering, fill) for ordering, fill in fill_ratio.items()))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_pade_solvers_functions(detailed_print, cases_to_test):
+    """
+    Test that the Levinson-Trench solver of the Padé systems gives the Padé approximants
+    of the dense solver on the voltage series of every case, also on rows whose recursion
+    breaks down (a zero series[L]) and are solved again with the dense solver.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        run = helmpy.helm(case.case, mismatch=1e-8)[0]
+        length = run.list_coef[-1] - 1 + run.list_coef[-1]%2
+        L = (length - 1)//2
+        series = run.V_complex[:, :length]
+        # Buses with constant voltages have singular systems
+        series = series[np.absolute(series[:, 1:]).max(axis=1) > 0]
+        # The first leading submatrix of the Toeplitz systems of these rows is zero
+        breakdown = series.copy()
+        breakdown[:, L] = 0
+        series = np.concatenate((series, breakdown))
+        reference = pade_batch(series, length)
+        for backend in ('numpy', 'numba'):
+            values, conditioning = pade_batch(series, length, 'levinson', return_conditioning=True,
+                                              kernels=Kernels(backend))
+            error = np.max(np.absolute(values - reference))
+            if not np.all(conditioning >= 1):
+                error = np.inf
+            total_errors.append(error)
+            if detailed_print:
+                print("Case: " + case.name + "   Backend: " + backend + "   Maximum error: ", error)
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_helm_batch_functions(detailed_print, cases_to_test, pv_dsb_methods, backend='numba', continuation='epsilon'):
+    """
+    Test helm_batch with every pv_dsb_methods and case. The first scenario is checked
+    against the results files and the others against helm.
+    """
+    total_errors = []
+    scenarios_scale = np.array([1, 0.95, 1.05])
+    for pv_bus_model, DSB_model, DSB_model_method in pv_dsb_methods:
+        if detailed_print:
+            print("\n##########   Batch " + algorithm_str(pv_bus_model, DSB_model, DSB_model_method) + '   ##########')
+        for case in cases_to_test:
+            scales = scenarios_scale * (1.02 if DSB_model else 1)
+            results = helmpy.helm_batch(
+                case.case, case.case.Pd[:,np.newaxis]*scales, case.case.Qd[:,np.newaxis]*scales,
+                case.case.Pg[:,np.newaxis]*scales, mismatch=1e-8, backend=backend, continuation=continuation,
+                pv_bus_model=pv_bus_model, DSB_model=DSB_model, DSB_model_method=DSB_model_method )
+            # Errors of the first scenario
+            polar_voltage = convert_complex_to_polar_voltages( results.V_complex_profile[:,0] )
+            if DSB_model:
+                magnitud_error = np.absolute( polar_voltage[:,0] - case.distributed_slack_magnitude )
+                phase_angles_error = np.absolute( polar_voltage[:,1] - case.distributed_slack_phase_angles )
+            else:
+                magnitud_error = np.absolute( polar_voltage[:,0] - case.classic_slack_magnitude )
+                phase_angles_error = np.absolute( polar_voltage[:,1] - case.classic_slack_phase_angles )
+            total_errors.append(np.max(magnitud_error))
+            total_errors.append(np.max(phase_angles_error))
+            # Differences of the other scenarios with helm
+            for s in range(1, len(scales)):
+                run, _, _ = helmpy.helm(
+                    case.case, mismatch=1e-8, scale=float(scales[s]), continuation=continuation,
+                    pv_bus_model=pv_bus_model, DSB_model=DSB_model, DSB_model_method=DSB_model_method )
+                total_errors.append(np.max(np.absolute(run.V_complex_profile - results.V_complex_profile[:,s])))
+            if detailed_print:
+                print("Case: " + case.name + "   Maximum error: ", np.max(total_errors[-len(scales)-1:]))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_helm_batch_speed_functions(detailed_print, case, scales, backend='numpy', repeats=3):
+    """
+    Test that helm_batch solves the scenarios of scales faster than a loop of helm, and
+    with the same voltages. The best time of repeats runs of each one is compared.
+    """
+    total_errors = []
+    scales = np.asarray(scales, dtype=np.float64)
+    # Warm up
+    helmpy.helm(case.case, scale=float(scales[0]), backend=backend)
+
+    loop_time = batch_time = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        V_loop = np.column_stack([
+            helmpy.helm(case.case, scale=float(scale), backend=backend)[0].V_complex_profile for scale in scales
+        ])
+        loop_time = min(loop_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = helmpy.helm_batch(case.case, case.case.Pd[:,np.newaxis]*scales,
+                                    case.case.Qd[:,np.newaxis]*scales, case.case.Pg[:,np.newaxis]*scales,
+                                    backend=backend)
+        batch_time = min(batch_time, time.perf_counter() - start)
+
+    total_errors.append(np.max(np.absolute(V_loop - results.V_complex_profile)))
+    total_errors.append(0 if batch_time < loop_time else np.inf)
+    if detailed_print:
+        print("Case: " + case.name + "   Scenarios: " + str(len(scales)) +
+              "   Loop: %.2f s   Batch: %.2f s" % (loop_time, batch_time))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_pv_curve_functions(detailed_print, cases_to_test, scales):
+    """
+    Test pv_curve on every case. Every point of the curve is checked against helm.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        curve = helmpy.pv_curve(case.case, scales, mismatch=1e-8)
+        for j, scale in enumerate(scales):
+            run, _, flag_divergence = helmpy.helm(case.case, mismatch=1e-8, scale=float(scale), continuation='pade')
+            if flag_divergence:
+                break
+            total_errors.append(np.max(np.absolute(run.V_complex_profile - curve.V_complex[:,j])))
+        if detailed_print:
+            print("Case: " + case.name + "   Power flows solved: %d of %d"%(np.sum(curve.solved), len(scales)) +
+                  "   Maximum error: ", np.max(total_errors))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_collapse_point_functions(detailed_print, cases_to_test, margin=0.01, accuracy=0.15):
+    """
+    Test collapse_point on every case. The estimation solves one power flow and, unless
+    the bus types change before it (limit_scale), is within accuracy of the maximum
+    loading located by bisection with helm (verify). helm must converge below the
+    verified maximum loading and diverge above it. Close to the collapse helm needs many
+    coefficients. The runs at other scales must not change the case nor the estimation.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        Pd, Qd, Pg = np.copy(case.case.Pd), np.copy(case.case.Qd), np.copy(case.case.Pg)
+        estimate = helmpy.collapse_point(case.case)
+        collapse = helmpy.collapse_point(case.case, verify=True)
+        total_errors.append(estimate.solves != 1 or not 0 <= estimate.confidence <= 1 or
+                            len(estimate.weakest_buses) != min(10, case.case.N))
+        total_errors.append(collapse.scale != estimate.scale or collapse.confidence != estimate.confidence)
+        if not estimate.limit_scale < estimate.scale:
+            total_errors.append(np.abs(estimate.scale - collapse.verified_scale) > accuracy*collapse.verified_scale)
+        below = helmpy.helm(case.case, mismatch=1e-8, scale=float(collapse.verified_scale*(1-margin)),
+                            continuation='pade', max_coefficients=300)[2]
+        above = helmpy.helm(case.case, mismatch=1e-8, scale=float(collapse.verified_scale*(1+margin)),
+                            continuation='pade', max_coefficients=300)[2]
+        total_errors.append(below or not above)
+        total_errors.append(helmpy.collapse_point(case.case).scale != estimate.scale)
+        total_errors.append(not (np.array_equal(case.case.Pd, Pd) and np.array_equal(case.case.Qd, Qd) and
+                                 np.array_equal(case.case.Pg, Pg)))
+        if detailed_print:
+            print("Case: " + case.name + "   Estimated collapse scale: %f   Confidence: %f   Qgen limit scale: %f"
+                  %(estimate.scale, estimate.confidence, estimate.limit_scale) +
+                  "   Verified collapse scale: %f   Power flows solved: %d"%(collapse.verified_scale, collapse.solves))
+
+    print("\n--->", np.sum(total_errors), "wrong estimations", end='\n\n')
+
+    return total_errors
+
+def test_contingencies_functions(detailed_print, cases_to_test, n_branches, processes=None):
+    """
+    Test contingencies with the outages of the first n_branches branches and of every
+    generator of each case. Every outage is checked against helm on its own case.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        data = case.case
+        generators = [int(np.flatnonzero(data.Number_bus == i)[0]) + 1 for i in data.list_gen]
+        outages = [('branch', k) for k in range(min(n_branches, data.N_branches))] + \
+                  [('generator', bus) for bus in generators]
+        results = helmpy.contingencies(data, outages, mismatch=1e-8, processes=processes)
+        for c, outage in enumerate(outages):
+            if results.islanded[c]:
+                continue
+            run, _, flag_divergence = helmpy.helm(outage_case(data, outage), mismatch=1e-8, max_update_rank=0)
+            if flag_divergence or results.flag_divergence[c]:
+                total_errors.append(0 if flag_divergence == results.flag_divergence[c] else np.inf)
+                continue
+            total_errors.append(np.max(np.absolute(run.V_complex_profile - results.V_complex_profile[:,c])))
+        if detailed_print:
+            print("Case: " + case.name + "   Outages: %d   Islanded: %d   Diverged: %d"
+                  %(len(outages), np.sum(results.islanded), np.sum(results.flag_divergence)) +
+                  "   Maximum error: ", np.max(total_errors))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_linear_solvers_functions(detailed_print, cases_to_test, pv_dsb_methods):
+    """
+    Test every linear solver backend available on this machine and 'auto' against the
+    default SuperLU backend.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        for pv_bus_model, DSB_model, DSB_model_method in pv_dsb_methods:
+            kwargs = dict(mismatch=1e-8, pv_bus_model=pv_bus_model, DSB_model=DSB_model,
+                          DSB_model_method=DSB_model_method)
+            reference = helmpy.helm(case.case, **kwargs)[0].V_complex_profile
+            for linear_solver in available_linear_solvers() + ['auto']:
+                run = helmpy.helm(case.case, linear_solver=linear_solver, **kwargs)[0]
+                error = np.max(np.absolute(run.V_complex_profile - reference))
+                total_errors.append(error)
+                if detailed_print:
+                    print("Case: " + case.name + "   Algorithm: " +
+                          algorithm_str(pv_bus_model, DSB_model, DSB_model_method) +
+                          "   Linear solver: " + linear_solver + "   Maximum error: ", error)
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_stats_functions(detailed_print, cases_to_test):
+    """
+    Test that helm with stats=True gives the same voltages and counts the coefficients
+    and restarts of the run, without the parsing of the case, kept in case.stats.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        reference = helmpy.helm(case.case, mismatch=1e-8)[0].V_complex_profile
+        run = helmpy.helm(case.case, mismatch=1e-8, stats=True)[0]
+        counters = run.stats.counters
+        if counters['coefficients'] != sum(run.list_coef) - len(run.list_coef) or \
+           counters.get('restarts', 0) != len(run.list_coef) - 1 or 'parsing' in run.stats.time:
+            total_errors.append(np.inf)
+        total_errors.append(np.max(np.absolute(run.V_complex_profile - reference)))
+        if detailed_print:
+            print("Case: " + case.name)
+            print(run.stats)
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_memory_functions(detailed_print, cases_to_test):
+    """
+    Test that helm with memory_report=True gives the same voltages and reports the
+    arrays of the run, and that a memory budget smaller than the case stops helm.
+    A budget exceeded by the factorization stops helm after scaling the case and
+    starting tracemalloc, both must be undone.
+    """
+    total_errors = []
+    for case in cases_to_test:
+        reference = helmpy.helm(case.case, mismatch=1e-8)[0].V_complex_profile
+        run = helmpy.helm(case.case, mismatch=1e-8, memory_report=True, memory_budget=1e9)[0]
+        if run.memory.peak <= 0 or run.memory.run['coefficients'] != run.coefficients.nbytes:
+            total_errors.append(np.inf)
+        total_errors.append(np.max(np.absolute(run.V_complex_profile - reference)))
+        try:
+            helmpy.helm(case.case, mismatch=1e-8, memory_budget=1000)
+            total_errors.append(np.inf)
+        except MemoryError:
+            pass
+        budget = sum(estimate_run_bytes(case.case, 2, None, 100, 'epsilon', 'real').values()) + \
+                 sum(structure_bytes(case.case).values())
+        Pd = np.copy(case.case.Pd)
+        try:
+            helmpy.helm(case.case, mismatch=1e-8, scale=1.02, memory_report=True, memory_budget=budget)
+            total_errors.append(np.inf)
+        except MemoryError:
+            if tracemalloc.is_tracing():
+                total_errors.append(np.inf)
+            total_errors.append(np.max(np.absolute(case.case.Pd - Pd)))
+        if detailed_print:
+            print("Case: " + case.name)
+            print(run.memory)
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+class EventRecords(logging.Handler):
+    """Records of the helmpy loggers that carry an event, and whether their loggers had DEBUG enabled"""
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.debug_enabled = []
+
+    def emit(self, record):
+        if hasattr(record, 'event'):
+            self.events.append(record)
+        self.debug_enabled.append(logging.getLogger(record.name).isEnabledFor(logging.DEBUG))
+
+def test_logging_functions(detailed_print, cases_to_test):
+    """
+    Test that helm prints nothing by default and logs its convergence as an event
+    record with the coefficients of the run. With detailed_run_print=True it prints only
+    the records of its thread, without changing the level nor the class of the loggers, nor
+    giving DEBUG records to the handlers of the application.
+    """
+    total_errors = []
+    logger = logging.getLogger('helmpy')
+    handler = EventRecords()
+    logger.addHandler(handler)
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        for case in cases_to_test:
+            handler.events.clear()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                run = helmpy.helm(case.case, mismatch=1e-8)[0]
+            converged = [record for record in handler.events if record.event == 'converged']
+            if output.getvalue() or len(converged) != 1 or converged[0].list_coef != run.list_coef:
+                total_errors.append(np.inf)
+            total_errors.append(0)
+            if detailed_print:
+                print("Case: " + case.name)
+                print(*("%s %s"%(record.event, record.getMessage()) for record in handler.events), sep='\n')
+
+            handler.events.clear()
+            handler.debug_enabled.clear()
+            detailed_output = io.StringIO()
+            with contextlib.redirect_stdout(detailed_output):
+                helmpy.helm(case.case, detailed_run_print=True, mismatch=1e-8)
+            # nr runs in another thread meanwhile, its records are not printed
+            concurrent_output = io.StringIO()
+            with contextlib.redirect_stdout(concurrent_output), ThreadPoolExecutor(max_workers=1) as pool:
+                other_run = pool.submit(helmpy.nr, case.grid_data_file_path, Mismatch=1e-8)
+                helmpy.helm(case.case, detailed_run_print=True, mismatch=1e-8)
+                other_run.result()
+            if not detailed_output.getvalue() or concurrent_output.getvalue() != detailed_output.getvalue() or \
+               logger.level != logging.INFO or any(record.levelno < logging.INFO for record in handler.events) or \
+               any(handler.debug_enabled) or \
+               any(type(log) is not logging.Logger for name, log in logging.root.manager.loggerDict.items()
+                   if name.startswith('helmpy') and isinstance(log, logging.Logger)):
+                total_errors.append(np.inf)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+# Imports helmpy in a new interpreter and reports its import time and side effects
+IMPORT_SCRIPT = """
+import json, sys, time, warnings
+sys.path.insert(0, sys.argv[1])
+import numpy, scipy.linalg, scipy.sparse.linalg, scipy.sparse.csgraph
+filters = list(warnings.filters)
+start = time.perf_counter()
+import helmpy
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'pandas': 'pandas' in sys.modules,
+    'openpyxl': 'openpyxl' in sys.modules,
+    'numba': 'numba' in sys.modules,
+    'warnings': warnings.filters != filters,
+}))
+"""
+
+def test_import_functions(detailed_print, budget=0.25, repeats=3):
+    """
+    Test that importing helmpy takes less than budget seconds (best of repeats, with
+    numpy and scipy already imported), does not import pandas, openpyxl nor numba and does
+    not change the warnings filters.
+    """
+    total_errors = []
+    reports = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT, str(HELMPY_PATH)],
+                                capture_output=True, text=True, check=True).stdout
+        reports.append(json.loads(output))
+    seconds = min(report['seconds'] for report in reports)
+    if seconds > budget or any(report[key] for report in reports for key in ('pandas', 'openpyxl', 'numba', 'warnings')):
+        total_errors.append(np.inf)
+    total_errors.append(0)
+    if detailed_print:
+        print("Import time: %.3f s (budget %.3f s)"%(seconds, budget))
+        print(reports[0])
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_long_series_functions(detailed_print, case, scale=2.3):
+    """
+    Test helm with a series longer than 40 coefficients, the initial size of the
+    coefficient arrays (case9 at scale 2.3). Both PV bus models must give the same voltages.
+    """
+    V_complex_profiles = []
+    for pv_bus_model in (1, 2):
+        run, series_large, _ = helmpy.helm(case.case, mismatch=1e-8, scale=scale, pv_bus_model=pv_bus_model)
+        if series_large <= 40:
+            return [np.inf]
+        V_complex_profiles.append(run.V_complex_profile)
+    total_errors = [np.max(np.absolute(V_complex_profiles[0] - V_complex_profiles[1]))]
+    if detailed_print:
+        print("Case: " + case.name + "   Scale: " + str(scale) + "   Coefficients: " + str(series_large))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
+def test_arguments_functions(detailed_print, case):
+    """
+    Test that helm raises ValueError for every invalid argument value.
+    """
+    invalid_arguments = [
+        {'mismatch': 1}, {'max_coefficients': 4}, {'pv_bus_model': 3}, {'DSB_model_method': 3},
+        {'backend': 'foo'}, {'continuation': 'bar'}, {'pade_solver': 'q'}, {'max_update_rank': -1},
+        {'ordering': 'xyz'}, {'linear_solver': 'foo'}, {'formulation': 'foo'}, {'stats': 1},
+        {'memory_report': 1}, {'memory_budget': -5},
+    ]
+    total_errors = []
+    for arguments in invalid_arguments:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                helmpy.helm(case.case, **arguments)
+            total_errors.append(np.inf)
+        except ValueError:
+            total_errors.append(0)
+        if detailed_print and total_errors[-1]:
+            print("No ValueError with " + str(arguments))
+
+    print("\n--->", np.max(total_errors), end='\n\n')
+
+    return total_errors
+
 if __name__ == '__main__':
 
     # Uncomment every pv_model/dsb_method and case that wants to be tested.
@@ -157,8 +628,92 @@ if __name__ == '__main__':
             case2869pegase,
     ]
 
+    # Kernel backends to test. Both must pass the same accuracy tests
+    backends = [
+        'numpy',
+        'numba',
+    ]
+
+    for backend in backends:
+        print("\n##########   Backend: " + backend + '   ##########')
+        start = time.time()
+        test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods, backend)
+        end = time.time()
+
+        print('Testing took: ' + str(end-start) + ' s.')
+
+    print("\n##########   Complex formulation   ##########")
+    start = time.time()
+    test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods, formulation='complex')
+    print('Testing took: ' + str(time.time()-start) + ' s.')
+
+    # Padé continuation with both solvers of the Padé systems
+    for pade_solver in ('dense', 'levinson'):
+        print("\n##########   Padé continuation: " + pade_solver + '   ##########')
+        start = time.time()
+        test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods, continuation='pade',
+                              pade_solver=pade_solver)
+        print('Testing took: ' + str(time.time()-start) + ' s.')
+
+    test_pade_solvers_functions(detailed_print, cases_to_test)
+
+    # Bus orderings of the factorization. The default is 'colamd'
+    for ordering in ('mmd', 'rcm', None):
+        print("\n##########   Ordering: " + str(ordering) + '   ##########')
+        start = time.time()
+        test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods, ordering=ordering)
+        print('Testing took: ' + str(time.time()-start) + ' s.')
+
+    test_orderings_functions(detailed_print, cases_to_test, pv_dsb_methods[0:2])
+
+    for backend in backends:
+        print("\n##########   Batch backend: " + backend + '   ##########')
+        start = time.time()
+        test_helm_batch_functions(detailed_print, cases_to_test, pv_dsb_methods, backend)
+        print('Batch testing took: ' + str(time.time()-start) + ' s.')
+
+    print("\n##########   Batch continuation: pade   ##########")
     start = time.time()
-    test_helmpy_functions(detailed_print, cases_to_test, pv_dsb_methods)
-    end = time.time()
+    test_helm_batch_functions(detailed_print, cases_to_test[0:2], pv_dsb_methods, continuation='pade')
+    print('Batch testing took: ' + str(time.time()-start) + ' s.')
+
+    # A batch of the scenarios must be faster than one helm run per scenario
+    start = time.time()
+    test_helm_batch_speed_functions(detailed_print, case1354pegase, np.linspace(0.9, 1.1, 20))
+    print('Batch speed testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_pv_curve_functions(detailed_print, cases_to_test[0:2], np.arange(1, 2, 0.02))
+    print('PV-curve testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_collapse_point_functions(detailed_print, cases_to_test[0:2])
+    print('Collapse point testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_contingencies_functions(detailed_print, cases_to_test[0:2], 50)
+    print('Contingencies testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_linear_solvers_functions(detailed_print, cases_to_test[0:2], pv_dsb_methods)
+    print('Linear solvers testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_stats_functions(detailed_print, cases_to_test[0:2])
+    print('Stats testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_memory_functions(detailed_print, cases_to_test[0:2])
+    print('Memory testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_logging_functions(detailed_print, cases_to_test[0:2])
+    print('Logging testing took: ' + str(time.time()-start) + ' s.')
+
+    start = time.time()
+    test_import_functions(detailed_print)
+    print('Import testing took: ' + str(time.time()-start) + ' s.')
+
+    test_long_series_functions(detailed_print, case9)
 
-    print('Testing took: ' + str(end-start) + ' s.')
\ No newline at end of file
+    test_arguments_functions(detailed_print, case9)
@@ -2,6 +2,8 @@
 Test NR
 """
 
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from os.path import basename 
 
 import numpy as np
@@ -104,6 +106,149 @@ def test_helmpy_nr_functions(detailed_print, cases_to_test, methods):
     return total_errors
 
 
+def test_nr_threads_functions(detailed_print, cases_to_test, methods, workers=4):
+    """Runs of nr and nr_ds in a thread pool must give the voltages of the sequential runs"""
+    total_errors = []
+    print("\n  ###############################")
+    print("  ### NR runs in threads      ###")
+    print("  ###############################")
+
+    def run(task):
+        case, DSB_model, aply_DSB_model = task
+        if DSB_model:
+            scale = 1.02 if aply_DSB_model else 1
+            return helmpy.nr_ds(
+                case.grid_data_file_path, Mismatch=1e-8, Scale=scale, DSB_model=aply_DSB_model)
+        return helmpy.nr(case.grid_data_file_path, Mismatch=1e-8)
+
+    # Every run twice, to have several runs of the same case at the same time
+    tasks = [(case, DSB_model, aply_DSB_model) for DSB_model, aply_DSB_model in methods
+             for case in cases_to_test]*2
+    sequential = [run(task) for task in tasks]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        concurrent = list(pool.map(run, tasks))
+
+    for (case, DSB_model, aply_DSB_model), expected, obtained in zip(tasks, sequential, concurrent):
+        error = np.max(np.absolute(obtained - expected))
+        if detailed_print:
+            print(case.name + ", " + algorithm_str(DSB_model, aply_DSB_model) + ". Difference: ", error)
+        total_errors.append(error)
+
+    print("\n--->", np.max(total_errors))
+
+    return total_errors
+
+
+def test_fdlf_functions(detailed_print, cases_to_test, methods):
+    """fdlf must converge to the voltages of the results of HELM, as nr and nr_ds"""
+    total_errors = []
+    print("\n  ###############################")
+    print("  ### FDLF                     ###")
+    print("  ###############################")
+
+    for DSB_model, method in methods:
+        for case in cases_to_test:
+            scale = 1.02 if DSB_model else 1
+            complex_voltage = helmpy.fdlf(
+                case.grid_data_file_path, Mismatch=1e-8, Scale=scale, DSB_model=DSB_model, method=method)
+
+            polar_voltage = convert_complex_to_polar_voltages( complex_voltage )
+            if DSB_model:
+                magnitud_error = np.absolute( polar_voltage[:,0] - case.distributed_slack_magnitude )
+                phase_angles_error = np.absolute( polar_voltage[:,1] - case.distributed_slack_phase_angles )
+            else:
+                magnitud_error = np.absolute( polar_voltage[:,0] - case.classic_slack_magnitude )
+                phase_angles_error = np.absolute( polar_voltage[:,1] - case.classic_slack_phase_angles )
+            if detailed_print:
+                print(case.name + ", FDLF " + method + (" DS" if DSB_model else "") +
+                      ". Maximun magnitud and phase angles errors: ",
+                      np.max(magnitud_error), np.max(phase_angles_error))
+            total_errors.append(np.max(magnitud_error))
+            total_errors.append(np.max(phase_angles_error))
+
+    print("\n--->", np.max(total_errors))
+
+    return total_errors
+
+
+def test_nr_case_data_functions(detailed_print, cases_to_test, methods):
+    """nr, nr_ds and fdlf on the CaseData of a case must give the voltages of the runs on its .xlsx file"""
+    total_errors = []
+    print("\n  ###############################")
+    print("  ### NR on CaseData objects   ###")
+    print("  ###############################")
+
+    for DSB_model, aply_DSB_model in methods:
+        for case in cases_to_test:
+            scale = 1.02 if DSB_model and aply_DSB_model else 1
+            Pd = np.copy(case.case.Pd)
+            if DSB_model:
+                runs = [helmpy.nr_ds(grid, Mismatch=1e-8, Scale=scale, DSB_model=aply_DSB_model)
+                        for grid in (case.grid_data_file_path, case.case)]
+            else:
+                runs = [helmpy.nr(grid, Mismatch=1e-8) for grid in (case.grid_data_file_path, case.case)]
+            runs += [helmpy.fdlf(grid, Mismatch=1e-8, Scale=scale, DSB_model=bool(aply_DSB_model))
+                     for grid in (case.grid_data_file_path, case.case)]
+            error = max(np.max(np.absolute(runs[1] - runs[0])), np.max(np.absolute(runs[3] - runs[2])))
+            # The parsing is timed only by the run that parses the case
+            parsing = ['parsing' in helmpy.nr(grid, Mismatch=1e-8, stats=True)[1].time
+                       for grid in (case.grid_data_file_path, case.case)]
+            if parsing != [True, False]:
+                error = np.inf
+            # The case is not modified
+            error = max(error, np.max(np.absolute(case.case.Pd - Pd)))
+            if detailed_print:
+                print(case.name + ", " + algorithm_str(DSB_model, aply_DSB_model) + ". Difference: ", error)
+            total_errors.append(error)
+
+    print("\n--->", np.max(total_errors))
+
+    return total_errors
+
+
+class BusTypeSwitches(logging.Handler):
+    """Buses of the bus_type_switch records of the helmpy loggers"""
+    def __init__(self):
+        super().__init__()
+        self.buses = []
+
+    def emit(self, record):
+        if getattr(record, 'event', None) == 'bus_type_switch':
+            self.buses.append(record.bus)
+
+
+def test_nr_bus_type_switch_functions(detailed_print, cases_to_test):
+    """nr must log the bus type switches of the same buses as helm, numbered from 1"""
+    total_errors = []
+    print("\n  ###############################")
+    print("  ### NR bus type switches     ###")
+    print("  ###############################")
+
+    logger = logging.getLogger('helmpy')
+    handler = BusTypeSwitches()
+    logger.addHandler(handler)
+    level = logger.level
+    logger.setLevel(logging.DEBUG)
+    try:
+        for case in cases_to_test:
+            handler.buses.clear()
+            helmpy.nr(case.grid_data_file_path, Mismatch=1e-8)
+            nr_buses = sorted(handler.buses)
+            handler.buses.clear()
+            helmpy.helm(case.case, mismatch=1e-8)
+            helm_buses = sorted(handler.buses)
+            if detailed_print:
+                print(case.name + ". Switched buses of NR and HELM: ", nr_buses, helm_buses)
+            total_errors.append(0 if nr_buses == helm_buses else np.inf)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+    print("\n--->", np.max(total_errors))
+
+    return total_errors
+
+
 if __name__ == '__main__':
 
     # Uncomment every pv_model/dsb_method and case that wants to be tested.
@@ -153,4 +298,8 @@ if __name__ == '__main__':
             case2869pegase,
     ]
 
-    test_helmpy_nr_functions(detailed_print, cases_to_test, methods)
\ No newline at end of file
+    test_helmpy_nr_functions(detailed_print, cases_to_test, methods)
+    test_nr_threads_functions(detailed_print, cases_to_test, methods)
+    test_fdlf_functions(detailed_print, cases_to_test, [(False, 'XB'), (False, 'BX'), (True, 'XB'), (True, 'BX')])
+    test_nr_case_data_functions(detailed_print, cases_to_test, methods)
+    test_nr_bus_type_switch_functions(detailed_print, cases_to_test)